@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark of the memory footprint of cblaster Hit and Subject objects.
+
+Builds a synthetic scaffold of Subjects, each holding one Hit per query, the way
+parse_IPG_table() does for every member of an identical protein group, and reports
+the number of bytes allocated per Hit (including its share of the Subject).
+
+Usage:
+    $ python benchmarks/hit_memory.py --subjects 100000 --queries 5
+"""
+
+import argparse
+import json
+import tracemalloc
+
+from cblaster.classes import Hit, Scaffold, Subject
+
+
+def build_scaffold(total_subjects, total_queries):
+    queries = [f"query_{i}" for i in range(total_queries)]
+    subjects = []
+    for index in range(total_subjects):
+        name = f"WP_{index:09d}.1"
+        hits = [
+            Hit(query, name, "75.5", "98.2", "1.2e-50", "350.7")
+            for query in queries
+        ]
+        subject = Subject(
+            hits=hits,
+            name=name,
+            ipg=str(index // 10),
+            start=index * 1000,
+            end=index * 1000 + 900,
+            strand="+",
+        )
+        subjects.append(subject)
+    return Scaffold("scaffold", subjects=subjects)
+
+
+def measure(function, *args):
+    tracemalloc.start()
+    result = function(*args)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--subjects", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=5)
+    args = parser.parse_args()
+
+    total_hits = args.subjects * args.queries
+
+    scaffold, size = measure(build_scaffold, args.subjects, args.queries)
+    print(f"Built {args.subjects} subjects, {total_hits} hits")
+    print(f"  {size / 1024 ** 2:.1f} MiB total, {size / total_hits:.1f} bytes/hit")
+
+    # Session JSON round trip should give back the same footprint
+    js = json.dumps(scaffold.to_dict())
+    del scaffold
+    loaded, size = measure(lambda: Scaffold.from_dict(json.loads(js)))
+    print(f"Loaded from JSON ({len(js) / 1024 ** 2:.1f} MiB)")
+    print(f"  {size / 1024 ** 2:.1f} MiB total, {size / total_hits:.1f} bytes/hit")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+This module handles the on-disk cache of Identical Protein Group (IPG) tables.
+
+Rows of IPG tables fetched from the NCBI are stored in a SQLite3 database, keyed on
+the protein accessions they were fetched for. Subsequent searches only need to query
+the NCBI for accessions that are not in the cache, or whose entries are older than a
+given time-to-live (TTL).
+
+>>> rows, missing = lookup(accessions, "ipg_cache.sqlite3", ttl=30)
+>>> fetched = context.efetch_IPGs(missing)
+>>> store(fetched, missing, "ipg_cache.sqlite3")
+"""
+
+import logging
+import sqlite3
+import time
+
+from collections import defaultdict
+from contextlib import closing
+
+from cblaster.sql import (
+    IPG_CACHE_DELETE_ROWS,
+    IPG_CACHE_INSERT_LOOKUP,
+    IPG_CACHE_INSERT_ROW,
+    IPG_CACHE_LOOKUP,
+    IPG_CACHE_PRUNE_LOOKUP,
+    IPG_CACHE_PRUNE_ROWS,
+    IPG_CACHE_ROWS,
+    IPG_CACHE_SCHEMA,
+)
+
+
+LOG = logging.getLogger(__name__)
+
+IPG_HEADER = (
+    "Id\tSource\tNucleotide Accession\tStart\tStop\tStrand\tProtein\t"
+    "Protein Name\tOrganism\tStrain\tAssembly"
+)
+
+# Maximum number of SQLite3 host parameters used in a single query
+CHUNK_SIZE = 500
+
+
+def connect(path):
+    """Opens a connection to an IPG cache, creating it if it does not exist."""
+    con = sqlite3.connect(path)
+    con.executescript(IPG_CACHE_SCHEMA)
+    return con
+
+
+def expiry(ttl):
+    """Gets the timestamp before which cache entries are stale.
+
+    Args:
+        ttl (float): Time-to-live of cache entries, in days. None never expires.
+    """
+    if ttl is None:
+        return 0
+    return time.time() - ttl * 86400
+
+
+def chunked(values, size=CHUNK_SIZE):
+    for i in range(0, len(values), size):
+        yield values[i: i + size]
+
+
+def lookup(accessions, path, ttl=None):
+    """Looks up IPG table rows for a collection of protein accessions.
+
+    Args:
+        accessions (list): Protein accessions to look up.
+        path (str): Path to IPG cache.
+        ttl (float): Time-to-live of cache entries, in days.
+    Returns:
+        rows (list): Cached IPG table rows for every IPG of a cached accession.
+        missing (list): Accessions that are not cached, or have stale entries.
+    """
+    accessions = list(dict.fromkeys(accessions))
+    found, ipgs = set(), set()
+    with closing(connect(path)) as con:
+        oldest = expiry(ttl)
+        for chunk in chunked(accessions):
+            query = IPG_CACHE_LOOKUP.format(", ".join("?" for _ in chunk))
+            for accession, ipg in con.execute(query, [*chunk, oldest]):
+                found.add(accession)
+                if ipg is not None:
+                    ipgs.add(ipg)
+        rows = []
+        for chunk in chunked(list(ipgs)):
+            query = IPG_CACHE_ROWS.format(", ".join("?" for _ in chunk))
+            rows.extend(row for (row,) in con.execute(query, chunk))
+    missing = [accession for accession in accessions if accession not in found]
+    LOG.info(
+        "Found %i of %i accessions in IPG cache",
+        len(accessions) - len(missing),
+        len(accessions),
+    )
+    return rows, missing
+
+
+def store(rows, accessions, path):
+    """Saves rows of an IPG table to the cache.
+
+    Every protein in the table is saved to the cache lookup, as well as the queried
+    accessions, which are saved with no IPG if they are not present in the table.
+
+    Args:
+        rows (list): IPG table rows, as returned by context.efetch_IPGs().
+        accessions (list): Protein accessions the rows were fetched for.
+        path (str): Path to IPG cache.
+    """
+    groups = defaultdict(list)
+    proteins = {}
+    for row in rows:
+        if not row or row.isspace() or row.startswith("Id\tSource") or "skipping" in row:
+            continue
+        row = row.rstrip("\n")
+        ipg, *fields = row.split("\t")
+        groups[ipg].append(row)
+        if len(fields) > 5:
+            proteins[fields[5]] = ipg
+    now = time.time()
+    with closing(connect(path)) as con, con:
+        for ipg, group in groups.items():
+            con.execute(IPG_CACHE_DELETE_ROWS, (ipg,))
+            con.executemany(IPG_CACHE_INSERT_ROW, ((ipg, row) for row in group))
+        con.executemany(
+            IPG_CACHE_INSERT_LOOKUP,
+            (
+                (accession, proteins.get(accession), now)
+                for accession in dict.fromkeys([*accessions, *proteins])
+            ),
+        )
+    LOG.debug("Saved %i IPGs to cache %s", len(groups), path)
+
+
+def prune(path, ttl):
+    """Removes stale entries from an IPG cache.
+
+    Args:
+        path (str): Path to IPG cache.
+        ttl (float): Time-to-live of cache entries, in days.
+    """
+    LOG.info("Pruning entries older than %s days from %s", ttl, path)
+    with closing(connect(path)) as con:
+        with con:
+            con.execute(IPG_CACHE_PRUNE_LOOKUP, (expiry(ttl),))
+            con.execute(IPG_CACHE_PRUNE_ROWS)
+        con.execute("VACUUM")
+
+
+def export(path, handle):
+    """Writes every row in an IPG cache to a file handle as an IPG table.
+
+    Args:
+        path (str): Path to IPG cache.
+        handle (file handle): File handle to write to.
+    """
+    LOG.info("Exporting IPG cache %s to %s", path, handle.name)
+    with closing(connect(path)) as con:
+        handle.write(IPG_HEADER + "\n")
+        for (row,) in con.execute("SELECT row FROM ipg_row ORDER BY ipg"):
+            handle.write(row + "\n")
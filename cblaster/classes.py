@@ -5,13 +5,18 @@ This module stores the classes (Organism, Scaffold, Hit) used in cblaster.
 """
 
 import re
+import sys
+import gzip
 import json
 
+from itertools import chain
+from operator import attrgetter
+
 from cblaster.formatters import (
-    binary,
-    summary,
     summarise_scaffold,
     summarise_organism,
+    write_binary,
+    write_summary,
 )
 
 
@@ -22,6 +27,8 @@ class Serializer:
     `from_dict` methods.
     """
 
+    __slots__ = ()
+
     def to_dict(self):
         """Serialises class to dict."""
         raise NotImplementedError
@@ -49,6 +56,27 @@ class Serializer:
         return cls.from_dict(d)
 
 
+COMPACT_FORMAT = "cblaster-session"
+COMPACT_VERSION = 1
+
+SUBJECT_COLUMNS = ("name", "ipg", "start", "end", "strand", "ordinal")
+HIT_COLUMNS = ("identity", "coverage", "evalue", "bitscore")
+
+
+def is_compact(file):
+    """Checks if a session file is in the compact session format (i.e. gzipped)."""
+    with open(file, "rb") as fp:
+        return fp.read(2) == b"\x1f\x8b"
+
+
+def intern(value):
+    """Interns a string so that repeated values share one object in memory.
+
+    Non-string values (e.g. None) are returned unchanged.
+    """
+    return sys.intern(value) if type(value) is str else value
+
+
 class Session(Serializer):
     """Stores the state of a cblaster search.
 
@@ -79,14 +107,39 @@ class Session(Serializer):
     def __add__(self, other):
         if not isinstance(other, Session):
             raise NotImplementedError("Expected Session object")
-        if not self.queries == other.queries:
-            raise ValueError("Query sequences do not match")
-        return Session(
-            queries=self.queries,
-            sequences=self.sequences,
-            params=self.params,
-            organisms=self.organisms + other.organisms,
-        )
+        return Session.merge([self, other])
+
+    @classmethod
+    def merge(cls, sessions):
+        """Merges Sessions into a new Session.
+
+        Organisms with the same name and strain are merged (see Organism.merge()).
+        Sessions are only iterated once, so they can be loaded as they are merged.
+        Queries, sequences and parameters are taken from the first Session.
+
+        Raises:
+            ValueError: Query sequences of any Session do not match the first
+        """
+        merged, organisms = None, {}
+        for session in sessions:
+            if merged is None:
+                merged = cls(
+                    queries=session.queries,
+                    sequences=session.sequences,
+                    params=session.params,
+                )
+            elif session.queries != merged.queries:
+                raise ValueError("Query sequences do not match")
+            for organism in session.organisms:
+                key = organism.key
+                if key in organisms:
+                    organisms[key] = organisms[key].merge(organism)
+                else:
+                    organisms[key] = organism
+        if merged is None:
+            raise ValueError("Expected at least one Session")
+        merged.organisms = list(organisms.values())
+        return merged
 
     def to_dict(self):
         return {
@@ -96,21 +149,93 @@ class Session(Serializer):
             "organisms": [o.to_dict() for o in self.organisms],
         }
 
+    def to_file(self, file, indent=None):
+        """Writes this Session to file.
+
+        Files ending in .gz are written in the compact session format (see
+        to_compact()), and any other file as JSON.
+        """
+        if str(file).endswith(".gz"):
+            self.to_compact(file)
+        else:
+            with open(file, "w") as fp:
+                self.to_json(fp, indent=indent)
+
+    def to_compact(self, file):
+        """Writes this Session to file in the compact session format.
+
+        Compact sessions are gzipped JSON lines. The first line is a header containing
+        the format version, queries, sequences and search parameters, and every
+        following line is one Organism (see Organism.to_compact()). Organisms are
+        serialised one at a time, so `organisms` can be any iterable.
+        """
+        header = {
+            "format": COMPACT_FORMAT,
+            "version": COMPACT_VERSION,
+            "queries": self.queries,
+            "sequences": self.sequences,
+            "params": self.params,
+        }
+        with gzip.open(file, "wt") as fp:
+            for d in chain([header], (o.to_compact() for o in self.organisms)):
+                json.dump(d, fp, separators=(",", ":"))
+                fp.write("\n")
+
+    @staticmethod
+    def read_header(fp):
+        """Reads the header line of a compact session file handle.
+
+        Raises:
+            ValueError: File is not a compact session, or is from a newer version
+        """
+        header = json.loads(fp.readline() or "{}")
+        if header.get("format") != COMPACT_FORMAT:
+            raise ValueError("Not a compact cblaster session file")
+        if header["version"] > COMPACT_VERSION:
+            raise ValueError(
+                f"Compact session version {header['version']} is not supported by this"
+                f" version of cblaster (max. {COMPACT_VERSION})"
+            )
+        return header
+
+    @classmethod
+    def iter_organisms(cls, file):
+        """Yields each Organism stored in a session file.
+
+        Organisms in compact sessions are loaded one at a time, such that only one is
+        held in memory at once. JSON sessions must be loaded in full.
+        """
+        if not is_compact(file):
+            yield from cls.from_file(file).organisms
+            return
+        with gzip.open(file, "rt") as fp:
+            cls.read_header(fp)
+            for line in fp:
+                yield Organism.from_compact(json.loads(line))
+
+    @classmethod
+    def from_compact(cls, file):
+        """Loads a Session from a compact session file."""
+        with gzip.open(file, "rt") as fp:
+            header = cls.read_header(fp)
+            return cls(
+                queries=header.get("queries"),
+                sequences=header.get("sequences"),
+                params=header.get("params"),
+                organisms=[Organism.from_compact(json.loads(line)) for line in fp],
+            )
+
     @classmethod
     def from_file(cls, file):
+        if is_compact(file):
+            return cls.from_compact(file)
         with open(file) as fp:
             s = cls.from_json(fp)
         return s
 
     @classmethod
     def from_files(cls, files):
-        if len(files) == 1:
-            return cls.from_file(files[0])
-        first, *rest = files
-        s = cls.from_file(first)
-        for f in rest:
-            s += cls.from_file(f)
-        return s
+        return cls.merge(cls.from_file(file) for file in files)
 
     @classmethod
     def from_dict(cls, d):
@@ -122,23 +247,24 @@ class Session(Serializer):
         )
 
     def format(self, form, fp=None, **kwargs):
-        """Generates a summary table.
+        """Writes a summary table.
+
+        Tables are streamed to the file handle as they are generated (see
+        formatters.write_summary() and formatters.write_binary()).
 
         Args:
             form (str): Type of table to generate ('summary' or 'binary').
-            fp (file handle): File handle to write to.
+            fp (file handle): File handle to write to (def. stdout).
         Raises:
             ValueError: `form` not 'binary' or 'summary'
-        Returns:
-            Summary table.
         """
         if form == "summary":
-            table = summary(self, **kwargs)
+            writer = write_summary
         elif form == "binary":
-            table = binary(self, **kwargs)
+            writer = write_binary
         else:
             raise ValueError("Expected 'summary' or 'binary'")
-        print(table, file=fp)
+        writer(self, fp if fp else sys.stdout, **kwargs)
 
 
 class Organism(Serializer):
@@ -153,9 +279,11 @@ class Organism(Serializer):
         scaffolds (dict): Scaffold objects belonging to this organism.
     """
 
+    __slots__ = ("name", "strain", "scaffolds")
+
     def __init__(self, name, strain, scaffolds=None):
-        self.name = name
-        self.strain = strain
+        self.name = intern(name)
+        self.strain = intern(strain)
         self.scaffolds = scaffolds if scaffolds else {}
 
     def __str__(self):
@@ -194,6 +322,25 @@ class Organism(Serializer):
         else:
             return f"{self.name} {self.strain}" if self.strain else self.name
 
+    @property
+    def key(self):
+        """Name and strain of this Organism, used to match it between Sessions."""
+        return (self.name, self.strain)
+
+    def merge(self, other):
+        """Merges another Organism into a new Organism.
+
+        Scaffolds with the same accession are merged (see Scaffold.merge()). Neither
+        Organism is modified.
+        """
+        scaffolds = dict(self.scaffolds)
+        for accession, scaffold in other.scaffolds.items():
+            if accession in scaffolds:
+                scaffolds[accession] = scaffolds[accession].merge(scaffold)
+            else:
+                scaffolds[accession] = scaffold
+        return Organism(self.name, self.strain, scaffolds=scaffolds)
+
     def to_dict(self):
         return {
             "name": self.name,
@@ -203,11 +350,67 @@ class Organism(Serializer):
 
     @classmethod
     def from_dict(cls, d):
+        records = {}
         return cls(
             d["name"],
             d["strain"],
             scaffolds={
-                scaffold["accession"]: Scaffold.from_dict(scaffold)
+                scaffold["accession"]: Scaffold.from_dict(scaffold, records=records)
+                for scaffold in d["scaffolds"]
+            },
+        )
+
+    def to_compact(self):
+        """Serialises this Organism to a compact dict.
+
+        Hits are stored once per Organism in a column-wise table, with each query name
+        stored once and referenced by index. Subjects refer to their hits by position
+        in this table, so a Hit shared by members of the same IPG is only stored once.
+        """
+        queries, positions = {}, {}
+        table = {"query": [], **{column: [] for column in HIT_COLUMNS}}
+
+        def index(hit):
+            if id(hit) not in positions:
+                positions[id(hit)] = len(table["query"])
+                table["query"].append(queries.setdefault(hit.query, len(queries)))
+                for column in HIT_COLUMNS:
+                    table[column].append(getattr(hit, column))
+            return positions[id(hit)]
+
+        return {
+            "name": self.name,
+            "strain": self.strain,
+            "scaffolds": [
+                scaffold.to_compact(index) for scaffold in self.scaffolds.values()
+            ],
+            "queries": list(queries),
+            "hits": table,
+        }
+
+    @classmethod
+    def from_compact(cls, d):
+        """Loads an Organism from a compact dict (see to_compact())."""
+        queries = [intern(query) for query in d["queries"]]
+        table = d["hits"]
+        hits = [None] * len(table["query"])
+
+        def get_hit(index, subject):
+            # Hits take the name of the first Subject they were found on, as in
+            # Subject.from_dict()
+            if hits[index] is None:
+                hits[index] = Hit(
+                    queries[table["query"][index]],
+                    subject,
+                    *(table[column][index] for column in HIT_COLUMNS),
+                )
+            return hits[index]
+
+        return cls(
+            d["name"],
+            d["strain"],
+            scaffolds={
+                scaffold["accession"]: Scaffold.from_compact(scaffold, get_hit)
                 for scaffold in d["scaffolds"]
             },
         )
@@ -222,6 +425,8 @@ class Scaffold(Serializer):
         clusters (list): Clusters of hits identified on this scaffold.
     """
 
+    __slots__ = ("accession", "subjects", "clusters")
+
     def __init__(self, accession, clusters=None, subjects=None):
         self.accession = accession
         self.subjects = subjects if subjects else []
@@ -232,7 +437,7 @@ class Scaffold(Serializer):
             self.accession, len(self.subjects), len(self.clusters)
         )
 
-    def add_clusters(self, subject_lists, query_sequence_order=None):
+    def add_clusters(self, subject_lists, query_sequence_order=None, scorer=None):
         """Add clusters to this scaffold
 
         After clusters are added they are sorted based on score
@@ -242,12 +447,19 @@ class Scaffold(Serializer):
             form clusters
             query_sequence_order (list): list of sequences of the order in the query file, is
             only provided if the query has a meningfull order (gbk, embl files).
+            scorer (ClusterScorer): scorer shared between scaffolds, used instead of
+            creating a new one from query_sequence_order.
         """
-        for subjects in subject_lists:
-            indices = [self.subjects.index(subject) for subject in subjects]
-            cluster = Cluster(
-                indices, subjects, query_sequence_order=query_sequence_order
-            )
+        # Subjects are looked up by identity; list.index() would compare hits of
+        # every Subject before it
+        positions = {id(subject): index for index, subject in enumerate(self.subjects)}
+        if scorer is None:
+            scorer = ClusterScorer(query_sequence_order)
+        subject_lists = list(subject_lists)
+        scores = scorer.score_clusters(subject_lists)
+        for subjects, score in zip(subject_lists, scores):
+            indices = [positions[id(subject)] for subject in subjects]
+            cluster = Cluster(indices, subjects, score=score)
             self.clusters.append(cluster)
         self.clusters.sort(key=lambda x: x.score, reverse=True)
 
@@ -263,9 +475,108 @@ class Scaffold(Serializer):
             "clusters": [cluster.to_dict() for cluster in self.clusters],
         }
 
+    def merge(self, other):
+        """Merges another Scaffold into a new Scaffold.
+
+        Subjects with the same name and location are merged (see Subject.merge()), and
+        clusters are mapped onto the merged Subjects, keeping one of any clusters
+        containing the same Subjects. Neither Scaffold is modified.
+        """
+        subjects, positions, mapping = [], {}, []
+        for scaffold in (self, other):
+            indices = []
+            for subject in scaffold.subjects:
+                key = (subject.name, subject.start, subject.end, subject.strand)
+                if key in positions:
+                    index = positions[key]
+                    subjects[index] = subjects[index].merge(subject)
+                else:
+                    index = positions[key] = len(subjects)
+                    subjects.append(subject)
+                indices.append(index)
+            mapping.append(indices)
+        clusters, seen = [], set()
+        for scaffold, indices in zip((self, other), mapping):
+            for cluster in scaffold.clusters:
+                merged = [indices[index] for index in cluster.indices]
+                if tuple(merged) in seen:
+                    continue
+                seen.add(tuple(merged))
+                clusters.append(
+                    Cluster(
+                        indices=merged,
+                        subjects=[subjects[index] for index in merged],
+                        score=cluster.score,
+                        start=cluster.start,
+                        end=cluster.end,
+                        genes=cluster.genes,
+                    )
+                )
+        clusters.sort(key=attrgetter("score"), reverse=True)
+        return Scaffold(self.accession, subjects=subjects, clusters=clusters)
+
+    def to_compact(self, index):
+        """Serialises this Scaffold to a compact dict of Subject columns.
+
+        Args:
+            index (callable): Returns the position of a Hit in the hit table of the
+                parent Organism (see Organism.to_compact()).
+        """
+        columns = {column: [] for column in SUBJECT_COLUMNS}
+        columns["hits"] = []
+        for subject in self.subjects:
+            for column in SUBJECT_COLUMNS:
+                columns[column].append(getattr(subject, column))
+            columns["hits"].append([index(hit) for hit in subject.hits])
+        if all(ordinal is None for ordinal in columns["ordinal"]):
+            del columns["ordinal"]
+        return {
+            "accession": self.accession,
+            "subjects": columns,
+            "clusters": [cluster.to_dict() for cluster in self.clusters],
+        }
+
     @classmethod
-    def from_dict(cls, d):
-        subjects = [Subject.from_dict(subject) for subject in d["subjects"]]
+    def from_compact(cls, d, get_hit):
+        """Loads a Scaffold from a compact dict (see to_compact()).
+
+        Args:
+            d (dict): Compact Scaffold.
+            get_hit (callable): Returns the Hit at a given position in the hit table of
+                the parent Organism, given the name of the Subject it belongs to.
+        """
+        columns = d["subjects"]
+        total = len(columns["name"])
+        subjects = [
+            Subject(
+                hits=[get_hit(index, name) for index in indices],
+                name=name,
+                ipg=ipg,
+                start=start,
+                end=end,
+                strand=strand,
+                ordinal=ordinal,
+            )
+            for name, ipg, start, end, strand, ordinal, indices in zip(
+                *(columns.get(column, [None] * total) for column in SUBJECT_COLUMNS),
+                columns["hits"],
+            )
+        ]
+        return cls(
+            d["accession"],
+            subjects=subjects,
+            clusters=[
+                Cluster.from_dict(cluster, *(subjects[ix] for ix in cluster["indices"]))
+                for cluster in d["clusters"]
+            ],
+        )
+
+    @classmethod
+    def from_dict(cls, d, records=None):
+        subjects = [
+            Subject.from_dict(subject, records=records)
+            for subject in d["subjects"]
+        ]
         clusters = [None] * len(d["clusters"])
         for index, cluster in enumerate(d["clusters"]):
             cluster_subjects = [subjects[ix] for ix in cluster["indices"]]
@@ -273,6 +584,65 @@ class Scaffold(Serializer):
         return cls(accession=d["accession"], subjects=subjects, clusters=clusters)
 
 
+class ClusterScorer:
+    """Scores clusters of Subjects against a fixed query sequence order.
+
+    The position of each query sequence is looked up from a dictionary, and the best
+    hit of each Subject is cached, so a single scorer can be shared across every
+    scaffold in a session. Subjects whose best hit is to a query sequence not in
+    query_sequence_order do not contribute to the synteny score.
+
+    Attributes:
+        positions (dict): Position of each query sequence in the query file.
+        best_hits (dict): Hits of each Subject, and the best of them, keyed on id().
+    """
+
+    __slots__ = ("positions", "best_hits")
+
+    def __init__(self, query_sequence_order=None):
+        self.positions = {}
+        for index, query in enumerate(query_sequence_order or []):
+            self.positions.setdefault(query, index)
+        self.best_hits = {}
+
+    def best_hit(self, subject):
+        """Gets the Hit with the highest bitscore of a Subject, or None if it has none.
+
+        The Subject's current list of hits is stored with its best hit, so a cached
+        hit is only reused while the Subject has not been filtered again.
+        """
+        hits, best = self.best_hits.get(id(subject), (None, None))
+        if hits is not subject.hits:
+            hits = subject.hits
+            best = max(hits, key=attrgetter("bitscore")) if hits else None
+            self.best_hits[id(subject)] = (hits, best)
+        return best
+
+    def synteny_score(self, best_hits):
+        """Counts adjacent Subjects hit by adjacent query sequences in the same order."""
+        if not self.positions:
+            return 0
+        positions = [
+            self.positions.get(hit.query) if hit else None for hit in best_hits
+        ]
+        score = 0
+        for query, next_query in zip(positions, positions[1:]):
+            if query is not None and next_query is not None:
+                if abs(query - next_query) == 1:
+                    score += 1
+        return score
+
+    def score(self, subjects):
+        """Calculates the score of a cluster of Subjects; see Cluster.calculate_score()."""
+        best_hits = [self.best_hit(subject) for subject in subjects]
+        bitscore = sum(hit.bitscore for hit in best_hits if hit)
+        return bitscore / 10000 + len(subjects) + self.synteny_score(best_hits)
+
+    def score_clusters(self, clusters):
+        """Calculates the scores of a collection of clusters of Subjects."""
+        return [self.score(subjects) for subjects in clusters]
+
+
 class Cluster(Serializer):
     """A cluster of subjects on the same scaffold
 
@@ -283,8 +653,14 @@ class Cluster(Serializer):
         These are not serialised for this cluster
         start (int): The start coordinate of the cluster on the parent scaffold
         end (int): The end coordinate of the cluster on the parent scaffold
+        genes (list): [name, start, end, strand] lists of every gene in the
+        region of this cluster, including genes without hits. Only set when
+        retrieved from a local database (see context.find_intermediate_genes),
+        and extracted by cblaster extract --intermediate_genes
     """
 
+    __slots__ = ("indices", "subjects", "score", "start", "end", "genes")
+
     def __init__(
         self,
         indices=None,
@@ -293,12 +669,14 @@ class Cluster(Serializer):
         score=None,
         start=None,
         end=None,
+        genes=None,
     ):
         self.indices = indices if indices else []
         self.subjects = subjects if subjects else []
         self.score = score if score else self.calculate_score(query_sequence_order)
         self.start = start if start else self.subjects[0].start
         self.end = end if end else self.subjects[-1].end
+        self.genes = genes
 
     def __iter__(self):
         return iter(self.subjects)
@@ -306,29 +684,6 @@ class Cluster(Serializer):
     def __len__(self):
         return len(self.subjects)
 
-    def __calculate_synteny_score(self, query_sequence_order):
-        if not query_sequence_order:
-            return 0
-        positions = []
-        for index, subject in enumerate(self.subjects):
-            best_hit = max(subject.hits, key=lambda h: h.bitscore)
-            pair = (query_sequence_order.index(best_hit.query), index)
-            positions.append(pair)
-        score = 0
-        for index, position in enumerate(positions[:-1]):
-            query, subject = position
-            next_query, next_subject = positions[index + 1]
-            if abs(query - next_query) < 2 and abs(query - next_query) == abs(
-                subject - next_subject
-            ):
-                score += 1
-        return score
-
-    def __calculate_bitscore(self):
-        return sum(
-            max(hit.bitscore for hit in subject.hits) for subject in self.subjects
-        )
-
     def calculate_score(self, query_sequence_order=None):
         """Calculate the score of the current cluster
 
@@ -342,17 +697,18 @@ class Cluster(Serializer):
         Returns:
             a float
         """
-        synteny_score = self.__calculate_synteny_score(query_sequence_order)
-        bitscore = self.__calculate_bitscore()
-        return bitscore / 10000 + len(self.subjects) + synteny_score
+        return ClusterScorer(query_sequence_order).score(self.subjects)
 
     def to_dict(self):
-        return {
+        d = {
             "indices": self.indices,
             "score": self.score,
             "start": self.start,
             "end": self.end,
         }
+        if self.genes:
+            d["genes"] = self.genes
+        return d
 
     @classmethod
     def from_dict(cls, d, *subjects):
@@ -362,6 +718,7 @@ class Cluster(Serializer):
             score=d["score"],
             start=d["start"],
             end=d["end"],
+            genes=d.get("genes"),
         )
 
 
@@ -372,23 +729,99 @@ class Subject(Serializer):
     important since it allows for subject sequences which hit >1 of
     the query sequences, while still staying non-redundant.
 
+    Members of the same Identical Protein Group (IPG) share the same Hit objects,
+    so the `subject` attribute of a Hit may name another member of the group. The
+    name of this subject sequence is always `name`, which is used in place of the
+    Hit `subject` when serialising or formatting hits.
+
+    Hits can be filtered with new thresholds without discarding any (see filter()),
+    such that a Session can be filtered again with looser thresholds later on.
+
     Attributes:
-        hits (list): Hit objects referencing this subject sequence.
+        hits (list): Hit objects referencing this subject sequence that pass the
+            current thresholds.
+        all_hits (list): All Hit objects referencing this subject sequence.
         ipg (int): NCBI Identical Protein Group (IPG) id.
         start (int): Start of sequence on parent scaffold.
         end (int): End of sequence on parent scaffold.
         strand (str): Strandedness of the sequence ('+' or '-').
+        ordinal (int): Position of the sequence among all genes on the parent scaffold.
+            Only available in local searches against databases storing gene ordinals.
     """
 
+    __slots__ = (
+        "all_hits", "view", "ipg", "name", "start", "end", "strand", "ordinal"
+    )
+
     def __init__(
-        self, hits=None, name=None, ipg=None, start=None, end=None, strand=None
+        self,
+        hits=None,
+        name=None,
+        ipg=None,
+        start=None,
+        end=None,
+        strand=None,
+        ordinal=None,
     ):
         self.hits = hits if hits else []
-        self.ipg = ipg
+        self.ipg = intern(ipg)
         self.name = name
         self.start = int(start) if start is not None else None
         self.end = int(end) if end is not None else None
-        self.strand = strand
+        self.strand = intern(strand)
+        self.ordinal = ordinal
+
+    @property
+    def hits(self):
+        return self.all_hits if self.view is None else self.view
+
+    @hits.setter
+    def hits(self, hits):
+        self.all_hits = hits
+        self.view = None
+
+    def filter(self, min_identity=None, min_coverage=None, max_evalue=None):
+        """Hides Hit objects that do not pass the given thresholds.
+
+        Thresholds are always applied to `all_hits`, so this can be called repeatedly
+        with different values. Calling it with no thresholds shows all Hit objects.
+
+        Args:
+            min_identity (float): Minimum hit identity.
+            min_coverage (float): Minimum hit query coverage.
+            max_evalue (float): Maximum hit e-value.
+        """
+        if min_identity is None and min_coverage is None and max_evalue is None:
+            self.view = None
+            return
+        self.view = [
+            hit
+            for hit in self.all_hits
+            if (
+                (min_identity is None or hit.identity > min_identity)
+                and (min_coverage is None or hit.coverage > min_coverage)
+                and (max_evalue is None or hit.evalue < max_evalue)
+            )
+        ]
+
+    def merge(self, other):
+        """Merges the hits of another Subject into a new Subject.
+
+        Returns this Subject if the other has no new Hit objects.
+        """
+        seen = set(self.hits)
+        hits = [hit for hit in other.hits if hit not in seen]
+        if not hits:
+            return self
+        return Subject(
+            hits=self.hits + hits,
+            name=self.name,
+            ipg=self.ipg,
+            start=self.start,
+            end=self.end,
+            strand=self.strand,
+            ordinal=self.ordinal,
+        )
 
     def __eq__(self, other):
         if not isinstance(other, Subject):
@@ -402,20 +835,23 @@ class Subject(Serializer):
         )
 
     def to_dict(self):
-        return {
-            "hits": [hit.to_dict() for hit in self.hits],
+        d = {
+            "hits": [hit.to_dict(subject=self.name) for hit in self.hits],
             "name": self.name,
             "ipg": self.ipg,
             "start": self.start,
             "end": self.end,
             "strand": self.strand,
         }
+        if self.ordinal is not None:
+            d["ordinal"] = self.ordinal
+        return d
 
     def values(self, decimals=4):
         records = []
         for hit in self.hits:
             record = (
-                *hit.values(decimals),
+                *hit.values(decimals, subject=self.name),
                 str(self.start),
                 str(self.end),
                 self.strand,
@@ -424,14 +860,40 @@ class Subject(Serializer):
         return records
 
     @classmethod
-    def from_dict(cls, d):
+    def from_dict(cls, d, records=None):
+        """Loads a Subject from dict.
+
+        Args:
+            d (dict): Serialised Subject.
+            records (dict): Hit objects already loaded for other Subjects, keyed on
+                IPG and score values. Hits in the same IPG are reused from this dict
+                instead of creating new objects for every member of the group.
+        """
+        ipg = d.get("ipg")
+        if records is None or not ipg:
+            hits = [Hit.from_dict(h) for h in d["hits"]]
+        else:
+            hits = []
+            for h in d["hits"]:
+                key = (
+                    ipg,
+                    h["query"],
+                    h["identity"],
+                    h["coverage"],
+                    h["evalue"],
+                    h["bitscore"],
+                )
+                if key not in records:
+                    records[key] = Hit.from_dict(h)
+                hits.append(records[key])
         return cls(
-            hits=[Hit.from_dict(h) for h in d["hits"]],
+            hits=hits,
             name=d.get("name"),
             ipg=d.get("ipg"),
             start=d.get("start"),
             end=d.get("end"),
             strand=d.get("strand"),
+            ordinal=d.get("ordinal"),
         )
 
 
@@ -451,16 +913,18 @@ class Hit(Serializer):
         bitscore (float): Bitscore of hit.
     """
 
+    __slots__ = ("query", "subject", "identity", "coverage", "evalue", "bitscore")
+
     def __init__(self, query, subject, identity, coverage, evalue, bitscore):
-        self.query = query
+        self.query = intern(query)
 
         if "gb" in subject or "ref" in subject:
             subject = re.search(r"\|([A-Za-z0-9\._]+)\|", subject).group(1)
         ## Made id & Coverage a None type, hmmer does not have those values
         self.subject = subject
         self.bitscore = float(bitscore)
-        self.identity = identity
-        self.coverage = coverage
+        self.identity = float(identity) if identity is not None else None
+        self.coverage = float(coverage) if coverage is not None else None
         self.evalue = float(evalue)
 
     def __str__(self):
@@ -482,32 +946,33 @@ class Hit(Serializer):
 
     def copy(self, **kwargs):
         """Creates a copy of this Hit with any additional args."""
-        copy = Hit(**self.__dict__)
+        copy = Hit(**{slot: getattr(self, slot) for slot in self.__slots__})
         for key, val in kwargs.items():
             setattr(copy, key, val)
         return copy
 
-    def values(self, decimals=4):
+    def values(self, decimals=4, subject=None):
         """Formats hit attributes for printing.
 
         Args:
             decimals (int): Total decimal places to show in score values.
+            subject (str): Subject name to show instead of `self.subject`.
         Returns:
             List of formatted attribute strings.
         """
         return [
             self.query,
-            self.subject,
+            subject if subject else self.subject,
             f"{round(self.identity, decimals):g}",
             f"{round(self.coverage, decimals):g}",
             f"{self.evalue:.{decimals}g}",
             f"{round(self.bitscore, decimals):g}",
         ]
 
-    def to_dict(self):
+    def to_dict(self, subject=None):
         return {
             "query": self.query,
-            "subject": self.subject,
+            "subject": subject if subject else self.subject,
             "identity": self.identity,
             "coverage": self.coverage,
             "evalue": self.evalue,
@@ -14,7 +14,7 @@ Given a list of Hit objects (resulting from a cblaster search), we can call it:
 This will:
 1. Search the identifiers of the subject hits against the IPG and retrieve results
 2. Parse protein groups from the IPG table
-3. Create Subject objects for each entry in any given IPG, containing copies of Hit objects, grouped by organism and scaffold
+3. Create Subject objects for each entry in any given IPG, sharing the same Hit objects, grouped by organism and scaffold
 4. Identify clusters based on user thresholds for intergenic distance, copy number, etc
 5. De-duplicate clusters within an organism, where all Subject objects in any two clusters are members of the same IPG
 
@@ -27,99 +27,238 @@ objects linking them to the query sequences.
 """
 
 
+import io
 import logging
-from collections import defaultdict, namedtuple
-from itertools import combinations, product
-from operator import attrgetter
+import time
+from collections import defaultdict, deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import chain
+from operator import attrgetter, itemgetter
 from functools import partial
+from pathlib import Path
 
 import requests
 import numpy as np
 
-from cblaster import database
-from cblaster.classes import Organism, Scaffold, Subject
+from cblaster import cache, database, helpers
+from cblaster.classes import ClusterScorer, Organism, Scaffold, Subject
 
 
 LOG = logging.getLogger(__name__)
 
+# Scaffolds with at least this many Subjects are clustered using NumPy; see
+# find_clusters_vectorised()
+VECTORISE_THRESHOLD = 1000
 
-def efetch_IPGs(ids, output_handle=None):
+# Flattened Subject positions used when sweeping cluster thresholds; see
+# layout_subjects()
+GNELayout = namedtuple(
+    "GNELayout", ["starts", "ends", "ipgs", "owners", "lengths", "edges"]
+)
+
+Entry = namedtuple(
+    "Entry",
+    [
+        "source",
+        "scaffold",
+        "start",
+        "end",
+        "strand",
+        "protein_id",
+        "protein_name",
+        "organism",
+        "strain",
+        "assembly",
+    ]
+)
+
+
+def efetch_IPG_chunk(ids, session=None, limiter=None, api_key=None):
+    """Queries the Identical Protein Groups (IPG) resource for one chunk of IDs.
+
+    Args:
+        ids (list): Valid NCBI sequence identifiers (max. 10000).
+        session (requests.Session): Session used to pool connections to NCBI.
+        limiter (helpers.RateLimiter): Rate limiter shared by all requests.
+        api_key (str): NCBI API key.
+    Raises:
+        requests.HTTPError: Received bad status code from NCBI.
+    Returns:
+        IPG table text returned by NCBI.
+    """
+    params = {
+        "db": "protein",
+        "rettype": "ipg",
+        "retmode": "text",
+        "retmax": 10000,
+    }
+    if api_key:
+        params["api_key"] = api_key
+
+    if limiter:
+        limiter.wait()
+
+    response = (session or requests).post(
+        "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/efetch.fcgi?",
+        params=params,
+        data={"id": ",".join(ids)},
+    )
+
+    if response.status_code != 200:
+        raise requests.HTTPError(
+            f"Error fetching sequences from NCBI [code {response.status_code}]."
+        )
+
+    return response.text
+
+
+def iter_IPG_tables(ids, api_key=None, max_workers=None):
     """Queries the Identical Protein Groups (IPG) resource for given IDs.
 
     The NCBI caps Efetch requests at 10000 maximum returned records (retmax=10000)
     so this function splits the supplied IDs into chunks of 10000 and queries NCBI
-    individually for each chunk.
+    individually for each chunk. Duplicate IDs are removed before chunking.
+
+    Chunks are fetched concurrently over a pooled connection, limited to the request
+    rate allowed by the NCBI (3 requests/s, or 10 requests/s with an API key). At
+    most `max_workers` responses are held at once; each is yielded in order as soon
+    as it and every chunk before it have been fetched.
 
     Args:
         ids (list): Valid NCBI sequence identifiers.
-        output_handle (file handle): File handle to write to.
-    Returns:
-        List of rows from resulting IPG table, split by newline.
+        api_key (str): NCBI API key. If not given, the NCBI_API_KEY environment
+            variable is used, if set.
+        max_workers (int): Maximum number of concurrent requests.
+    Yields:
+        Tuples of the IDs in a chunk and the IPG table text returned for them.
     """
+    ids = list(dict.fromkeys(ids))
 
     # Split into chunks since retmax=10000
     chunks = [ids[i: i + 10000] for i in range(0, len(ids), 10000)]
 
-    table = ""
-    for ix, chunk in enumerate(chunks, 1):
-        response = requests.post(
-            "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/efetch.fcgi?",
-            params={
-                "db": "protein",
-                "rettype": "ipg",
-                "retmode": "text",
-                "retmax": 10000,
-            },
-            data={"id": ",".join(chunk)},
+    api_key = helpers.get_ncbi_api_key(api_key)
+    rate = helpers.get_ncbi_rate(api_key)
+    limiter = helpers.RateLimiter(rate)
+    if not max_workers:
+        max_workers = rate
+
+    LOG.debug("Fetching IPGs for %i IDs in %i chunks", len(ids), len(chunks))
+
+    with requests.Session() as session, \
+            ThreadPoolExecutor(max_workers=max_workers) as executor:
+        fetch = partial(
+            efetch_IPG_chunk,
+            session=session,
+            limiter=limiter,
+            api_key=api_key,
         )
+        pending = deque()
+        for chunk in chunks:
+            pending.append((chunk, executor.submit(fetch, chunk)))
+            if len(pending) >= max_workers:
+                chunk, future = pending.popleft()
+                yield chunk, future.result()
+        while pending:
+            chunk, future = pending.popleft()
+            yield chunk, future.result()
+
+
+def efetch_IPGs(ids, output_handle=None, api_key=None, max_workers=None):
+    """Queries the Identical Protein Groups (IPG) resource for given IDs.
 
-        if response.status_code != 200:
-            raise requests.HTTPError(
-                f"Error fetching sequences from NCBI [code {response.status_code}]."
-            )
+    See iter_IPG_tables() for details.
 
-        table += response.text
+    Args:
+        ids (list): Valid NCBI sequence identifiers.
+        output_handle (file handle): File handle to write to.
+        api_key (str): NCBI API key.
+        max_workers (int): Maximum number of concurrent requests.
+    Returns:
+        List of rows from resulting IPG table, split by newline.
+    """
+    tables = [
+        table
+        for _, table in iter_IPG_tables(ids, api_key=api_key, max_workers=max_workers)
+    ]
 
     if output_handle:
         LOG.info("Writing IPG table to %s", output_handle.name)
-        output_handle.write(table)
+        for table in tables:
+            output_handle.write(table)
 
-    return table.split("\n")
+    return "".join(tables).split("\n")
 
 
-def parse_IP_groups(results):
-    """Parse groups from an Identical Protein Groups (IPG) table.
+def stream_IPGs(
+    ids,
+    output_handle=None,
+    api_key=None,
+    max_workers=None,
+    ipg_cache=None,
+):
+    """Generates rows of the IPG table for given IDs as each chunk is fetched.
+
+    Unlike efetch_IPGs(), the full table is never held in memory.
+
+    Args:
+        ids (list): Valid NCBI sequence identifiers.
+        output_handle (file handle): File handle to write to.
+        api_key (str): NCBI API key.
+        max_workers (int): Maximum number of concurrent requests.
+        ipg_cache (str): Path to IPG cache to save fetched rows to.
+    Yields:
+        Rows from resulting IPG table.
+    """
+    if output_handle:
+        LOG.info("Writing IPG table to %s", output_handle.name)
+    for chunk, table in iter_IPG_tables(ids, api_key=api_key, max_workers=max_workers):
+        if ipg_cache:
+            cache.store(table.split("\n"), chunk, ipg_cache)
+        if output_handle:
+            output_handle.write(table)
+        yield from io.StringIO(table)
+
+
+def iter_IP_groups(results):
+    """Generates groups from an Identical Protein Groups (IPG) table.
 
     This function converts rows in the IPG table to namedtuple objects which have
-    attributes corresponding to each field in the table. These objects are grouped
-    by the IPG they belong to.
+    attributes corresponding to each field in the table. Rows of an IPG are
+    contiguous in tables returned by the NCBI, so each group is yielded as soon as
+    the next one starts.
 
     Args:
-        results (list): Rows in the IPG table.
-    Returns:
-        Dictionary of table entries (namedtuple objects) grouped by IPG.
+        results (iterable): Rows in the IPG table.
+    Yields:
+        Tuples of IPG number and its table entries (namedtuple objects).
     """
-    fields = [
-        "source",
-        "scaffold",
-        "start",
-        "end",
-        "strand",
-        "protein_id",
-        "protein_name",
-        "organism",
-        "strain",
-        "assembly",
-    ]
-    Entry = namedtuple("Entry", fields)
-    groups = defaultdict(list)
+    ipg, group = None, []
     for line in results:
         if not line or line.startswith("Id\tSource") or line.isspace() \
                 or "skipping" in line:
             continue
-        ipg, *fields = line.strip("\n").split("\t")
-        entry = Entry(*fields)
-        groups[ipg].append(entry)
+        current, *fields = line.strip("\n").split("\t")
+        if current != ipg:
+            if group:
+                yield ipg, group
+            ipg, group = current, []
+        group.append(Entry(*fields))
+    if group:
+        yield ipg, group
+
+
+def parse_IP_groups(results):
+    """Parse groups from an Identical Protein Groups (IPG) table.
+
+    Args:
+        results (list): Rows in the IPG table.
+    Returns:
+        Dictionary of table entries (namedtuple objects) grouped by IPG.
+    """
+    groups = defaultdict(list)
+    for ipg, group in iter_IP_groups(results):
+        groups[ipg].extend(group)
     return groups
 
 
@@ -158,16 +297,21 @@ def parse_IPG_table(results, hits):
     """Links Hit objects to their genomic context from an IPG table.
 
     This function:
-    1. Parses entries from the table, grouped by IPG number with parse_IP_groups()
+    1. Parses entries from the table one IPG at a time with iter_IP_groups()
     2. For each group:
        a) Find Hit objects linked to any member of the group with find_IPG_hits()
        b) For each group member, create a Subject object, then place it on its
           corresponding Scaffold and Organism objects (creating new objects when new
           scaffolds and organisms are encountered)
-       c) Add Hit objects to every Subject object in the group
+       c) Add Hit objects to every Subject object in the group. The list of Hit
+          objects is shared by every member of the group, since only the subject name
+          differs, which is stored on the Subject
+
+    Since groups are consumed as they are parsed, `results` can be a generator (e.g.
+    from stream_IPGs()) and only one group is held in memory at a time.
 
     Args:
-        results (list): Results from IPG search.
+        results (iterable): Rows of the IPG table.
         hits (list): Hit objects that were used to query NCBI.
     Returns:
         Organism objects containing hits sorted into genomic scaffolds.
@@ -176,16 +320,20 @@ def parse_IPG_table(results, hits):
     # Group hits by their subject IDs
     hit_dict = group_hits(hits)
 
-    # Parse IPGs from the table
-    groups = parse_IP_groups(results)
-
     seen = set()
+    found = {}
     organisms = defaultdict(dict)
-    for ipg in list(groups):
-        group = groups.pop(ipg)
-
-        # Find any hits corresponding to this IPG
-        hit_list = find_IPG_hits(group, hit_dict)
+    for ipg, group in iter_IP_groups(results):
+
+        # Find any hits corresponding to this IPG. The same IPG can be returned in
+        # more than one chunk, so add to hits found in previous groups
+        hit_list = found.setdefault(ipg, [])
+        queries = set(hit.query for hit in hit_list)
+        hit_list.extend(
+            hit
+            for hit in find_IPG_hits(group, hit_dict)
+            if hit.query not in queries
+        )
 
         if not hit_list:
             LOG.warning("Found no hits for IPG %s", ipg)
@@ -218,9 +366,11 @@ def parse_IPG_table(results, hits):
             if acc not in organisms[org][st].scaffolds:
                 organisms[org][st].scaffolds[acc] = Scaffold(acc)
 
-            # Copy the original Hit object and add contextual information
+            # Share the original Hit objects and add contextual information. Every
+            # member shares the same list, so members of earlier occurrences of this
+            # IPG also get hits found in later ones
             subject = Subject(
-                hits=[hit.copy(subject=entry.protein_id) for hit in hit_list],
+                hits=hit_list,
                 name=entry.protein_id,
                 ipg=ipg,
                 end=int(entry.end),
@@ -257,13 +407,37 @@ def find_identifier(qualifiers):
     return None
 
 
-def query_local_DB(hits, db):
+def query_local_DB(hits, db, unique=0, min_hits=0, require=None):
     """Queries a local SQLite3 database created using the makedb module.
+
+    If any clustering thresholds are given, hits are first aggregated per scaffold
+    in the database, and only genes on scaffolds which could form a cluster are
+    returned (see database.query_database_candidates()).
+
+    Args:
+        hits (list): Hit objects, with subject set to the database row ID.
+        db (str): Path to SQLite3 database.
+        unique (int): Minimum number of distinct query sequences on a scaffold.
+        min_hits (int): Minimum number of hit genes on a scaffold.
+        require (list): Query sequences that must be hit on a scaffold.
+    Returns:
+        List of Organism objects.
     """
     organisms = defaultdict(dict)
     hit_dict = defaultdict(list)
     for hit in hits:
         hit_dict[hit.subject].append(hit)
+    if unique or min_hits or require:
+        rows = database.query_database_candidates(
+            [(int(hit.subject), hit.query) for hit in hits],
+            db,
+            unique=unique,
+            min_hits=min_hits,
+            require=require,
+        )
+        LOG.debug("%i of %i hit genes on candidate scaffolds", len(rows), len(hit_dict))
+    else:
+        rows = database.query_database(list(hit_dict), db)
     for (
         rowid,
         name,
@@ -271,8 +445,9 @@ def query_local_DB(hits, db):
         end_pos,
         strand,
         scaffold,
-        organism
-    ) in database.query_database(list(hit_dict), db):
+        organism,
+        ordinal,
+    ) in rows:
         if organism not in organisms:
             organisms[organism] = Organism(organism, "")
         if scaffold not in organisms[organism].scaffolds:
@@ -285,12 +460,44 @@ def query_local_DB(hits, db):
             hits=hits,
             start=int(start_pos),
             end=int(end_pos),
-            strand="+" if strand == 1 else "-"
+            strand="+" if strand == 1 else "-",
+            ordinal=ordinal,
         )
         organisms[organism].scaffolds[scaffold].subjects.append(subject)
     return [organism for organism in organisms.values()]
 
 
+def find_intermediate_genes(organisms, db, flank=0):
+    """Retrieves every gene in the region of each cluster from a local database.
+
+    This includes genes without any hits, such that full cluster loci are stored in
+    the session. Genes are stored on each Cluster as compact [name, start, end, strand]
+    lists (see Cluster.genes).
+
+    Args:
+        organisms (list): Organism objects with clusters, from query_local_DB().
+        db (str): Path to the SQLite3 database created using the makedb module.
+        flank (int): Additional bp either side of each cluster to retrieve genes from.
+    """
+    clusters, regions = [], []
+    for organism in organisms:
+        for scaffold in organism.scaffolds.values():
+            for cluster in scaffold.clusters:
+                clusters.append(cluster)
+                regions.append((
+                    organism.name,
+                    scaffold.accession,
+                    max(cluster.start - flank, 0),
+                    cluster.end + flank,
+                ))
+    LOG.info("Retrieving all genes in %i cluster regions", len(regions))
+    for cluster, genes in zip(clusters, database.query_regions(regions, db)):
+        cluster.genes = [
+            [name, start, end, "+" if strand == 1 else "-"]
+            for name, start, end, strand in genes
+        ]
+
+
 def cluster_satisfies_conditions(cluster, require=None, unique=3, minimum=3):
     """Tests if a cluster of Subjects meets query conditions.
 
@@ -305,21 +512,39 @@ def cluster_satisfies_conditions(cluster, require=None, unique=3, minimum=3):
     )
 
 
-def find_clusters(subjects, require=None, unique=3, min_hits=3, gap=20000):
+def find_clusters(
+    subjects, require=None, unique=3, min_hits=3, gap=20000, gene_gap=None
+):
     """Finds clusters of Hit objects matching user thresholds.
 
+    If gene_gap is given, Subjects are clustered on their ordinal position among all
+    genes on the scaffold instead of their coordinates, i.e. each Subject is treated
+    as starting and ending at its ordinal, with a gap of gene_gap + 1.
+
     Args:
         hits (list): Collection of Hit objects to find clusters in.
         require (list): Names of query sequences that must be represented in a cluster.
         unique (int): Unique query sequence threshold.
         min_hits (int): Minimum number of hits in a hit cluster.
         gap (int): Maximum intergenic distance (bp) between any two hits in a cluster.
+        gene_gap (int): Maximum number of genes between any two hits in a cluster.
     Returns:
         Clusters of Hit objects.
     """
-    if unique < 0 or min_hits < 0 or gap < 0:
+    if unique < 0 or min_hits < 0 or gap < 0 or (gene_gap is not None and gene_gap < 0):
         raise ValueError("Expected positive integer")
 
+    if gene_gap is None:
+        start, end = attrgetter("start"), attrgetter("end")
+    else:
+        if any(subject.ordinal is None for subject in subjects):
+            raise ValueError(
+                "gene_gap requires gene ordinals, which are only stored in local"
+                " databases built by this version of cblaster makedb"
+            )
+        start = end = attrgetter("ordinal")
+        gap = gene_gap + 1
+
     total_subjects = len(subjects)
 
     if total_subjects < unique:
@@ -330,9 +555,22 @@ def find_clusters(subjects, require=None, unique=3, min_hits=3, gap=20000):
             return [subjects]
         return []
 
-    sorted_subjects = sorted(subjects, key=attrgetter("start"))
+    if total_subjects >= VECTORISE_THRESHOLD and all(
+        end(subject) >= start(subject) for subject in subjects
+    ):
+        yield from find_clusters_vectorised(
+            subjects,
+            require=require,
+            unique=unique,
+            min_hits=min_hits,
+            gap=gap,
+            gene_gap=gene_gap,
+        )
+        return
+
+    sorted_subjects = sorted(subjects, key=start)
     first = sorted_subjects.pop(0)
-    group, border = [first], first.end
+    group, border = [first], end(first)
 
     rules_satisfied = partial(
         cluster_satisfies_conditions,
@@ -342,17 +580,82 @@ def find_clusters(subjects, require=None, unique=3, min_hits=3, gap=20000):
     )
 
     for subject in sorted_subjects:
-        if subject.start <= border + gap:
+        if start(subject) <= border + gap:
             group.append(subject)
-            border = max(border, subject.end)
+            border = max(border, end(subject))
         else:
             if rules_satisfied(group):
                 yield group
-            group, border = [subject], subject.end
+            group, border = [subject], end(subject)
     if rules_satisfied(group):
         yield group
 
 
+def find_clusters_vectorised(
+    subjects, require=None, unique=3, min_hits=3, gap=20000, gene_gap=None
+):
+    """Finds clusters of Subject objects using NumPy arrays.
+
+    This gives exactly the same clusters as find_clusters(), which calls it for
+    scaffolds with many Subjects, provided no Subject ends before it starts (the
+    running maximum of end coordinates is then the border of the current cluster).
+    Subjects are sorted by start coordinate, and a new
+    cluster is started wherever a Subject starts more than `gap` bp after the furthest
+    end coordinate of the Subjects before it. The queries hit by each cluster are then
+    found with a single reduction over a Subject by query matrix.
+
+    Args:
+        subjects (list): Subject objects to find clusters in.
+        require (list): Names of query sequences that must be represented in a cluster.
+        unique (int): Unique query sequence threshold.
+        min_hits (int): Minimum number of hits in a hit cluster.
+        gap (int): Maximum intergenic distance (bp) between any two hits in a cluster.
+        gene_gap (int): Maximum number of genes between any two hits in a cluster.
+    Yields:
+        Clusters of Subject objects.
+    """
+    total = len(subjects)
+    if gene_gap is None:
+        start, end = attrgetter("start"), attrgetter("end")
+    else:
+        start = end = attrgetter("ordinal")
+        gap = gene_gap + 1
+    starts = np.fromiter(map(start, subjects), np.int64, count=total)
+    ends = np.fromiter(map(end, subjects), np.int64, count=total)
+
+    order = np.argsort(starts, kind="stable")
+    starts, ends = starts[order], ends[order]
+    border = np.maximum.accumulate(ends)
+    bounds = np.concatenate((
+        [0],
+        np.flatnonzero(starts[1:] > border[:-1] + gap) + 1,
+        [total],
+    ))
+
+    # Build a Subject by query matrix of which queries are hit by each Subject, with
+    # rows in sorted order
+    hits = [subject.hits for subject in subjects]
+    queries = list(map(attrgetter("query"), chain.from_iterable(hits)))
+    indices = {query: index for index, query in enumerate(dict.fromkeys(queries))}
+    ranks = np.empty(total, dtype=np.int64)
+    ranks[order] = np.arange(total)
+    rows = np.repeat(ranks, [len(subject_hits) for subject_hits in hits])
+    columns = np.fromiter(map(indices.__getitem__, queries), dtype=np.int64)
+    if require and not all(query in indices for query in require):
+        return
+    matrix = np.zeros((total, max(len(indices), 1)), dtype=bool)
+    matrix[rows, columns] = True
+    represented = np.logical_or.reduceat(matrix, bounds[:-1], axis=0)
+
+    valid = (np.diff(bounds) >= min_hits) & (represented.sum(axis=1) >= unique)
+    if require:
+        valid &= represented[:, [indices[query] for query in require]].all(axis=1)
+
+    order, bounds = order.tolist(), bounds.tolist()
+    for index in np.flatnonzero(valid).tolist():
+        yield [subjects[i] for i in order[bounds[index]:bounds[index + 1]]]
+
+
 def clusters_are_identical(one, two):
     """Tests if two collections of Subject objects are identical.
 
@@ -369,6 +672,19 @@ def clusters_are_identical(one, two):
     return True
 
 
+def cluster_signature(cluster):
+    """Gets the IPG numbers of every Subject in a cluster, in order.
+
+    Returns:
+        Tuple of IPG numbers, or None if any Subject is not part of an IPG (in which
+        case the cluster cannot be identical to any other cluster).
+    """
+    signature = tuple(subject.ipg for subject in cluster)
+    if not all(signature):
+        return None
+    return signature
+
+
 def deduplicate(organism):
     """Removes any duplicate clusters within an Organism.
 
@@ -376,15 +692,20 @@ def deduplicate(organism):
     attempts to remedy this partially by searching for identical clusters within a
     single, unique Organism. Clusters are compared from start to finish, and are tagged
     for removal if every Subject is of the same IPG for the length of the clusters.
+
+    Clusters are indexed by their IPG signature (see cluster_signature()), so any
+    cluster whose signature was already found on an earlier scaffold is removed.
     """
-    remove = defaultdict(list)
-    for scafA, scafB in combinations(organism.scaffolds.values(), 2):
-        for one, two in product(scafA.clusters, scafB.clusters):
-            if clusters_are_identical(one, two):
-                remove[scafB.accession].append(two)
-    for accession, clusters in remove.items():
-        scaffold = organism.scaffolds[accession]
-        scaffold.clusters = [c for c in scaffold.clusters if c not in clusters]
+    first_seen = {}
+    for index, scaffold in enumerate(organism.scaffolds.values()):
+        clusters = []
+        for cluster in scaffold.clusters:
+            signature = cluster_signature(cluster)
+            if signature is not None:
+                if first_seen.setdefault(signature, index) < index:
+                    continue
+            clusters.append(cluster)
+        scaffold.clusters = clusters
 
 
 def find_clusters_in_organism(
@@ -394,9 +715,17 @@ def find_clusters_in_organism(
     gap=20000,
     require=None,
     remote=True,
-    query_sequence_order=None
+    query_sequence_order=None,
+    scorer=None,
+    gene_gap=None,
 ):
-    """Runs find_clusters() on all scaffolds in an organism."""
+    """Runs find_clusters() on all scaffolds in an organism.
+
+    A ClusterScorer can be given to share cached best hits between organisms;
+    otherwise, one is created from query_sequence_order.
+    """
+    if scorer is None:
+        scorer = ClusterScorer(query_sequence_order)
     for scaffold in organism.scaffolds.values():
         clusters = find_clusters(
             scaffold.subjects,
@@ -404,8 +733,9 @@ def find_clusters_in_organism(
             min_hits=min_hits,
             gap=gap,
             require=require,
+            gene_gap=gene_gap,
         )
-        scaffold.add_clusters(clusters, query_sequence_order=query_sequence_order)
+        scaffold.add_clusters(clusters, scorer=scorer)
         LOG.debug(
             "Organism: %s, Scaffold: %s, Clusters: %i",
             organism.full_name,
@@ -416,6 +746,138 @@ def find_clusters_in_organism(
         deduplicate(organism)
 
 
+def organism_clusters(
+    organism, gap=20000, unique=3, min_hits=3, require=None, gene_gap=None
+):
+    """Runs find_clusters() on all scaffolds in an Organism.
+
+    Returns:
+        List of clusters in each scaffold, given as indices of their Subjects.
+    """
+    results = []
+    for scaffold in organism.scaffolds.values():
+        positions = {
+            id(subject): index for index, subject in enumerate(scaffold.subjects)
+        }
+        results.append([
+            [positions[id(subject)] for subject in cluster]
+            for cluster in find_clusters(
+                scaffold.subjects,
+                gap=gap,
+                min_hits=min_hits,
+                require=require,
+                unique=unique,
+                gene_gap=gene_gap,
+            )
+        ])
+    return results
+
+
+def _cluster_chunk(index, organisms, **kwargs):
+    """Runs organism_clusters() on a chunk of Organisms, timing it."""
+    began = time.perf_counter()
+    results = [organism_clusters(organism, **kwargs) for organism in organisms]
+    return index, results, time.perf_counter() - began
+
+
+def cluster_organisms(
+    organisms,
+    unique=3,
+    min_hits=3,
+    gap=20000,
+    require=None,
+    query_sequence_order=None,
+    remote=True,
+    cpus=None,
+    chunk_size=None,
+    gene_gap=None,
+):
+    """Finds clusters in a collection of Organisms, optionally in parallel.
+
+    Organisms are partitioned into chunks, which are sent to a process pool (or a
+    thread pool on free-threaded Python builds). Workers only return the positions of
+    clustered Subjects, so Cluster objects are still created in this process.
+
+    Args:
+        organisms (list): Organism objects.
+        unique (int): Unique query sequence threshold.
+        min_hits (int): Minimum number of hits in a hit cluster.
+        gap (int): Maximum intergenic distance (bp) between any two hits in a cluster.
+        require (list): Names of query sequences that must be represented in a cluster.
+        query_sequence_order (list): Order of query sequences, used in cluster scores.
+        remote (bool): Remove duplicate clusters (see deduplicate()).
+        cpus (int): Total workers; if None or 1, clusters are found in this process.
+        chunk_size (int): Total Organisms per chunk. By default, 4 chunks per worker.
+        gene_gap (int): Maximum number of genes between any two hits in a cluster.
+    """
+    scorer = ClusterScorer(query_sequence_order)
+    if cpus is None or cpus == 1 or len(organisms) < 2:
+        for organism in organisms:
+            find_clusters_in_organism(
+                organism,
+                unique=unique,
+                min_hits=min_hits,
+                gap=gap,
+                require=require,
+                remote=remote,
+                scorer=scorer,
+                gene_gap=gene_gap,
+            )
+        return
+
+    organisms = list(organisms)
+    if not chunk_size:
+        chunk_size = max(1, -(-len(organisms) // (cpus * 4)))
+    chunks = [
+        organisms[i:i + chunk_size] for i in range(0, len(organisms), chunk_size)
+    ]
+    if helpers.free_threaded():
+        LOG.debug("Free-threaded build detected, using threads")
+        executor = ThreadPoolExecutor(max_workers=cpus)
+    else:
+        executor = ProcessPoolExecutor(max_workers=cpus)
+
+    began = time.perf_counter()
+    with executor:
+        futures = [
+            executor.submit(
+                _cluster_chunk,
+                index,
+                chunk,
+                unique=unique,
+                min_hits=min_hits,
+                gap=gap,
+                require=require,
+                gene_gap=gene_gap,
+            )
+            for index, chunk in enumerate(chunks)
+        ]
+        for future in futures:
+            index, results, elapsed = future.result()
+            LOG.debug(
+                "Chunk %i/%i: %i organisms in %.2fs",
+                index + 1,
+                len(chunks),
+                len(chunks[index]),
+                elapsed,
+            )
+            for organism, clusters in zip(chunks[index], results):
+                for scaffold, indices in zip(organism.scaffolds.values(), clusters):
+                    subjects = scaffold.subjects
+                    scaffold.add_clusters(
+                        [[subjects[i] for i in cluster] for cluster in indices],
+                        scorer=scorer,
+                    )
+                if remote:
+                    deduplicate(organism)
+    LOG.info(
+        "Found clusters in %i chunks of %i organisms in %.2fs",
+        len(chunks),
+        chunk_size,
+        time.perf_counter() - began,
+    )
+
+
 def filter_session(
     session,
     min_identity=30,
@@ -425,33 +887,124 @@ def filter_session(
     unique=3,
     min_hits=3,
     require=None,
+    cpus=None,
+    gene_gap=None,
 ):
     """Filter a Session object with new thresholds.
 
-    This function is destructive!
+    Hits that do not pass the thresholds are hidden rather than discarded (see
+    Subject.filter()), so the Session can be filtered again with looser thresholds.
+    Clusters of every scaffold are replaced, and any intermediate genes are found again
+    for the new clusters (see restore_intermediate_genes()). A warning is logged if
+    the thresholds are looser than those hits were pre-filtered with when searching
+    (see check_prefilter()).
+
+    Args:
+        session (Session): cblaster Session object.
+        min_identity (float): Minimum hit identity.
+        min_coverage (float): Minimum hit query coverage.
+        max_evalue (float): Maximum hit e-value.
+        gap (int): Maximum intergenic distance (bp) between any two hits in a cluster.
+        unique (int): Unique query sequence threshold.
+        min_hits (int): Minimum number of hits in a hit cluster.
+        require (list): Names of query sequences that must be represented in a cluster.
+        cpus (int): Total workers used to find clusters (see cluster_organisms()).
+        gene_gap (int): Maximum number of genes between any two hits in a cluster.
     """
+    check_prefilter(session, unique=unique, min_hits=min_hits, require=require)
+    stored = {}
     for organism in session.organisms:
         for scaffold in organism.scaffolds.values():
+            genes = {
+                tuple(gene)
+                for cluster in scaffold.clusters
+                for gene in cluster.genes or []
+            }
+            if genes:
+                stored[id(scaffold)] = sorted(genes, key=itemgetter(1))
+            scaffold.clusters = []
             for subject in scaffold.subjects:
-                subject.hits = [
-                    hit
-                    for hit in subject.hits
-                    if (
-                        hit.identity > min_identity
-                        and hit.coverage > min_coverage
-                        and hit.evalue < max_evalue
-                    )
+                subject.filter(min_identity, min_coverage, max_evalue)
+    cluster_organisms(
+        session.organisms,
+        unique=unique,
+        min_hits=min_hits,
+        gap=gap,
+        require=require,
+        query_sequence_order=session.queries,
+        cpus=cpus,
+        gene_gap=gene_gap,
+    )
+    if stored:
+        restore_intermediate_genes(session, stored)
+
+
+def check_prefilter(session, unique=3, min_hits=3, require=None):
+    """Warns if a session was pre-filtered with stricter clustering thresholds.
+
+    Local searches only keep hits on scaffolds which could form a cluster (see
+    query_local_DB()), unless run with keep_all_hits. Those thresholds are saved in
+    the `prefilter` session parameter.
+
+    Returns:
+        True if hits needed to find clusters with these thresholds may be missing.
+    """
+    prefilter = session.params.get("prefilter")
+    if not prefilter:
+        return False
+    looser = (
+        (unique or 0) < (prefilter["unique"] or 0)
+        or (min_hits or 0) < (prefilter["min_hits"] or 0)
+        or not set(prefilter["require"] or []).issubset(require or [])
+    )
+    if looser:
+        LOG.warning(
+            "Session was searched keeping only hits on scaffolds with at least %s"
+            " unique queries, %s hits and required queries %s. Clusters meeting"
+            " looser thresholds may be missed; search again with --keep_all_hits"
+            " to find them",
+            prefilter["unique"],
+            prefilter["min_hits"],
+            prefilter["require"] or [],
+        )
+    return looser
+
+
+def restore_intermediate_genes(session, stored):
+    """Finds intermediate genes of recomputed clusters.
+
+    Genes are retrieved from the local database the session was searched against
+    (see find_intermediate_genes()). If it no longer exists, genes stored on the
+    previous clusters are kept where they fall in the new cluster regions.
+
+    Args:
+        session (Session): cblaster Session object, with recomputed clusters.
+        stored (dict): (name, start, end, strand) tuples of genes stored on previous
+            clusters, sorted by start and keyed on the id() of their Scaffold.
+    """
+    flank = session.params.get("intermediate_flank", 0)
+    db = session.params.get("sqlite_db")
+    if db and Path(db).exists():
+        find_intermediate_genes(session.organisms, db, flank=flank)
+        return
+    LOG.warning(
+        "Database %s not found, keeping only stored intermediate genes", db
+    )
+    for organism in session.organisms:
+        for scaffold in organism.scaffolds.values():
+            genes = stored.get(id(scaffold), [])
+            for cluster in scaffold.clusters:
+                start, end = max(cluster.start - flank, 0), cluster.end + flank
+                cluster.genes = [
+                    list(gene) for gene in genes if start <= gene[1] <= end
                 ]
-            clusters = find_clusters(
-                scaffold.subjects,
-                gap=gap,
-                min_hits=min_hits,
-                require=require,
-                unique=unique,
-            )
-            scaffold.clusters = []
-            scaffold.add_clusters(clusters, query_sequence_order=session.queries)
-        deduplicate(organism)
+
+
+def gne_statistics(sizes):
+    """Computes the total number, mean and median size of a list of cluster sizes."""
+    if not sizes:
+        return 0, 0, 0
+    return len(sizes), float(np.mean(sizes)), int(np.median(sizes))
 
 
 def calculate_gne(session):
@@ -460,41 +1013,236 @@ def calculate_gne(session):
     Mean gn size
     Median gn size
     """
-    clusters = [
+    return gne_statistics([
         cluster.end - cluster.start
         for organism in session.organisms
         for accession, scaffold in organism.scaffolds.items()
         for cluster in scaffold.clusters
-    ]
-    if not clusters:
-        return 0, 0, 0
-    return (
-        len(clusters),
-        float(np.mean(clusters)),
-        int(np.median(clusters))
-    )
+    ])
+
 
+def gap_space(max_gap=100000, samples=100, scale="linear"):
+    """Generates the gap values sampled during neighbourhood estimation.
 
-def estimate_neighbourhood(session, max_gap=100000, samples=100, scale="linear"):
-    """Estimate gene neighbourhood of a cblaster session."""
+    Args:
+        max_gap (int): Largest gap value to sample.
+        samples (int): Total number of gap values.
+        scale (str): Spacing of gap values, either 'linear' or 'log'.
+    Returns:
+        List of integer gap values.
+    """
     if scale == "linear":
         space = np.linspace(0, max_gap, num=samples)
     elif scale == "log":
         space = np.geomspace(1, max_gap, num=samples)
     else:
         raise ValueError("Invalid scale specified, expected 'linear' or 'log'")
+    return [int(value) for value in space]
+
+
+def layout_subjects(organisms):
+    """Flattens the Subjects of a collection of Organisms for threshold sweeps.
+
+    Subjects on each scaffold are sorted by start coordinate, and the distance between
+    each Subject and the furthest end coordinate of any previous Subject on the scaffold
+    is recorded. Since find_clusters() only ever starts a new cluster when this distance
+    exceeds the gap threshold, it is independent of the gap and only has to be computed
+    once.
+
+    Args:
+        organisms (iterable): Organism objects.
+    Returns:
+        Tuple of the flattened Subject objects and a GNELayout of their positions.
+    """
+    subjects = []
+    layout = GNELayout([], [], [], [], [], [])
+    for organism_index, organism in enumerate(organisms):
+        for scaffold_index, scaffold in enumerate(organism.scaffolds.values()):
+            border = None
+            total = len(scaffold.subjects)
+            for subject in sorted(scaffold.subjects, key=attrgetter("start")):
+                if border is not None:
+                    layout.edges.append((subject.start - border, len(subjects) - 1))
+                border = subject.end if border is None else max(border, subject.end)
+                subjects.append(subject)
+                layout.starts.append(subject.start)
+                layout.ends.append(subject.end)
+                layout.ipgs.append(subject.ipg)
+                layout.owners.append((organism_index, scaffold_index))
+                layout.lengths.append(total)
+    layout.edges.sort()
+    return subjects, layout
+
+
+def query_bitmasks(
+    subjects,
+    indices,
+    min_identity=30,
+    min_coverage=50,
+    max_evalue=0.01,
+):
+    """Encodes the query sequences hit by each Subject as an integer bitmask.
+
+    Args:
+        subjects (list): Subject objects.
+        indices (dict): Bit index of each query sequence; updated with any new queries.
+        min_identity (float): Minimum hit identity.
+        min_coverage (float): Minimum hit query coverage.
+        max_evalue (float): Maximum hit e-value.
+    Returns:
+        List of bitmasks of queries with hits passing the thresholds.
+    """
+    masks = []
+    for subject in subjects:
+        mask = 0
+        for hit in subject.all_hits:
+            if (
+                hit.identity > min_identity
+                and hit.coverage > min_coverage
+                and hit.evalue < max_evalue
+            ):
+                mask |= 1 << indices.setdefault(hit.query, len(indices))
+        masks.append(mask)
+    return masks
+
+
+def sweep_gaps(layout, queries, gaps, unique=3, min_hits=3, require=0):
+    """Computes neighbourhood statistics of clusters over a range of gap values.
+
+    This gives the same clusters as running find_clusters() and deduplicate() on every
+    scaffold for each gap value. Gap values are swept in ascending order, merging
+    adjacent clusters whenever the distance between them falls under the current gap.
+    Since clusters are always contiguous runs of Subjects, each is tracked by its first
+    and last position, and only clusters affected by a merge are re-tested.
+
+    Args:
+        layout (GNELayout): Subject positions from layout_subjects().
+        queries (list): Query bitmasks of each Subject from query_bitmasks().
+        gaps (list): Gap values to compute statistics for.
+        unique (int): Unique query sequence threshold.
+        min_hits (int): Minimum number of hits in a cluster.
+        require (int): Bitmask of query sequences that must be in a cluster.
+    Returns:
+        Dictionary of gap values and (no. clusters, mean size, median size) tuples.
+    """
+    # Scaffolds with fewer than unique Subjects, or only one, never give clusters;
+    # this mimics find_clusters() returning early
+    shortest = max(unique, 2)
+    queries = list(queries)
+    first = list(range(len(queries)))
+    last = list(range(len(queries)))
+    signatures = {}
+
+    def is_cluster(start, end):
+        mask = queries[start]
+        return (
+            layout.lengths[start] >= shortest
+            and end - start + 1 >= min_hits
+            and bin(mask).count("1") >= unique
+            and mask & require == require
+        )
+
+    def signature(start):
+        if start not in signatures:
+            ipgs = tuple(layout.ipgs[start:last[start] + 1])
+            signatures[start] = ipgs if all(ipgs) else None
+        return signatures[start]
+
+    def summarise():
+        # Clusters are only removed by deduplicate() when their signature was first
+        # seen on an earlier scaffold in the same organism
+        first_seen = {}
+        for start in valid:
+            key = signature(start)
+            if key is None:
+                continue
+            organism, index = layout.owners[start]
+            key = (organism, key)
+            if index < first_seen.get(key, index + 1):
+                first_seen[key] = index
+        sizes = []
+        for start in valid:
+            key = signature(start)
+            organism, index = layout.owners[start]
+            if key is not None and first_seen[organism, key] < index:
+                continue
+            sizes.append(layout.ends[last[start]] - layout.starts[start])
+        return gne_statistics(sizes)
+
+    valid = {start for start in first if is_cluster(start, start)}
+    results, edge = {}, 0
+    for gap in sorted(set(gaps)):
+        while edge < len(layout.edges) and layout.edges[edge][0] <= gap:
+            left = layout.edges[edge][1]
+            start, end = first[left], last[left + 1]
+            valid.discard(start)
+            valid.discard(left + 1)
+            signatures.pop(start, None)
+            signatures.pop(left + 1, None)
+            queries[start] |= queries[left + 1]
+            last[start], first[end] = end, start
+            if is_cluster(start, end):
+                valid.add(start)
+            edge += 1
+        results[gap] = summarise()
+    return results
+
+
+def estimate_neighbourhood(
+    session,
+    max_gap=100000,
+    samples=100,
+    scale="linear",
+    min_identity=30,
+    min_coverage=50,
+    max_evalue=0.01,
+    unique=3,
+    min_hits=3,
+    require=None,
+):
+    """Estimate gene neighbourhood of a cblaster session.
+
+    This gives the same results as calling filter_session() and calculate_gne() for
+    every gap value, but does not modify the session and only has to filter hits and
+    sort Subjects once (see sweep_gaps()).
+
+    Args:
+        session (Session): cblaster Session object.
+        max_gap (int): Largest gap value to sample.
+        samples (int): Total number of gap values.
+        scale (str): Spacing of gap values, either 'linear' or 'log'.
+        min_identity (float): Minimum hit identity.
+        min_coverage (float): Minimum hit query coverage.
+        max_evalue (float): Maximum hit e-value.
+        unique (int): Unique query sequence threshold.
+        min_hits (int): Minimum number of hits in a cluster.
+        require (list): Names of query sequences that must be represented in a cluster.
+    Returns:
+        List of dictionaries containing the gap value, and the total number, mean and
+        median size of clusters at that gap value.
+    """
+    space = gap_space(max_gap=max_gap, samples=samples, scale=scale)
+    subjects, layout = layout_subjects(session.organisms)
+    indices = {}
+    required = 0
+    for query in require or []:
+        required |= 1 << indices.setdefault(query, len(indices))
+    queries = query_bitmasks(
+        subjects,
+        indices,
+        min_identity=min_identity,
+        min_coverage=min_coverage,
+        max_evalue=max_evalue,
+    )
+    computed = sweep_gaps(
+        layout, queries, space, unique=unique, min_hits=min_hits, require=required
+    )
     results = []
     for value in space:
-        value = int(value)
-        filter_session(session, gap=value)
-        clusters, means, medians = calculate_gne(session)
-        result = {
-            "gap": value,
-            "means": means,
-            "medians": medians,
-            "clusters": clusters,
-        }
-        results.append(result)
+        clusters, means, medians = computed[value]
+        results.append(
+            {"gap": value, "means": means, "medians": medians, "clusters": clusters}
+        )
     return results
 
 
@@ -507,6 +1255,14 @@ def search(
     require=None,
     ipg_file=None,
     query_sequence_order=None,
+    api_key=None,
+    ipg_cache=None,
+    ipg_cache_ttl=30,
+    cpus=None,
+    intermediate_genes=False,
+    intermediate_flank=0,
+    gene_gap=None,
+    keep_all_hits=False,
 ):
     """Gets the genomic context for a collection of Hit objects.
 
@@ -530,29 +1286,67 @@ def search(
         gap (int): Maximum intergenic distance (bp) between any two hits in a cluster.
         query_sequence_order (list): list of sequences of the order in the query file, is
         ipg_file:
+        api_key (str): NCBI API key used when fetching IPGs.
+        ipg_cache (str): Path to IPG cache. Only accessions which are not in the cache
+            (or are stale) are fetched from the NCBI.
+        ipg_cache_ttl (float): Time-to-live of IPG cache entries, in days.
+        cpus (int): Total workers used to find clusters (see cluster_organisms()).
+        intermediate_genes (bool): Retrieve all genes in the region of each cluster
+            from sqlite_db, including those without hits.
+        intermediate_flank (int): Additional bp either side of each cluster to
+            retrieve genes from when intermediate_genes is True.
+        gene_gap (int): Maximum number of genes between any two hits in a cluster,
+            used instead of gap. Only available in local searches.
+        keep_all_hits (bool): In local searches, keep hits on scaffolds that cannot
+            form a cluster, e.g. to recompute the session with lower thresholds later.
     Returns:
         Dictionary of Organism objects keyed on species name.
     """
     if sqlite_db:
         LOG.info("Querying local SQLite3 database: %s", sqlite_db)
-        organisms = query_local_DB(hits, sqlite_db)
+        if keep_all_hits:
+            organisms = query_local_DB(hits, sqlite_db)
+        else:
+            organisms = query_local_DB(
+                hits, sqlite_db, unique=unique, min_hits=min_hits, require=require
+            )
     else:
-        rows = efetch_IPGs(
-            [hit.subject for hit in hits],
-            output_handle=ipg_file
-        )
+        ids = [hit.subject for hit in hits]
+        if ipg_cache:
+            LOG.info("Looking up IPGs in cache: %s", ipg_cache)
+            cached, missing = cache.lookup(ids, ipg_cache, ttl=ipg_cache_ttl)
+            if ipg_file:
+                ipg_file.write("".join(f"{row}\n" for row in cached))
+            rows = chain(
+                cached,
+                stream_IPGs(
+                    missing,
+                    output_handle=ipg_file,
+                    api_key=api_key,
+                    ipg_cache=ipg_cache,
+                ),
+            )
+        else:
+            rows = stream_IPGs(ids, output_handle=ipg_file, api_key=api_key)
         organisms = parse_IPG_table(rows, hits)
 
     LOG.info("Searching for clustered hits across %i organisms", len(organisms))
-    for organism in organisms:
-        find_clusters_in_organism(
-            organism,
-            unique=unique,
-            min_hits=min_hits,
-            gap=gap,
-            require=require,
-            query_sequence_order=query_sequence_order,
-            remote=sqlite_db is None,
-        )
+    cluster_organisms(
+        organisms,
+        unique=unique,
+        min_hits=min_hits,
+        gap=gap,
+        require=require,
+        query_sequence_order=query_sequence_order,
+        remote=sqlite_db is None,
+        cpus=cpus,
+        gene_gap=gene_gap,
+    )
+
+    if intermediate_genes:
+        if sqlite_db:
+            find_intermediate_genes(organisms, sqlite_db, flank=intermediate_flank)
+        else:
+            LOG.warning("Intermediate genes can only be retrieved in local searches")
 
     return organisms
@@ -2,16 +2,29 @@
 This module handles creation of local JSON databases for non-NCBI lookups.
 """
 
+import glob
 import logging
 import subprocess
 import sqlite3
 
+from contextlib import closing
 from pathlib import Path
 from multiprocessing import Pool
 
 from cblaster import helpers
 from cblaster import genome_parsers as gp
-from cblaster.sql import FASTA, INSERT, QUERY, SCHEMA
+from cblaster.sql import (
+    CANDIDATE_QUERY,
+    COLUMNS,
+    FASTA,
+    HIT_INSERT,
+    HIT_TABLE,
+    INDEXES,
+    INSERT,
+    QUERY,
+    REGION,
+    SCHEMA,
+)
 
 
 LOG = logging.getLogger("cblaster")
@@ -70,6 +83,9 @@ def sqlite_to_fasta(path, database):
 def query_database(ids, database):
     """Queries the cblaster SQLite3 database for a collection of gene IDs.
 
+    Databases built before gene ordinals were stored return None as the ordinal of
+    every gene.
+
     Args:
         ids (list): Row IDs of genes being queried
         database (str): Path to SQLite3 database
@@ -77,12 +93,70 @@ def query_database(ids, database):
         list: Result tuples returned by the query
     """
     marks = ", ".join("?" for _ in ids)
-    query = QUERY.format(marks)
     with sqlite3.connect(database) as con:
         cur = con.cursor()
+        query = QUERY.format(ordinal_column(cur), marks)
         return cur.execute(query, ids).fetchall()
 
 
+def ordinal_column(cur):
+    """Gets the column to select gene ordinals from; NULL in databases without them."""
+    columns = {row[1] for row in cur.execute(COLUMNS)}
+    return "ordinal" if "ordinal" in columns else "NULL"
+
+
+def query_database_candidates(pairs, database, unique=3, min_hits=3, require=None):
+    """Queries the cblaster SQLite3 database for genes that could form clusters.
+
+    Hits are aggregated per scaffold in SQL, and only genes on scaffolds with at least
+    `unique` distinct queries, `min_hits` distinct genes and every `require` query hit
+    are returned, since no other scaffold can contain a cluster.
+
+    Args:
+        pairs (list): (gene ID, query) tuples for each hit
+        database (str): Path to SQLite3 database
+        unique (int): Unique query sequence threshold
+        min_hits (int): Minimum number of hits in a hit cluster
+        require (list): Names of query sequences that must be represented in a cluster
+    Returns:
+        list: Result tuples returned by the query, as in query_database()
+    """
+    require = list(set(require)) if require else []
+    with closing(sqlite3.connect(database)) as con:
+        cur = con.cursor()
+        cur.execute(HIT_TABLE)
+        cur.executemany(HIT_INSERT, pairs)
+        query = CANDIDATE_QUERY.format(
+            require=", ".join("?" for _ in require),
+            ordinal=ordinal_column(cur),
+        )
+        return cur.execute(query, [unique, min_hits, *require, len(require)]).fetchall()
+
+
+def query_regions(regions, database):
+    """Queries the cblaster SQLite3 database for all genes in genomic regions.
+
+    Genes are looked up by their start position, using an index on organism, scaffold
+    and start position. Databases built before this index was part of the schema are
+    not modified, but searched without it.
+
+    Args:
+        regions (list): (organism, scaffold, start, end) tuples
+        database (str): Path to SQLite3 database
+    Returns:
+        list: (name, start, end, strand) tuples of genes starting in each region
+    """
+    with closing(sqlite3.connect(database)) as con:
+        cur = con.cursor()
+        if not any(row[1] == "gene_location" for row in cur.execute(INDEXES)):
+            LOG.warning(
+                "Database %s has no gene location index; rebuild it using"
+                " cblaster makedb for faster lookups",
+                database,
+            )
+        return [cur.execute(REGION, region).fetchall() for region in regions]
+
+
 def diamond_makedb(fasta, name):
     """Builds a DIAMOND database from JSON.
 
@@ -98,7 +172,54 @@ def diamond_makedb(fasta, name):
     )
 
 
-def makedb(paths, database, force=False, cpus=None, batch=None):
+def blast_makedb(fasta, name):
+    """Builds a BLAST+ protein database from FASTA.
+
+    Args:
+        fasta (str): Path to FASTA file containing protein sequences.
+        name (str): Name for BLAST database.
+    """
+    makeblastdb = helpers.get_program_path(["makeblastdb"])
+    subprocess.run(
+        [makeblastdb, "-in", fasta, "-dbtype", "prot", "-out", name],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+def mmseqs_makedb(fasta, name):
+    """Builds a MMseqs2 database from FASTA.
+
+    Args:
+        fasta (str): Path to FASTA file containing protein sequences.
+        name (str): Name for MMseqs2 database.
+    """
+    mmseqs = helpers.get_program_path(["mmseqs"])
+    subprocess.run(
+        [mmseqs, "createdb", fasta, name],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+# Database builders and file suffixes for each search engine in local.ENGINES
+ENGINES = {
+    "diamond": (diamond_makedb, ".dmnd"),
+    "blastp": (blast_makedb, ".blast"),
+    "mmseqs": (mmseqs_makedb, ".mmseqs"),
+}
+
+
+def search_database_exists(path):
+    """Tests if a search database exists at a given path.
+
+    Some engines write files with extra suffixes instead of a file at `path` itself,
+    e.g. makeblastdb writes `path`.pin, `path`.phr and `path`.psq.
+    """
+    return path.exists() or any(path.parent.glob(f"{glob.escape(path.name)}.*"))
+
+
+def makedb(paths, database, force=False, cpus=None, batch=None, engine="diamond"):
     """makedb module entry point.
 
     Will parse genome files in `paths` and create:
@@ -106,8 +227,8 @@ def makedb(paths, database, force=False, cpus=None, batch=None):
         1. `database`.sqlite3
         SQLite3 database used for looking up genome context of hit genes
 
-        2. `database`.dmnd
-        DIAMOND search database
+        2. `database`.dmnd, `database`.blast or `database`.mmseqs
+        DIAMOND, BLAST+ or MMseqs2 search database, depending on `engine`
 
         3. `database`.fasta
         FASTA file containing all protein sequences in parsed genomes
@@ -122,6 +243,7 @@ def makedb(paths, database, force=False, cpus=None, batch=None):
         batch (int):
             Number of organisms to parse at once before saving to database.
             Helpful when dealing with larger/many genome files.
+        engine (str): Search engine to build a database for (see `ENGINES`)
     """
     LOG.info("Starting makedb module")
 
@@ -129,12 +251,15 @@ def makedb(paths, database, force=False, cpus=None, batch=None):
         raise TypeError("batch should be None or int")
     if not (cpus is None or isinstance(cpus, int)):
         raise TypeError("cpus should be None or int")
+    if engine not in ENGINES:
+        raise ValueError(f"Invalid search engine '{engine}', expected {list(ENGINES)}")
 
+    build_database, suffix = ENGINES[engine]
     sqlite_path = Path(f"{database}.sqlite3")
     fasta_path = Path(f"{database}.fasta")
-    dmnd_path = Path(f"{database}.dmnd")
+    search_path = Path(f"{database}{suffix}")
 
-    if sqlite_path.exists() or dmnd_path.exists():
+    if sqlite_path.exists() or search_database_exists(search_path):
         if force:
             LOG.info("Pre-existing files found, overwriting")
         else:
@@ -167,7 +292,7 @@ def makedb(paths, database, force=False, cpus=None, batch=None):
     LOG.info("Writing FASTA to %s", fasta_path)
     sqlite_to_fasta(fasta_path, sqlite_path)
 
-    LOG.info("Building DIAMOND database at %s", dmnd_path)
-    diamond_makedb(fasta_path, dmnd_path)
+    LOG.info("Building %s database at %s", engine, search_path)
+    build_database(fasta_path, search_path)
 
     LOG.info("Done!")
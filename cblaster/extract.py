@@ -7,13 +7,18 @@ TODO: Download hit cluster genomic regions from NCBI
 import logging
 import re
 
+from collections import defaultdict, namedtuple
 
-from cblaster.classes import Session
 from cblaster.helpers import efetch_sequences
+from cblaster.index import SessionIndex
+from cblaster.store import SessionStore, open_session
 
 
 LOG = logging.getLogger(__name__)
 
+# Gene in a cluster region, stored as a list on Cluster.genes
+Gene = namedtuple("Gene", ["name", "start", "end", "strand"])
+
 
 def parse_organisms(organisms):
     """Parses specified organisms and creates RegEx patterns."""
@@ -100,22 +105,71 @@ def format_records(records, delimiter=None, to_fasta=False, name_only=False):
     )
 
 
+def find_subject(index, scaffold, gene):
+    """Finds the Subject on a scaffold with the name and location of a gene.
+
+    Returns:
+        The matching Subject, or the gene if it has no hits.
+    """
+    for entry in index.subjects.get(gene.name, []):
+        subject = entry.subject
+        if (
+            entry.scaffold is scaffold
+            and subject.start == gene.start
+            and subject.end == gene.end
+        ):
+            return subject
+    return gene
+
+
 def extract_records(
     session,
     in_cluster=True,
     queries=None,
     organisms=None,
     scaffolds=None,
+    intermediate_genes=False,
 ):
-    """Extracts subject sequence names from a session file."""
+    """Extracts subject sequence names from a session file.
+
+    If `intermediate_genes` is True, every gene stored in the region of each cluster
+    (see Cluster.genes) is extracted instead of only the clustered subjects. Clusters
+    without stored genes fall back to their subjects. Genes are matched to Subjects on
+    the same scaffold by name and location, so `queries` only filters genes with hits.
+    """
     if organisms:
         organisms = parse_organisms(organisms)
     if scaffolds:
         scaffolds = parse_scaffolds(scaffolds)
+    index = SessionIndex(session)
+    if queries:
+        hitting = index.subjects_hitting(queries)
+    seen, missing = set(), 0
     records = []
-    for organism in session.organisms:
+    for organism in index.organisms:
         if organisms and not organism_matches(organism.name, organisms):
             continue
+        if in_cluster:
+            clustered = defaultdict(list)
+            for _, scaffold, cluster in index.organism_clusters[id(organism)]:
+                if not intermediate_genes:
+                    clustered[id(scaffold)].extend(cluster.subjects)
+                    continue
+                if cluster.genes is None:
+                    missing += 1
+                    genes = cluster.subjects
+                else:
+                    genes = [
+                        find_subject(index, scaffold, Gene(*gene))
+                        for gene in cluster.genes
+                    ]
+
+                # Regions of neighbouring clusters can overlap when extended by a flank
+                for gene in genes:
+                    key = (id(scaffold), gene.name, gene.start, gene.end)
+                    if key not in seen:
+                        seen.add(key)
+                        clustered[id(scaffold)].append(gene)
         for accession, scaffold in organism.scaffolds.items():
             if scaffolds:
                 if accession not in scaffolds:
@@ -127,14 +181,16 @@ def extract_records(
                 start = None
                 end = None
             if in_cluster:
-                subjects = flatten(cluster.subjects for cluster in scaffold.clusters)
+                subjects = clustered[id(scaffold)]
             else:
                 subjects = scaffold.subjects
             for subject in subjects:
                 if (start and end) and out_of_bounds(subject, start, end):
                     continue
-                if queries and not any(h.query in queries for h in subject.hits):
-                    continue
+                if queries and id(subject) not in hitting:
+                    # Genes without hits are kept (see intermediate_genes)
+                    if not isinstance(subject, Gene):
+                        continue
                 record = dict(
                     name=subject.name,
                     organism=organism.name,
@@ -143,6 +199,8 @@ def extract_records(
                     end=subject.end,
                 )
                 records.append(record)
+    if missing:
+        LOG.warning("%i clusters have no stored intermediate genes", missing)
     return records
 
 
@@ -156,6 +214,7 @@ def extract(
     queries=None,
     organisms=None,
     scaffolds=None,
+    intermediate_genes=False,
 ):
     """Extract subject sequences from a cblaster session.
 
@@ -169,11 +228,20 @@ def extract(
         scaffolds (list): Scaffold names and ranges
         delimiter (str): Sequence description delimiter character
         name_only (bool): Do not save sequence descriptions
+        intermediate_genes (bool): Extract every gene stored in cluster regions
     """
     LOG.info("Starting cblaster extraction")
     LOG.info("Loading session from: %s", session)
-    with open(session) as fp:
-        session = Session.from_json(fp)
+    session = open_session(session)
+    if isinstance(session, SessionStore):
+        # Only load matching rows; queries are not pushed down when extracting
+        # clustered subjects, since every subject in a cluster is needed to load it
+        session = session.where(
+            organisms=organisms,
+            scaffolds=list(parse_scaffolds(scaffolds)) if scaffolds else None,
+            queries=None if in_cluster else queries,
+            in_cluster=in_cluster,
+        )
 
     LOG.info("Extracting subject sequences matching filters")
     records = extract_records(
@@ -182,6 +250,7 @@ def extract(
         queries=queries,
         organisms=organisms,
         scaffolds=scaffolds,
+        intermediate_genes=intermediate_genes,
     )
 
     if download:
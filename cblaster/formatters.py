@@ -1,8 +1,12 @@
 """cblaster result formatters."""
 
 
+import io
+
 from operator import attrgetter
 
+from cblaster.index import group_hits
+
 
 def get_maximum_row_lengths(rows):
     """Finds the longest lengths of fields per column in a collection of rows."""
@@ -29,6 +33,50 @@ def humanise(rows):
     return table
 
 
+def column_widths(rows):
+    """Finds the longest field in each column of an iterable of rows in one pass."""
+    widths = []
+    for row in rows:
+        if widths:
+            widths = [max(width, len(field)) for width, field in zip(widths, row)]
+        else:
+            widths = [len(field) for field in row]
+    return widths
+
+
+def write_table(rows, fp, delimiter=None):
+    """Writes the rows of a table to a file handle one at a time.
+
+    If no delimiter is given, fields are padded with whitespace to the width of their
+    column (as in humanise()). Widths are found in a first pass over the rows, so the
+    padded table is never held in memory.
+
+    Args:
+        rows (callable): Returns a new iterable of rows (lists of strings) each call.
+        fp (file handle): File handle to write to.
+        delimiter (str): String between fields of each row.
+    """
+    if delimiter:
+        for row in rows():
+            fp.write(delimiter.join(row))
+            fp.write("\n")
+        return
+    widths = column_widths(rows())
+    for row in rows():
+        fp.write("  ".join(f"{field:{width}}" for field, width in zip(row, widths)))
+        fp.write("\n")
+
+
+def render(writer, *args, **kwargs):
+    """Renders the output of a write_*() function as a string, without the final
+    newline.
+    """
+    buffer = io.StringIO()
+    writer(*args, buffer, **kwargs)
+    text = buffer.getvalue()
+    return text[:-1] if text.endswith("\n") else text
+
+
 def generate_header_string(text, symbol="-"):
     """Generates a 2-line header string with underlined text.
 
@@ -40,7 +88,7 @@ def generate_header_string(text, symbol="-"):
     return f"{text}\n{symbol * len(text)}"
 
 
-def get_cell_values(queries, subjects, key=len, attr=None):
+def get_cell_values(queries, subjects, key=len, attr=None, groups=None):
     """Generates the values of cells in the binary matrix.
 
     This function calls some specified key function (def. max) against all
@@ -55,17 +103,15 @@ def get_cell_values(queries, subjects, key=len, attr=None):
         subjects (list): Subject objects to generate vlaues for.
         key (callable): Some callable that takes a list and produces a value.
         attr (str): A Hit attribute to calculate values with in key function.
+        groups (dict): Hits of the subjects already grouped by query (see
+            index.group_hits()). Grouped from `subjects` if not given.
     """
-    result = [0] * len(queries)
-    for index, query in enumerate(queries):
-        values = [
-            getattr(hit, attr) if attr else hit
-            for subject in subjects
-            for hit in subject.hits
-            if hit.query == query
-        ]
-        result[index] = key(values)
-    return result
+    if groups is None:
+        groups = group_hits(subjects)
+    return [
+        key([getattr(hit, attr) if attr else hit for _, hit in groups.get(query, [])])
+        for query in queries
+    ]
 
 
 def set_decimals(value, decimals=4):
@@ -80,35 +126,62 @@ def binary(
     delimiter=None,
     key=len,
     attr="identity",
-    decimals=4
+    decimals=4,
 ):
-    """Generates a binary summary table from a Session object."""
-    rows = [
-        [
-            organism.full_name,
-            accession,
-            str(cluster[0].start),
-            str(cluster[-1].end),
-            *[
-                set_decimals(value)
-                for value in get_cell_values(
-                    session.queries,
-                    cluster,
-                    key=key,
-                    attr=attr
-                )
-            ]
-        ]
-        for organism in session.organisms
-        for accession, scaffold in organism.scaffolds.items()
-        for cluster in scaffold.clusters
-    ]
-    if not hide_headers:
-        rows.insert(0, ["Organism", "Scaffold", "Start", "End", *session.queries])
-    if not delimiter:
-        delimiter = "  "
-        rows = humanise(rows)
-    return "\n".join(delimiter.join(row) for row in rows)
+    """Generates a binary summary table from a Session object (see write_binary())."""
+    return render(
+        write_binary,
+        session,
+        hide_headers=hide_headers,
+        delimiter=delimiter,
+        key=key,
+        attr=attr,
+        decimals=decimals,
+    )
+
+
+def write_binary(
+    session,
+    fp,
+    hide_headers=False,
+    delimiter=None,
+    key=len,
+    attr="identity",
+    decimals=4,
+):
+    """Writes a binary summary table of a Session object to a file handle.
+
+    Rows are written one at a time (see write_table()), grouping the hits of each
+    cluster only when its row is written.
+
+    Args:
+        session (Session): cblaster Session object.
+        fp (file handle): File handle to write to.
+        hide_headers (bool): Do not write column headers.
+        delimiter (str): String between fields of each row. If not given, the table is
+            written in human-readable format.
+        key (callable): Function computing cell values (see get_cell_values()).
+        attr (str): Hit attribute passed to `key`.
+        decimals (int): Total decimal places to show in cell values.
+    """
+    queries = list(session.queries)
+
+    def rows():
+        if not hide_headers:
+            yield ["Organism", "Scaffold", "Start", "End", *queries]
+        for organism in session.organisms:
+            for scaffold in organism.scaffolds.values():
+                for cluster in scaffold.clusters:
+                    values = get_cell_values(queries, cluster, key=key, attr=attr)
+                    yield [
+                        organism.full_name,
+                        scaffold.accession,
+                        str(cluster.start),
+                        str(cluster.end),
+                        *[set_decimals(value, decimals) for value in values],
+                    ]
+
+    write_table(rows, fp, delimiter=delimiter)
 
 
 def _summarise(
@@ -198,19 +271,49 @@ def summarise_cluster(cluster, decimals=4, hide_headers=True, delimiter=None):
 
 
 def summary(session, hide_headers=False, delimiter=None, decimals=4):
-    return _summarise(
-        session.organisms,
-        summarise_organism,
-        "cblaster search",
-        condition_fn=lambda o: o.total_hit_clusters > 0,
+    """Generates a summary of a Session object (see write_summary())."""
+    return render(
+        write_summary,
+        session,
         hide_headers=hide_headers,
         delimiter=delimiter,
         decimals=decimals,
-        header_symbol="=",
-        separator="\n\n\n",
     )
 
 
+def write_summary(session, fp, hide_headers=False, delimiter=None, decimals=4):
+    """Writes a summary of a Session object to a file handle.
+
+    The summary of each Organism is written as soon as it is generated, so only one is
+    held in memory at a time.
+
+    Args:
+        session (Session): cblaster Session object.
+        fp (file handle): File handle to write to.
+        hide_headers (bool): Do not write column headers of cluster tables.
+        delimiter (str): String between fields of each row. If not given, tables are
+            written in human-readable format.
+        decimals (int): Total decimal places to show in score values.
+    """
+    fp.write(generate_header_string("cblaster search", "="))
+    fp.write("\n")
+    separator = ""
+    for organism in session.organisms:
+        if organism.total_hit_clusters == 0:
+            continue
+        fp.write(separator)
+        fp.write(
+            summarise_organism(
+                organism,
+                hide_headers=hide_headers,
+                delimiter=delimiter,
+                decimals=decimals,
+            )
+        )
+        separator = "\n\n\n"
+    fp.write("\n")
+
+
 def summarise_gne(data, hide_headers=False, delimiter=None, decimals=4):
     rows = []
     hdrs = ["Gap", "Means", "Medians", "Clusters"]
@@ -225,6 +328,29 @@ def summarise_gne(data, hide_headers=False, delimiter=None, decimals=4):
     return "\n".join(delimiter.join(row) for row in rows)
 
 
+def summarise_sweep(data, hide_headers=False, delimiter=None, decimals=4):
+    rows = []
+    hdrs = [
+        "Gap",
+        "Unique",
+        "Min_hits",
+        "Min_identity",
+        "Min_coverage",
+        "Clusters",
+        "Means",
+        "Medians",
+    ]
+    if not hide_headers:
+        rows.append(hdrs)
+    for row in data:
+        values = [set_decimals(row.get(key.lower()), decimals) for key in hdrs]
+        rows.append(values)
+    if not delimiter:
+        delimiter = "  "
+        rows = humanise(rows)
+    return "\n".join(delimiter.join(row) for row in rows)
+
+
 def gne_summary(data, hide_headers=False, delimiter=None, decimals=4):
     return _summarise(
         data,
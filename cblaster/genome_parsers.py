@@ -200,7 +200,8 @@ def seqrecord_to_tuples(record, source):
         record (SeqRecord): SeqRecord object containing gene and CDS SeqFeatures
         source (str): Name of source file, used as organism name
     Returns:
-        list: Tuples used for insertion into SQLite3 database
+        list: Tuples used for insertion into SQLite3 database; the last value of each
+        is the ordinal position of the gene on the record, sorted by location
     """
     features = [f for f in record.features if f.type == "CDS"]
     locations = [(f.location.start, f.location.end) for f in record.features if f.type == "gene"]
@@ -236,6 +237,11 @@ def seqrecord_to_tuples(record, source):
             str(source)  # organism name from source file name
         )
         genes.append(gene)
+
+    # Ordinal position of each gene on the scaffold, used for gene-count gaps
+    ordinals = sorted(range(len(genes)), key=lambda i: (genes[i][1], genes[i][2]))
+    for ordinal, index in enumerate(ordinals):
+        genes[index] += (ordinal,)
     return genes
 
 
@@ -1,8 +1,12 @@
 #!/usr/bin/env python3
 
+import os
+import sys
+import time
 import shutil
 import requests
 import logging
+import threading
 
 from collections import OrderedDict
 from pathlib import Path
@@ -13,6 +17,70 @@ from cblaster import genome_parsers as gp
 LOG = logging.getLogger(__name__)
 
 
+def get_ncbi_api_key(api_key=None):
+    """Gets an NCBI API key, falling back to the NCBI_API_KEY environment variable."""
+    return api_key if api_key else os.environ.get("NCBI_API_KEY")
+
+
+def get_ncbi_rate(api_key=None):
+    """Gets maximum requests per second allowed by the NCBI E-utilities.
+
+    This is 3 requests per second, or 10 if an API key is supplied.
+    """
+    return 10 if api_key else 3
+
+
+def free_threaded():
+    """Tests if this is a free-threaded Python build running without the GIL."""
+    is_gil_enabled = getattr(sys, "_is_gil_enabled", None)
+    return is_gil_enabled is not None and not is_gil_enabled()
+
+
+class RateLimiter:
+    """Thread-safe token bucket rate limiter.
+
+    Tokens are added to the bucket at a fixed rate, up to `burst` tokens. Each call
+    to `wait()` takes one token, blocking until one is available. Waiting threads
+    are given tokens in the order they call `wait()`.
+
+    >>> limiter = RateLimiter(rate=3)
+    >>> for chunk in chunks:
+    ...     limiter.wait()
+    ...     requests.post(...)
+
+    Attributes:
+        rate (float): Tokens added per second.
+        burst (int): Maximum number of tokens in the bucket.
+    """
+
+    def __init__(self, rate, burst=1, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        """Blocks until a token is available, then takes it.
+
+        A token is reserved while holding the lock, which may leave the bucket in
+        debt; the wait for that token happens after the lock is released, so other
+        threads can reserve the following tokens at the same time.
+        """
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            self._tokens -= 1
+            delay = -self._tokens / self.rate if self._tokens < 0 else 0
+        if delay:
+            self._sleep(delay)
+
+
 def get_program_path(aliases):
     """Get programs path given a list of program names.
 
@@ -0,0 +1,115 @@
+"""
+In-memory index of a cblaster session.
+
+Summary tables, plots and extracted sequences all look up every cluster, the hits of
+each query in each cluster, the clusters of each organism and so on. A SessionIndex
+walks a session once to build these mappings, so that each lookup does not have to
+walk every Subject and Hit again.
+
+>>> index = SessionIndex(session)
+>>> for entry in index.clusters:
+...     groups = index.cluster_hits(entry.cluster)
+...     print(entry.organism.full_name, [len(groups[q]) for q in index.queries])
+"""
+
+from collections import defaultdict, namedtuple
+from functools import cached_property
+
+
+ClusterEntry = namedtuple("ClusterEntry", ["organism", "scaffold", "cluster"])
+SubjectEntry = namedtuple("SubjectEntry", ["organism", "scaffold", "subject"])
+
+
+def group_hits(subjects):
+    """Groups the hits of Subjects by query.
+
+    Args:
+        subjects (iterable): Subject objects.
+    Returns:
+        Dictionary of (Subject, Hit) tuples keyed on query name.
+    """
+    groups = defaultdict(list)
+    for subject in subjects:
+        for hit in subject.hits:
+            groups[hit.query].append((subject, hit))
+    return groups
+
+
+class SessionIndex:
+    """Maps the clusters, subjects and query hits of a session.
+
+    Organisms are iterated once when building the index, so it can be built from a
+    SessionStore (see store.py) as well as a Session. Only clusters are found when the
+    index is built; other mappings are built on first access, so callers that only
+    iterate clusters do not walk every Hit.
+
+    Attributes:
+        queries (list): Names of query sequences.
+        organisms (list): Organism objects in session order.
+        clusters (list): ClusterEntry tuples of every cluster in session order.
+        total_subjects (int): Number of Subjects in the session.
+        total_hits (int): Number of Hits in the session.
+    """
+
+    def __init__(self, session):
+        self.queries = list(session.queries)
+        self.organisms = []
+        self.clusters = []
+        self.total_subjects = 0
+        self.total_hits = 0
+        self._cluster_hits = {}
+        for organism in session.organisms:
+            self.organisms.append(organism)
+            for scaffold in organism.scaffolds.values():
+                self.total_subjects += len(scaffold.subjects)
+                self.total_hits += sum(len(s.hits) for s in scaffold.subjects)
+                for cluster in scaffold.clusters:
+                    self.clusters.append(ClusterEntry(organism, scaffold, cluster))
+
+    @cached_property
+    def organism_clusters(self):
+        """ClusterEntry tuples keyed on the id() of their Organism."""
+        clusters = defaultdict(list)
+        for entry in self.clusters:
+            clusters[id(entry.organism)].append(entry)
+        return clusters
+
+    @cached_property
+    def subjects(self):
+        """SubjectEntry tuples keyed on subject name."""
+        subjects = defaultdict(list)
+        for organism in self.organisms:
+            for scaffold in organism.scaffolds.values():
+                for subject in scaffold.subjects:
+                    entry = SubjectEntry(organism, scaffold, subject)
+                    subjects[subject.name].append(entry)
+        return subjects
+
+    @cached_property
+    def query_hits(self):
+        """(Subject, Hit) tuples keyed on query name."""
+        hits = defaultdict(list)
+        for organism in self.organisms:
+            for scaffold in organism.scaffolds.values():
+                for subject in scaffold.subjects:
+                    for hit in subject.hits:
+                        hits[hit.query].append((subject, hit))
+        return hits
+
+    def cluster_hits(self, cluster):
+        """Groups the hits in a cluster by query (see group_hits()).
+
+        Groups are computed on the first call for each cluster, then cached.
+        """
+        key = id(cluster)
+        if key not in self._cluster_hits:
+            self._cluster_hits[key] = group_hits(cluster.subjects)
+        return self._cluster_hits[key]
+
+    def subjects_hitting(self, queries):
+        """Gets the IDs (i.e. id()) of Subjects with hits to any of given queries."""
+        return {
+            id(subject)
+            for query in queries
+            for subject, _ in self.query_hits.get(query, [])
+        }
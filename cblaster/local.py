@@ -1,13 +1,26 @@
 #!/usr/bin/env python3
 
+"""
+This module handles local searches against databases created using cblaster makedb.
+
+Searches are dispatched to one of several search engines (see `ENGINES`). Every
+engine is a function with the signature:
+
+>>> engine(fasta, database, max_evalue=0.01, min_identity=30, min_coverage=50, cpus=None)
+
+which returns rows of a tab-delimited hit table (split by newline) with the columns
+qseqid, sseqid, pident, qcovhsp, evalue and bitscore, as expected by `parse()`.
+"""
 
 import logging
 import subprocess
 import os
 
-from tempfile import NamedTemporaryFile as NTF
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import NamedTemporaryFile as NTF, TemporaryDirectory
 
 from cblaster import helpers
+from cblaster import genome_parsers as gp
 from cblaster.classes import Hit
 
 
@@ -100,29 +113,185 @@ def diamond(
     return results.stdout.decode().split("\n")
 
 
+def blastp(
+    fasta,
+    database,
+    max_evalue=0.01,
+    min_identity=30,
+    min_coverage=50,
+    cpus=None,
+):
+    """Launch a local BLAST+ blastp search against a database.
+
+    The query sequences are split into (at most) `cpus` chunks, and a blastp process
+    is run on each chunk concurrently. blastp has no identity cutoff, so hits below
+    `min_identity` are only removed later by `parse()`.
+
+    Arguments:
+        fasta (str): Path to FASTA format query file
+        database (str): Path to BLAST database generated with cblaster makedb
+        max_evalue (float): Maximum e-value threshold
+        min_identity (float): Minimum identity (%) cutoff
+        min_coverage (float): Minimum coverage (%) cutoff
+        cpus (int): Number of CPU threads to use in total
+    Returns:
+        list: Rows from blastp search result table (split by newline)
+    """
+    blastp = helpers.get_program_path(["blastp"])
+    LOG.debug("blastp path: %s", blastp)
+
+    if not (cpus is None or isinstance(cpus, int)):
+        raise TypeError("cpus should be None or int")
+    if not cpus:
+        cpus = os.cpu_count()
+
+    records = gp.parse_fasta(fasta)
+    total_chunks = max(1, min(cpus, len(records)))
+    threads = max(1, cpus // total_chunks)
+    chunks = [records[i::total_chunks] for i in range(total_chunks)]
+
+    def run(chunk):
+        query = NTF("w", delete=False)
+        try:
+            with query:
+                query.write(helpers.sequences_to_fasta(
+                    {record.id: str(record.seq) for record in chunk}
+                ))
+            parameters = {
+                "args": [blastp],
+                "-query": query.name,
+                "-db": database,
+                "-evalue": str(max_evalue),
+                "-outfmt": "6 qseqid sseqid pident qcovhsp evalue bitscore",
+                "-num_threads": str(threads),
+                "-qcov_hsp_perc": str(min_coverage),
+                "-max_hsps": "1",
+            }
+            command = helpers.form_command(parameters)
+            LOG.debug("Parameters: %s", command)
+            results = subprocess.run(
+                command,
+                stderr=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                check=True
+            )
+        finally:
+            os.unlink(query.name)
+        return results.stdout.decode()
+
+    LOG.debug("Running blastp on %i chunks (%i threads each)", total_chunks, threads)
+    with ThreadPoolExecutor(max_workers=total_chunks) as executor:
+        tables = list(executor.map(run, chunks))
+
+    return "".join(tables).split("\n")
+
+
+def mmseqs(
+    fasta,
+    database,
+    max_evalue=0.01,
+    min_identity=30,
+    min_coverage=50,
+    cpus=None,
+):
+    """Launch a local MMseqs2 search against a database.
+
+    MMseqs2 reports query coverage as a fraction, so it is converted to a percentage
+    here to match the other search engines.
+
+    Arguments:
+        fasta (str): Path to FASTA format query file
+        database (str): Path to MMseqs2 database generated with cblaster makedb
+        max_evalue (float): Maximum e-value threshold
+        min_identity (float): Minimum identity (%) cutoff
+        min_coverage (float): Minimum coverage (%) cutoff
+        cpus (int): Number of CPU threads for MMseqs2 to use
+    Returns:
+        list: Rows from MMseqs2 search result table (split by newline)
+    """
+    mmseqs = helpers.get_program_path(["mmseqs"])
+    LOG.debug("mmseqs path: %s", mmseqs)
+
+    if not (cpus is None or isinstance(cpus, int)):
+        raise TypeError("cpus should be None or int")
+    if not cpus:
+        cpus = os.cpu_count()
+
+    with TemporaryDirectory() as directory:
+        output = os.path.join(directory, "results.m8")
+        parameters = {
+            "args": [
+                mmseqs,
+                "easy-search",
+                str(fasta),
+                str(database),
+                output,
+                os.path.join(directory, "tmp"),
+            ],
+            "--format-output": "query,target,pident,qcov,evalue,bits",
+            "--min-seq-id": str(min_identity / 100),
+            "-c": str(min_coverage / 100),
+            "--cov-mode": "2",
+            "-e": str(max_evalue),
+            "--threads": str(cpus),
+        }
+        command = helpers.form_command(parameters)
+        LOG.debug("Parameters: %s", command)
+        subprocess.run(
+            command,
+            stderr=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            check=True
+        )
+        with open(output) as fp:
+            rows = []
+            for line in fp:
+                qid, sid, pident, qcov, evalue, bitscore = line.rstrip("\n").split("\t")
+                coverage = float(qcov) * 100
+                rows.append(f"{qid}\t{sid}\t{pident}\t{coverage}\t{evalue}\t{bitscore}")
+
+    rows.append("")
+    return rows
+
+
+ENGINES = {
+    "diamond": diamond,
+    "blastp": blastp,
+    "mmseqs": mmseqs,
+}
+
+
 def search(
     database,
     sequences=None,
     query_file=None,
     query_ids=None,
     blast_file=None,
+    engine="diamond",
     **kwargs,
 ):
-    """Launch a new BLAST search using either DIAMOND or command-line BLASTp (remote).
+    """Launch a new local search using one of the search engines in `ENGINES`.
 
     Arguments:
-        database (str): Path to DIAMOND database
+        database (str): Path to search database made with cblaster makedb
         sequences (dict): Query sequences
         query_file (str): Path to FASTA file containing query sequences
         query_ids (list): NCBI sequence accessions
         blast_file (TextIOWrapper): file blast results are written to
+        engine (str): Search engine to use ('diamond', 'blastp' or 'mmseqs')
     Raises:
         ValueError: No value given for query_file or query_ids
+        ValueError: Invalid search engine specified
     Returns:
-        list: Parsed rows with hits from DIAMOND results table
+        list: Parsed rows with hits from search results table
     """
+    try:
+        run_engine = ENGINES[engine]
+    except KeyError:
+        raise ValueError(f"Invalid search engine '{engine}', expected {list(ENGINES)}")
+
     if query_file:
-        table = diamond(query_file, database, **kwargs)
+        table = run_engine(query_file, database, **kwargs)
     else:
         if not sequences:
             sequences = helpers.get_sequences(query_ids=query_ids)
@@ -134,14 +303,19 @@ def search(
         try:
             with fasta:
                 fasta.write(text)
-            table = diamond(fasta.name, database, **kwargs)
+            table = run_engine(fasta.name, database, **kwargs)
         finally:
             os.unlink(fasta.name)
 
-    results = parse(table)
+    results = parse(
+        table,
+        min_identity=kwargs.get("min_identity", 30),
+        min_coverage=kwargs.get("min_coverage", 50),
+        max_evalue=kwargs.get("max_evalue", 0.01),
+    )
 
     if blast_file:
-        LOG.info("Writing DIAMOND hit table to %s", blast_file.name)
+        LOG.info("Writing %s hit table to %s", engine, blast_file.name)
         blast = "\n".join(results)
         blast_file.write(blast)
 
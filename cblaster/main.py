@@ -6,19 +6,24 @@ import sys
 
 from pathlib import Path
 
-import hmm_search
 from cblaster import (
+    cache,
     context,
     database,
     helpers,
+    hmm_search,
     local,
+    matrix,
+    merge as cb_merge,
     remote,
     parsers,
     extract,
+    store,
+    sweep as cb_sweep,
 )
 from cblaster.classes import Session
-from cblaster.plot import plot_session, plot_gne
-from cblaster.formatters import summarise_gne
+from cblaster.plot import plot_session, plot_gne, plot_sweep
+from cblaster.formatters import summarise_gne, summarise_sweep
 
 
 
@@ -44,8 +49,9 @@ def gne(
     """Estimate gene neighbourhood."""
     LOG.info("Starting cblaster gene neighbourhood estimation")
     LOG.info("Loading session from: %s", session)
-    with open(session) as fp:
-        session = Session.from_json(fp)
+    session = store.open_session(session)
+    if isinstance(session, store.SessionStore):
+        session = session.where(clusters=False)
 
     LOG.info("Computing gene neighbourhood statistics")
     results = context.estimate_neighbourhood(
@@ -68,6 +74,73 @@ def gne(
     LOG.info("Done.")
 
 
+
+def sweep(
+    session,
+    output=None,
+    max_gap=100000,
+    samples=100,
+    scale="linear",
+    unique=(3,),
+    min_hits=(3,),
+    min_identity=(30,),
+    min_coverage=(50,),
+    max_evalue=0.01,
+    require=None,
+    cpus=None,
+    plot=None,
+    hide_headers=False,
+    delimiter=",",
+    decimals=4,
+):
+    """Sweep clustering thresholds."""
+    LOG.info("Starting cblaster clustering threshold sweep")
+    LOG.info("Loading session from: %s", session)
+    session = store.open_session(session)
+    if isinstance(session, store.SessionStore):
+        session = session.where(clusters=False)
+
+    LOG.info("Computing cluster statistics")
+    results = cb_sweep.sweep(
+        session,
+        context.gap_space(max_gap=max_gap, samples=samples, scale=scale),
+        unique=unique,
+        min_hits=min_hits,
+        min_identity=min_identity,
+        min_coverage=min_coverage,
+        max_evalue=max_evalue,
+        require=require,
+        cpus=cpus,
+    )
+    if output:
+        LOG.info("Writing sweep table to %s", output.name)
+        summary = summarise_sweep(
+            results,
+            hide_headers=hide_headers,
+            delimiter=delimiter,
+            decimals=decimals,
+        )
+        output.write(summary)
+
+    plot_sweep(results, output=plot)
+    LOG.info("Done.")
+
+
+def convert(session, output, indent=None):
+    """Convert a session file between JSON, compact and SQLite3 formats."""
+    LOG.info("Converting session %s to %s", session, output)
+    store.save_session(store.load_session(session), output, indent=indent)
+    LOG.info("Done.")
+
+
+def merge(sessions, output, cpus=None, indent=None):
+    """Merge session files."""
+    LOG.info("Starting cblaster session merge")
+    cb_merge.merge(sessions, output, cpus=cpus, indent=indent)
+    LOG.info("Wrote merged session to %s", output)
+    LOG.info("Done.")
+
+
 def cblaster(
     query_file=None,
     query_ids=None,
@@ -92,6 +165,7 @@ def cblaster(
     binary_key=len,
     binary_attr="identity",
     binary_decimals=4,
+    binary_matrix=None,
     rid=None,
     require=None,
     session_file=None,
@@ -102,6 +176,14 @@ def cblaster(
     ipg_file=None,
     hitlist_size=None,
     cpus=None,
+    engine="diamond",
+    api_key=None,
+    ipg_cache=None,
+    ipg_cache_ttl=30,
+    intermediate_genes=False,
+    intermediate_flank=0,
+    gene_gap=None,
+    keep_all_hits=False,
 ):
     """Run cblaster.
 
@@ -132,18 +214,28 @@ def cblaster(
         binary_key (str): Key function used in binary table (len, max or sum)
         binary_attr (str): Hit attribute used for calculating cell values in binary table
         binary_decimals (int): Total decimal places in cell values in binary table
+        binary_matrix (str): Path to save binary table as a sparse matrix (.npz/.mtx)
         rid (str): NCBI BLAST search request identifier (RID)
         require (list): Query sequences that must be in hit clusters
         session_file (str): Path to cblaster session JSON file
         indent (int): Total spaces to indent JSON files
         plot (str): Path to cblaster plot HTML file
         recompute (str): Path to recomputed session JSON file
+        cpus (int): Number of CPUs to use in local searches and cluster detection
+        engine (str): Local search engine ('diamond', 'blastp' or 'mmseqs')
+        api_key (str): NCBI API key, used when fetching IPGs in remote searches
+        ipg_cache (str): Path to IPG cache used in remote searches
+        ipg_cache_ttl (float): Time-to-live (days) of IPG cache entries
+        intermediate_genes (bool): Store all genes in cluster regions (local searches)
+        intermediate_flank (int): Additional bp either side of clusters to store genes
+        gene_gap (int): Maximum number of genes between hits in a cluster; replaces gap
+        keep_all_hits (bool): Keep hits on scaffolds that cannot form clusters (local)
     Returns:
         Session: cblaster search Session object
     """
     if session_file and all(Path(sf).exists() for sf in session_file):
         LOG.info("Loading session(s) %s", session_file)
-        session = Session.from_files(session_file)
+        session = cb_merge.load_sessions(session_file, cpus=cpus)
 
         if recompute:
             LOG.info("Filtering session with new thresholds")
@@ -156,11 +248,12 @@ def cblaster(
                 unique,
                 min_hits,
                 require,
+                cpus=cpus,
+                gene_gap=gene_gap,
             )
             if recompute is not True:
                 LOG.info("Writing recomputed session to %s", recompute)
-                with open(recompute, "w") as fp:
-                    session.to_json(fp, indent=indent)
+                store.save_session(session, recompute, indent=indent)
     else:
         session = Session(
             queries=query_ids if query_ids else [],
@@ -200,6 +293,8 @@ def cblaster(
                 min_coverage=min_coverage,
                 max_evalue=max_evalue,
                 blast_file=blast_file,
+                engine=engine,
+                cpus=cpus,
             )
         elif mode == "remote":
             LOG.info("Starting cblaster in remote mode")
@@ -236,6 +331,8 @@ def cblaster(
                 min_coverage=min_coverage,
                 max_evalue=max_evalue,
                 blast_file=blast_file,
+                engine=engine,
+                cpus=cpus,
             )
             results = results_blast + results_hmm
 
@@ -262,7 +359,17 @@ def cblaster(
             results = results_blast + results_hmm
 
         if sqlite_db:
-            session.params["sqlite_db"] = sqlite_db
+            session.params["sqlite_db"] = str(sqlite_db)
+            if intermediate_genes:
+                session.params["intermediate_flank"] = intermediate_flank
+            if not keep_all_hits and (unique or min_hits or require):
+                # Hits on scaffolds that fail these thresholds are not kept, so
+                # recomputing with looser thresholds can miss clusters
+                session.params["prefilter"] = {
+                    "unique": unique,
+                    "min_hits": min_hits,
+                    "require": require,
+                }
 
         LOG.info("Found %i hits meeting score thresholds", len(results))
         LOG.info("Fetching genomic context of hits")
@@ -275,15 +382,22 @@ def cblaster(
             gap=gap,
             require=require,
             ipg_file=ipg_file,
-            query_sequence_order=list(session.sequences)
+            query_sequence_order=list(session.sequences),
+            api_key=api_key,
+            ipg_cache=ipg_cache,
+            ipg_cache_ttl=ipg_cache_ttl,
+            cpus=cpus,
+            intermediate_genes=intermediate_genes,
+            intermediate_flank=intermediate_flank,
+            gene_gap=gene_gap,
+            keep_all_hits=keep_all_hits,
         )
 
         if session_file:
             LOG.info("Writing current search session to %s", session_file[0])
             if len(session_file) > 1:
                 LOG.warning("Multiple session files specified, using first")
-            with open(session_file[0], "w") as fp:
-                session.to_json(fp, indent=indent)
+            store.save_session(session, session_file[0], indent=indent)
 
     if binary:
         LOG.info("Writing binary summary table to %s", binary)
@@ -297,6 +411,10 @@ def cblaster(
             decimals=binary_decimals,
         )
 
+    if binary_matrix:
+        LOG.info("Writing binary matrix to %s", binary_matrix)
+        matrix.save_matrix(session, binary_matrix, key=binary_key, attr=binary_attr)
+
     LOG.info("Writing summary to %s", "stdout" if output == sys.stdout else output)
     results = session.format(
         "summary",
@@ -328,6 +446,7 @@ def main():
             cpus=args.cpus,
             batch=args.batch,
             force=args.force,
+            engine=args.engine,
         )
 
     elif args.subcommand == "search":
@@ -356,6 +475,7 @@ def main():
             binary_key=args.binary_key,
             binary_attr=args.binary_attr,
             binary_decimals=args.binary_decimals,
+            binary_matrix=args.binary_matrix,
             rid=args.rid,
             session_file=args.session_file,
             indent=args.indent,
@@ -365,6 +485,14 @@ def main():
             ipg_file=args.ipg_file,
             hitlist_size=args.hitlist_size,
             cpus=args.cpus,
+            engine=args.engine,
+            api_key=args.api_key,
+            ipg_cache=args.ipg_cache,
+            ipg_cache_ttl=args.ipg_cache_ttl,
+            intermediate_genes=args.intermediate_genes,
+            intermediate_flank=args.intermediate_flank,
+            gene_gap=args.gene_gap,
+            keep_all_hits=args.keep_all_hits,
         )
 
     elif args.subcommand == "gui":
@@ -384,6 +512,26 @@ def main():
             plot=args.plot,
         )
 
+    elif args.subcommand == "sweep":
+        sweep(
+            args.session,
+            args.output,
+            max_gap=args.max_gap,
+            samples=args.samples,
+            scale=args.scale,
+            unique=args.unique,
+            min_hits=args.min_hits,
+            min_identity=args.min_identity,
+            min_coverage=args.min_coverage,
+            max_evalue=args.max_evalue,
+            require=args.require,
+            cpus=args.cpus,
+            delimiter=args.delimiter,
+            hide_headers=args.hide_headers,
+            decimals=args.decimals,
+            plot=args.plot,
+        )
+
     elif args.subcommand == "extract":
         extract.extract(
             args.session,
@@ -394,7 +542,20 @@ def main():
             scaffolds=args.scaffolds,
             name_only=args.name_only,
             delimiter=args.delimiter,
+            intermediate_genes=args.intermediate_genes,
         )
 
+    elif args.subcommand == "cache":
+        if args.prune:
+            cache.prune(args.cache, ttl=args.ttl)
+        if args.export:
+            cache.export(args.cache, args.export)
+
+    elif args.subcommand == "merge":
+        merge(args.sessions, args.output, cpus=args.cpus, indent=args.indent)
+
+    elif args.subcommand == "convert":
+        convert(args.session, args.output, indent=args.indent)
+
 if __name__ == "__main__":
     main()
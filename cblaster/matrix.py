@@ -0,0 +1,120 @@
+"""
+Array representations of cblaster sessions.
+
+binary_matrix() builds the cluster by query matrix of a binary table (see
+formatters.binary()) as a SciPy sparse matrix. Every hit in a cluster is gathered into
+flat arrays once, and cell values are then reduced with NumPy, instead of formatting
+each cell as text. Matrices can be saved for use in other tools with save_matrix():
+
+>>> save_matrix(session, "clusters.npz", key=max, attr="identity")
+
+This writes clusters.npz, as well as clusters.rows.tsv (organism, scaffold, start and
+end of each cluster) and clusters.columns.txt (query names).
+"""
+
+import logging
+
+from pathlib import Path
+
+import numpy as np
+
+from scipy import io, sparse
+
+from cblaster.index import SessionIndex
+
+
+LOG = logging.getLogger(__name__)
+
+# NumPy equivalents of key functions used in binary tables; len counts hits instead
+REDUCERS = {max: np.maximum, min: np.minimum, sum: np.add}
+
+
+def binary_matrix(session, key=len, attr="identity", index=None):
+    """Builds the binary table of a session as a sparse matrix.
+
+    Cells without hits are 0, rather than the value of `key` on no hits.
+
+    Args:
+        session (Session): cblaster Session object.
+        key (callable): len, to count hits, or one of max, min or sum.
+        attr (str): Hit attribute reduced using `key`.
+        index (SessionIndex): Index of the session. Built from `session` if not given.
+    Raises:
+        ValueError: `key` is not len, max, min or sum
+    Returns:
+        SciPy CSR matrix of clusters by queries, in the order of `index.clusters`
+        and `index.queries`.
+    """
+    if key is not len and key not in REDUCERS:
+        raise ValueError("Expected len, max, min or sum as key function")
+    if index is None:
+        index = SessionIndex(session)
+
+    columns = {query: column for column, query in enumerate(index.queries)}
+    rows, cols, values = [], [], []
+    for row, (_, _, cluster) in enumerate(index.clusters):
+        for subject in cluster.subjects:
+            for hit in subject.hits:
+                if hit.query not in columns:
+                    continue
+                rows.append(row)
+                cols.append(columns[hit.query])
+                values.append(getattr(hit, attr) if key is not len else 1)
+
+    shape = (len(index.clusters), len(columns))
+    if not rows:
+        return sparse.csr_matrix(shape, dtype=np.int64 if key is len else np.float64)
+
+    # Sort hits by cell, then reduce each run of hits in the same cell
+    cells = np.array(rows, dtype=np.int64) * shape[1] + np.array(cols, dtype=np.int64)
+    order = np.argsort(cells, kind="stable")
+    cells = cells[order]
+    starts = np.flatnonzero(np.r_[True, cells[1:] != cells[:-1]])
+    if key is len:
+        data = np.diff(np.r_[starts, len(cells)])
+    else:
+        data = REDUCERS[key].reduceat(np.array(values, dtype=np.float64)[order], starts)
+    return sparse.csr_matrix(
+        (data, np.divmod(cells[starts], shape[1])),
+        shape=shape,
+    )
+
+
+def save_matrix(session, path, key=len, attr="identity", index=None):
+    """Saves the binary table of a session as a sparse matrix with label files.
+
+    The matrix is saved in SciPy .npz format (see scipy.sparse.load_npz()) or as Matrix
+    Market (.mtx), depending on the suffix of `path`. Cluster labels are written to a
+    tab-separated .rows.tsv file, and query names to a .columns.txt file, alongside it.
+
+    Args:
+        session (Session): cblaster Session object.
+        path (str): Path to matrix file, ending in .npz or .mtx.
+        key (callable): Key function (see binary_matrix()).
+        attr (str): Hit attribute reduced using `key`.
+        index (SessionIndex): Index of the session. Built from `session` if not given.
+    Raises:
+        ValueError: `path` does not end in .npz or .mtx
+    """
+    path = Path(path)
+    if path.suffix not in (".npz", ".mtx"):
+        raise ValueError("Expected matrix file ending in .npz or .mtx")
+    if index is None:
+        index = SessionIndex(session)
+    matrix = binary_matrix(session, key=key, attr=attr, index=index)
+    if path.suffix == ".npz":
+        sparse.save_npz(str(path), matrix)
+    else:
+        io.mmwrite(str(path), matrix)
+
+    prefix = path.with_suffix("")
+    with open(f"{prefix}.rows.tsv", "w") as fp:
+        fp.write("Organism\tScaffold\tStart\tEnd\n")
+        for organism, scaffold, cluster in index.clusters:
+            fp.write(
+                f"{organism.full_name}\t{scaffold.accession}"
+                f"\t{cluster.start}\t{cluster.end}\n"
+            )
+    with open(f"{prefix}.columns.txt", "w") as fp:
+        fp.write("".join(f"{query}\n" for query in index.queries))
+    LOG.info("Saved %i x %i matrix to %s", *matrix.shape, path)
@@ -0,0 +1,137 @@
+"""
+This module merges cblaster sessions, e.g. from searches split across many databases.
+
+Organisms with the same name and strain, and Scaffolds with the same accession, are
+merged instead of being repeated (see classes.Session.merge()).
+
+merge() writes a merged session without holding every input in memory. The organisms
+in each file are scanned first, in parallel, such that every Organism can then be
+written as soon as the last file containing it has been read. Only Organisms found in
+more than one file are held in memory while the inputs are streamed.
+
+>>> merge(["shard_1.jsonl.gz", "shard_2.jsonl.gz"], "merged.jsonl.gz", cpus=4)
+"""
+
+import gzip
+import json
+import logging
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from cblaster import helpers
+from cblaster.classes import Session, is_compact
+from cblaster.store import SessionStore, is_store, load_session, save_session
+
+
+LOG = logging.getLogger(__name__)
+
+
+def executor(cpus=None):
+    """Creates an executor for loading session files in parallel."""
+    if helpers.free_threaded():
+        return ThreadPoolExecutor(max_workers=cpus)
+    return ProcessPoolExecutor(max_workers=cpus)
+
+
+def load_sessions(paths, cpus=None):
+    """Loads and merges session files of any format into one Session.
+
+    Args:
+        paths (list): Paths to session files.
+        cpus (int): Total workers loading files; if None or 1, files are loaded in
+            this process.
+    Returns:
+        Merged Session object.
+    """
+    if len(paths) == 1 or cpus is None or cpus == 1:
+        return Session.merge(load_session(path) for path in paths)
+    with executor(cpus) as pool:
+        return Session.merge(pool.map(load_session, paths))
+
+
+def scan(path):
+    """Reads the queries, sequences and parameters of a session file, as well as the
+    key (see Organism.key) of every Organism in it.
+    """
+    if is_store(path):
+        store = SessionStore(path)
+        header = Session(store.queries, store.sequences, store.params)
+        keys = store.keys()
+    elif is_compact(path):
+        with gzip.open(path, "rt") as fp:
+            d = Session.read_header(fp)
+            header = Session(d.get("queries"), d.get("sequences"), d.get("params"))
+            keys = []
+            for line in fp:
+                organism = json.loads(line)
+                keys.append((organism["name"], organism["strain"]))
+    else:
+        header = Session.from_file(path)
+        keys = [organism.key for organism in header.organisms]
+        header.organisms = []
+    return header, keys
+
+
+def iter_organisms(path):
+    """Yields each Organism in a session file of any format."""
+    if is_store(path):
+        yield from SessionStore(path).organisms
+    else:
+        yield from Session.iter_organisms(path)
+
+
+def stream(paths, last):
+    """Merges Organisms from session files in order.
+
+    Args:
+        paths (list): Paths to session files.
+        last (dict): Index of the last file containing each Organism key.
+    Yields:
+        Merged Organism objects, once the last file containing them has been read.
+    """
+    pending = {}
+    for index, path in enumerate(paths):
+        LOG.info("Merging organisms from %s", path)
+        for organism in iter_organisms(path):
+            key = organism.key
+            if key in pending:
+                organism = pending.pop(key).merge(organism)
+            if last[key] == index:
+                yield organism
+            else:
+                pending[key] = organism
+
+
+def merge(paths, output, cpus=None, indent=None):
+    """Merges session files into one session file.
+
+    The output format is chosen from its suffix (see store.save_session()). Compact
+    and SQLite3 sessions are written one Organism at a time, whereas JSON sessions
+    have to be built in memory.
+
+    Args:
+        paths (list): Paths to session files.
+        output (str): Path to merged session file.
+        cpus (int): Total workers scanning files; if None or 1, files are scanned in
+            this process.
+        indent (int): Total spaces to indent JSON output.
+    Raises:
+        ValueError: Query sequences of any file do not match the first
+    """
+    LOG.info("Scanning organisms in %i session files", len(paths))
+    if cpus is None or cpus == 1:
+        scanned = [scan(path) for path in paths]
+    else:
+        with executor(cpus) as pool:
+            scanned = list(pool.map(scan, paths))
+
+    header, last = scanned[0][0], {}
+    for index, (session, keys) in enumerate(scanned):
+        if session.queries != header.queries:
+            raise ValueError(f"Query sequences of {paths[index]} do not match")
+        for key in keys:
+            last[key] = index
+    LOG.info("Found %i unique organisms", len(last))
+
+    header.organisms = stream(paths, last)
+    save_session(header, output, indent=indent)
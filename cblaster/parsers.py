@@ -19,8 +19,8 @@ def add_makedb_subparser(subparsers):
     )
     makedb.add_argument(
         "filename",
-        help="Name to use when building SQLite3/diamond databases (with extensions"
-        " .sqlite3 and .dmnd, respectively)",
+        help="Name to use when building SQLite3/search databases (with extensions"
+        " .sqlite3 and .dmnd/.blast/.mmseqs, respectively)",
     )
     makedb.add_argument(
         "-cp",
@@ -43,6 +43,14 @@ def add_makedb_subparser(subparsers):
         action="store_true",
         help="Overwrite pre-existing files, if any"
     )
+    makedb.add_argument(
+        "-en",
+        "--engine",
+        choices=["diamond", "blastp", "mmseqs"],
+        default="diamond",
+        help="Search engine to build a database for; DIAMOND (.dmnd), BLAST+"
+        " (.blast) or MMseqs2 (.mmseqs) (def. diamond)",
+    )
 
 
 def add_gui_subparser(subparsers):
@@ -139,6 +147,13 @@ def add_binary_arguments(group):
         help="Total decimal places to use when printing score values",
         default=4,
     )
+    group.add_argument(
+        "-bm",
+        "--binary_matrix",
+        help="Save the binary table as a sparse matrix, in SciPy (.npz) or Matrix"
+        " Market (.mtx) format, with row (.rows.tsv) and column (.columns.txt) label"
+        " files. Cell values are calculated using --binary_key and --binary_attr",
+    )
 
 
 def add_output_group(search):
@@ -185,17 +200,28 @@ def add_searching_group(search):
         default="nr",
         nargs="+",
         help="Database to be searched. This should be either a path to a local"
-        " DIAMOND database (if 'local' is passed to --mode) or a valid NCBI"
+        " DIAMOND, BLAST+ or MMseqs2 database (if 'local' is passed to --mode,"
+        " see --engine) or a valid NCBI"
         " database name (def. nr)"
         " For the hmm search mode a path to a local Fasta or genbanck database"
         " is required",
     )
+    group.add_argument(
+        "-en",
+        "--engine",
+        choices=["diamond", "blastp", "mmseqs"],
+        default="diamond",
+        help="Search engine used in local searches. The database given to"
+        " --database must be built for this engine using cblaster makedb"
+        " (def. diamond)",
+    )
     group.add_argument(
         "-cp",
         "--cpus",
         type=int,
-        help="Number of CPUs to use in local search. By default, all"
-        " available cores will be used.",
+        help="Number of CPUs to use in local search and cluster detection. By"
+        " default, all available cores will be used in local searches, and"
+        " clusters are found in a single process.",
     )
     group.add_argument(
         "-pfam",
@@ -218,6 +244,28 @@ def add_searching_group(search):
         " when using command line BLASTp (i.e. only used if 'remote' is passed to"
         ' --mode); e.g. "Aspergillus"[organism]',
     )
+    group.add_argument(
+        "-ak",
+        "--api_key",
+        help="NCBI API key, used to raise the request rate limit when fetching"
+        " genomic context from the NCBI (10 instead of 3 requests per second)."
+        " Defaults to the NCBI_API_KEY environment variable, if set.",
+    )
+    group.add_argument(
+        "-ic",
+        "--ipg_cache",
+        help="Path to an IPG cache (SQLite3). IPG tables are looked up in the cache"
+        " first, and only missing or stale proteins are fetched from the NCBI."
+        " The cache is created if it does not exist.",
+    )
+    group.add_argument(
+        "-ict",
+        "--ipg_cache_ttl",
+        type=float,
+        default=30,
+        help="Maximum age (days) of IPG cache entries before they are fetched"
+        " again (def. 30)",
+    )
     group.add_argument(
         "--rid",
         help="Request Identifier (RID) for a web BLAST search. This is only used"
@@ -230,7 +278,9 @@ def add_searching_group(search):
         "--session_file",
         nargs="*",
         help="Load session from JSON. If the specified file does not exist, "
-        "the results of the new search will be saved to this file.",
+        "the results of the new search will be saved to this file. Files ending in"
+        " .gz are saved in the compact session format, and files ending in .sqlite3"
+        " or .db as indexed SQLite3 databases.",
     )
     group.add_argument(
         "-rcp",
@@ -263,6 +313,14 @@ def add_clustering_group(search):
         help="Maximum allowed intergenic distance (bp) between conserved hits to"
         " be considered in the same block (def. 20000)",
     )
+    group.add_argument(
+        "-gg",
+        "--gene_gap",
+        type=int,
+        help="Maximum allowed number of genes between conserved hits to be"
+        " considered in the same block. Replaces --gap; only available in local"
+        " searches against databases built with gene ordinals",
+    )
     group.add_argument(
         "-u",
         "--unique",
@@ -284,6 +342,29 @@ def add_clustering_group(search):
         nargs="+",
         help="Names of query sequences that must be represented in a hit cluster",
     )
+    group.add_argument(
+        "-ig",
+        "--intermediate_genes",
+        action="store_true",
+        help="Store all genes in the region of each cluster in the session file,"
+        " including genes without hits. Only available in local searches",
+    )
+    group.add_argument(
+        "-igf",
+        "--intermediate_flank",
+        type=int,
+        default=0,
+        help="Additional distance (bp) either side of each cluster to store genes"
+        " from when using --intermediate_genes (def. 0)",
+    )
+    group.add_argument(
+        "-kah",
+        "--keep_all_hits",
+        action="store_true",
+        help="Keep hits on scaffolds that cannot form a cluster in local searches."
+        " By default, these are discarded in the database before genomic context"
+        " is retrieved; keep them to later --recompute with lower thresholds",
+    )
 
 
 def add_filtering_group(search):
@@ -450,6 +531,14 @@ def add_extract_subparser(subparsers):
     fil.add_argument("-q", "--queries", help="IDs of query sequences", nargs="+")
     fil.add_argument("-or", "--organisms", help="Organism names", nargs="+")
     fil.add_argument("-sc", "--scaffolds", help="Scaffold names/ranges", nargs="+")
+    fil.add_argument(
+        "-ig",
+        "--intermediate_genes",
+        help="Extract every gene in cluster regions, including genes without hits."
+        " Requires a session from a local search with --intermediate_genes."
+        " --queries only filters genes with hits",
+        action="store_true",
+    )
 
     out = parser.add_argument_group("Output")
     out.add_argument("-o", "--output", help="Output file name")
@@ -468,6 +557,169 @@ def add_extract_subparser(subparsers):
     out.add_argument("-de", "--delimiter", help="Sequence description delimiter")
 
 
+def add_sweep_params_group(parser):
+    group = parser.add_argument_group("Thresholds")
+    group.add_argument(
+        "-u",
+        "--unique",
+        type=int,
+        nargs="+",
+        default=[3],
+        help="Unique query sequence thresholds (def. 3)",
+    )
+    group.add_argument(
+        "-mh",
+        "--min_hits",
+        type=int,
+        nargs="+",
+        default=[3],
+        help="Minimum hits in a cluster thresholds (def. 3)",
+    )
+    group.add_argument(
+        "-mi",
+        "--min_identity",
+        type=float,
+        nargs="+",
+        default=[30],
+        help="Minimum hit identity thresholds (def. 30)",
+    )
+    group.add_argument(
+        "-mc",
+        "--min_coverage",
+        type=float,
+        nargs="+",
+        default=[50],
+        help="Minimum hit query coverage thresholds (def. 50)",
+    )
+    group.add_argument(
+        "-me",
+        "--max_evalue",
+        type=float,
+        default=0.01,
+        help="Maximum hit e-value (def. 0.01)",
+    )
+    group.add_argument(
+        "-r",
+        "--require",
+        nargs="+",
+        help="Names of query sequences that must be represented in a hit cluster",
+    )
+    group.add_argument(
+        "-c",
+        "--cpus",
+        type=int,
+        help="Total worker processes to use (def. all available)",
+    )
+
+
+def add_sweep_subparser(subparsers):
+    sweep = subparsers.add_parser(
+        "sweep",
+        help="Sweep clustering thresholds",
+        description="Clustering threshold sweep.\n"
+        "Recomputes homologue clusters for every combination of --gap values"
+        " and clustering thresholds.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="Example usage\n-------------\n"
+        "Compare 2 and 3 unique queries at 30 and 50%% identity over 50 gap values:\n"
+        "  $ cblaster sweep session.json --samples 50 --unique 2 3 "
+        "--min_identity 30 50\n\n"
+        "Save delimited tabular output:\n"
+        "  $ cblaster sweep session.json --output sweep.csv --delimiter \",\"\n\n"
+        "Cameron Gilchrist, 2020",
+    )
+    sweep.add_argument("session", help="cblaster session file")
+    add_gne_params_group(sweep)
+    add_sweep_params_group(sweep)
+    add_gne_output_group(sweep)
+
+
+def add_cache_subparser(subparsers):
+    parser = subparsers.add_parser(
+        "cache",
+        help="Manage IPG caches",
+        description="Manage IPG caches created in remote searches (--ipg_cache)",
+        epilog="Example usage\n-------------\n"
+        "Remove entries older than 60 days:\n"
+        "  $ cblaster cache ipg_cache.sqlite3 --prune --ttl 60\n\n"
+        "Export the cache as an IPG table:\n"
+        "  $ cblaster cache ipg_cache.sqlite3 --export ipgs.tsv\n\n"
+        "Cameron Gilchrist, 2020",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("cache", help="IPG cache file")
+    parser.add_argument(
+        "-p",
+        "--prune",
+        action="store_true",
+        help="Remove entries older than --ttl days",
+    )
+    parser.add_argument(
+        "-t",
+        "--ttl",
+        type=float,
+        default=30,
+        help="Maximum age (days) of entries kept when pruning (def. 30)",
+    )
+    parser.add_argument(
+        "-e",
+        "--export",
+        type=argparse.FileType("w"),
+        help="Write all cached rows to file as an IPG table",
+    )
+
+
+def add_merge_subparser(subparsers):
+    parser = subparsers.add_parser(
+        "merge",
+        help="Merge session files",
+        description="Merge session files, e.g. from searches of split databases.\n"
+        "Organisms and scaffolds found in more than one file are merged. Output files"
+        " ending in .gz (compact) or .sqlite3/.db (SQLite3) are written one organism"
+        " at a time, without loading every input into memory.",
+        epilog="Example usage\n-------------\n"
+        "Merge shard sessions into a compact session, scanning files with 8 workers:\n"
+        "  $ cblaster merge shards/*.jsonl.gz -o merged.jsonl.gz -c 8\n\n"
+        "Cameron Gilchrist, 2020",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("sessions", nargs="+", help="cblaster session files")
+    parser.add_argument(
+        "-o",
+        "--output",
+        required=True,
+        help="Merged session file",
+    )
+    parser.add_argument(
+        "-c",
+        "--cpus",
+        type=int,
+        help="Total worker processes used to scan session files (def. all available)",
+    )
+
+
+def add_convert_subparser(subparsers):
+    parser = subparsers.add_parser(
+        "convert",
+        help="Convert session files between formats",
+        description="Convert session files between JSON, the compact session format"
+        " and SQLite3.\nOutput files ending in .gz are written in the compact format,"
+        " files ending in .sqlite3 or .db as SQLite3 databases, and any other file as"
+        " JSON.",
+        epilog="Example usage\n-------------\n"
+        "Convert a JSON session to the compact format:\n"
+        "  $ cblaster convert session.json session.jsonl.gz\n\n"
+        "Convert a compact session back to JSON:\n"
+        "  $ cblaster convert session.jsonl.gz session.json\n\n"
+        "Convert a JSON session to an indexed SQLite3 database:\n"
+        "  $ cblaster convert session.json session.sqlite3\n\n"
+        "Cameron Gilchrist, 2020",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("session", help="cblaster session file")
+    parser.add_argument("output", help="Converted session file")
+
+
 def get_parser():
     parser = argparse.ArgumentParser(
         "cblaster",
@@ -492,7 +744,11 @@ def get_parser():
     add_makedb_subparser(subparsers)
     add_search_subparser(subparsers)
     add_gne_subparser(subparsers)
+    add_sweep_subparser(subparsers)
     add_extract_subparser(subparsers)
+    add_cache_subparser(subparsers)
+    add_merge_subparser(subparsers)
+    add_convert_subparser(subparsers)
     return parser
 
 
@@ -504,7 +760,9 @@ def parse_args(args):
         parser.print_help()
         raise SystemExit
 
-    if arguments.subcommand in ("gui", "makedb", "gne", "extract"):
+    if arguments.subcommand in (
+        "gui", "makedb", "gne", "sweep", "extract", "cache", "merge", "convert"
+    ):
         return arguments
 
     if arguments.mode == "remote":
@@ -519,7 +777,19 @@ def parse_args(args):
     # Convert key to its corresponding builtin function
     arguments.binary_key = getattr(builtins, arguments.binary_key)
 
+    if arguments.binary_matrix and not arguments.binary_matrix.endswith(
+        (".npz", ".mtx")
+    ):
+        parser.error("--binary_matrix must end in .npz or .mtx")
+
     if arguments.recompute and not arguments.session_file:
         parser.error("--recompute requires --session_file")
 
+    if (
+        arguments.gene_gap is not None
+        and arguments.mode != "local"
+        and not arguments.recompute
+    ):
+        parser.error("--gene_gap can only be used when --mode is 'local'")
+
     return arguments
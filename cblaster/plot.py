@@ -1,22 +1,33 @@
 import http.server
-import socketserver
 import webbrowser
 import json
+import base64
+import gzip
 import shutil
 import logging
 
 from functools import partial
 from collections import defaultdict
+from collections.abc import Sequence
 
-import scipy
-from scipy.cluster.hierarchy import linkage
+import numpy as np
+
+from scipy.cluster.hierarchy import linkage, optimal_leaf_ordering
 
-from cblaster.classes import Session
 from cblaster.helpers import get_project_root
+from cblaster.index import SessionIndex, group_hits
+from cblaster.matrix import binary_matrix
+from cblaster.store import SessionStore, open_session
 
 
 LOG = logging.getLogger(__name__)
 
+# Clusters per chunk of heatmap data, loaded by the plot as it is scrolled
+CHUNK_SIZE = 100
+
+# Clusters above which duplicate rows are merged before linkage (see dedup_linkage())
+LINKAGE_THRESHOLD = 5000
+
 
 def transform_linkage_matrix(matrix):
     """Converts SciPy linkage matrix to D3 hierarchical format."""
@@ -38,24 +49,206 @@ def transform_linkage_matrix(matrix):
             "children": [hierarchy.pop(one), hierarchy.pop(two)]
         }
 
-    return hierarchy[new]
-
-
-def generate_linkage_matrix(array):
-    """Generate a normalised linkage matrix from a given array."""
-    array = [
-        [cell["value"] for cell in cells]
-        for cells in array
-    ]
-    matrix = linkage(array, "ward")
-    matrix[:, 2] /= matrix[:, 2].max()
+    (root,) = hierarchy.values()
+    return root
+
+
+def ward_merges(points, weights):
+    """Finds Ward merges of weighted points using the nearest-neighbour chain algorithm.
+
+    Unlike scipy.cluster.hierarchy.linkage(), this does not compute a distance matrix;
+    distances from one cluster to every other are computed from cluster centroids as
+    they are needed. This uses memory linear in the number of points.
+
+    Args:
+        points (numpy.ndarray): Points to cluster, one per row.
+        weights (numpy.ndarray): Number of observations at each point.
+    Returns:
+        List of (one, two, distance) tuples, where one and two are the index of any
+        point in each merged cluster, in the order they were merged.
+    """
+    centroids = np.array(points, dtype=np.float64)
+    sizes = np.array(weights, dtype=np.float64)
+    active = np.ones(len(sizes), dtype=bool)
+    merges, chain = [], []
+    remaining = len(sizes)
+    while remaining > 1:
+        if not chain:
+            chain.append(int(np.flatnonzero(active)[0]))
+        one = chain[-1]
+        squares = np.square(centroids - centroids[one]).sum(axis=1)
+        distances = np.sqrt(2 * sizes[one] * sizes / (sizes[one] + sizes) * squares)
+        distances[~active] = np.inf
+        distances[one] = np.inf
+        two = int(np.argmin(distances))
+
+        # Prefer the previous cluster in the chain on ties, so the chain terminates
+        if len(chain) > 1 and distances[chain[-2]] <= distances[two]:
+            two = chain[-2]
+        if len(chain) > 1 and two == chain[-2]:
+            del chain[-2:]
+            total = sizes[one] + sizes[two]
+            centroids[one] = (
+                sizes[one] * centroids[one] + sizes[two] * centroids[two]
+            ) / total
+            sizes[one] = total
+            active[two] = False
+            merges.append((one, two, distances[two]))
+            remaining -= 1
+        else:
+            chain.append(two)
+    return merges
+
+
+def dedup_linkage(array, order=False):
+    """Generates a Ward linkage matrix by clustering only the unique rows of an array.
+
+    Duplicate rows are joined at distance 0 in balanced subtrees, and unique rows are
+    then clustered weighted by their number of duplicates (see ward_merges()). This
+    gives the same merge distances as Ward linkage of the full array.
+
+    If `order` is True, the children of each merge are flipped so that the leaves
+    at either side of the join are as close as possible. This approximates optimal
+    leaf ordering in linear time.
+
+    Args:
+        array (numpy.ndarray): Observations to cluster, one per row.
+        order (bool): Order leaves of the hierarchy.
+    Returns:
+        SciPy linkage matrix of the rows in `array`.
+    """
+    total = len(array)
+    unique, inverse, counts = np.unique(
+        array, axis=0, return_inverse=True, return_counts=True
+    )
+    inverse = inverse.reshape(-1)
+    rows, sizes, parents = [], [1] * total, {}
+
+    def join(one, two, distance):
+        node = total + len(rows)
+        rows.append([one, two, distance, sizes[one] + sizes[two]])
+        sizes.append(sizes[one] + sizes[two])
+        parents[one] = parents[two] = node
+        return node
+
+    # Join duplicate rows pairwise, so subtrees of many duplicates stay shallow
+    members = np.split(np.argsort(inverse, kind="stable"), np.cumsum(counts)[:-1])
+    nodes = []
+    for leaves in members:
+        leaves = leaves.tolist()
+        while len(leaves) > 1:
+            joined = [
+                join(one, two, 0.0) for one, two in zip(leaves[::2], leaves[1::2])
+            ]
+            leaves = joined + leaves[-1:] if len(leaves) % 2 else joined
+        nodes.append(leaves[0])
+
+    # Relabel merges of unique rows in order of distance, tracking clusters by their
+    # first unique row, and the unique rows at each end of their leaves
+    roots = list(range(len(unique)))
+    ends = {node: (row, row) for row, node in enumerate(nodes)}
+    flips = {}
+
+    def find(row):
+        while roots[row] != row:
+            roots[row] = roots[roots[row]]
+            row = roots[row]
+        return row
+
+    start = len(rows)
+    merges = ward_merges(unique, counts)
+    for one, two, distance in sorted(merges, key=lambda merge: merge[2]):
+        one, two = find(one), find(two)
+        left, right = nodes[one], nodes[two]
+        if order:
+            flips[left], flips[right] = min(
+                ((a, b) for a in (0, 1) for b in (0, 1)),
+                key=lambda flip: np.linalg.norm(
+                    unique[ends[left][1 - flip[0]]] - unique[ends[right][flip[1]]]
+                ),
+            )
+            ends[join(left, right, distance)] = (
+                ends[left][flips[left]],
+                ends[right][1 - flips[right]],
+            )
+        else:
+            join(left, right, distance)
+        roots[two] = one
+        nodes[one] = total + len(rows) - 1
+
+    # A subtree is reversed by swapping the children of every merge within it
+    if order:
+        reversed_ = {}
+        for node in range(total + len(rows) - 1, total + start - 1, -1):
+            reversed_[node] = flips.get(node, 0) ^ reversed_.get(parents.get(node), 0)
+            if reversed_[node]:
+                row = rows[node - total]
+                row[0], row[1] = row[1], row[0]
+
+    return np.array(rows, dtype=np.float64).reshape(-1, 4)
+
+
+def coarsen(array, threshold):
+    """Rounds the values in an array until it has at most `threshold` unique rows.
+
+    Values are rounded to whole numbers, then to tens, and otherwise reduced to presence
+    (100) or absence (0).
+    """
+    for decimals in (0, -1):
+        rounded = np.round(array, decimals)
+        if len(np.unique(rounded, axis=0)) <= threshold:
+            return rounded
+    rounded = np.where(array > 0, 100.0, 0.0)
+    unique = len(np.unique(rounded, axis=0))
+    if unique > threshold:
+        LOG.warning("Clustering %i unique presence/absence patterns", unique)
+    return rounded
+
+
+def generate_linkage_matrix(array, threshold=LINKAGE_THRESHOLD, order=False):
+    """Generate a normalised linkage matrix from a given array.
+
+    Arrays with more rows than `threshold` are clustered using dedup_linkage(), after
+    rounding values so that there are at most `threshold` unique rows (see coarsen()),
+    instead of scipy's linkage(), which needs memory quadratic in the number of rows.
+
+    Args:
+        array (numpy.ndarray): Observations to cluster, one per row.
+        threshold (int): Maximum rows to cluster using scipy's linkage().
+        order (bool): Order leaves of the hierarchy, using optimal leaf ordering below
+            `threshold` and an approximation of it above (see dedup_linkage()).
+    Returns:
+        SciPy linkage matrix with distances scaled between 0 and 1.
+    """
+    array = np.asarray(array, dtype=np.float64)
+    if len(array) < 2:
+        return np.empty((0, 4))
+    if len(array) > threshold:
+        matrix = dedup_linkage(coarsen(array, threshold), order=order)
+    else:
+        matrix = linkage(array, "ward")
+        if order:
+            matrix = optimal_leaf_ordering(matrix, array)
+    if matrix[:, 2].max() > 0:
+        matrix[:, 2] /= matrix[:, 2].max()
     return matrix
 
 
-def get_cell(query, cluster, cluster_id):
+def get_cell(query, cluster, cluster_id, hits=None):
+    """Builds a heatmap cell for the hits of a query in a cluster.
+
+    Args:
+        query (str): Name of query sequence.
+        cluster (Cluster): Cluster object.
+        cluster_id (int): Index of the cluster in the plot.
+        hits (list): (Subject, Hit) tuples of hits to the query in the cluster (see
+            SessionIndex.cluster_hits()). Found by walking the cluster if not given.
+    """
+    if hits is None:
+        hits = group_hits(cluster.subjects).get(query, [])
     hits = [
         {
-            "name": hit.subject,
+            "name": subject.name if subject.name else hit.subject,
             "identity": hit.identity,
             "coverage": hit.coverage,
             "bitscore": hit.bitscore,
@@ -65,9 +258,7 @@ def get_cell(query, cluster, cluster_id):
             "end": subject.end,
             "ipg": subject.ipg,
         }
-        for subject in cluster
-        for hit in subject.hits
-        if hit.query == query
+        for subject, hit in hits
     ]
     value = max(hit["identity"] for hit in hits) if hits else 0
     cell = {
@@ -102,64 +293,156 @@ def flag_duplicate_cells(cells):
             cells[index]["flag"] = number
 
 
-def get_data(session):
-    matrix = []
+def get_data(session, counts=None, order=False):
+    """Builds plot data from a session.
+
+    Args:
+        session (Session): cblaster Session object.
+        counts (dict): Totals of each object in the session. If not given, these are
+            counted from the session itself.
+        order (bool): Order leaves of the cluster hierarchy (see
+            generate_linkage_matrix()).
+    Returns:
+        Dictionary of queries, cluster labels, counts, heatmap cells (see
+        HeatmapCells) and the cluster hierarchy.
+    """
+    index = SessionIndex(session)
     labels = {}
-    counts = {
-        "queries": len(session.queries),
-        "hits": 0,
-        "subjects": 0,
-        "clusters": 0,
-        "scaffolds": 0,
-        "organisms": 0
+    totals = {
+        "queries": len(index.queries),
+        "hits": index.total_hits,
+        "subjects": index.total_subjects,
+        "clusters": len(index.clusters),
+        "scaffolds": sum(len(o.scaffolds) for o in index.organisms),
+        "organisms": len(index.organisms),
     }
 
-    cluster_id = 0
-
-    for organism in session.organisms:
-        counts["organisms"] += 1
-
-        for accession, scaffold in organism.scaffolds.items():
-            counts["scaffolds"] += 1
-            counts["subjects"] += len(scaffold.subjects)
-            counts["hits"] += sum(len(sub.hits) for sub in scaffold.subjects)
-
-            for cluster in scaffold.clusters:
-                counts["clusters"] += 1
-
-                # Save the cluster name and scaffold
-                labels[cluster_id] = {
-                    "id": cluster_id,
-                    "name": organism.full_name,
-                    "scaffold": accession,
-                    "start": cluster.start,
-                    "end": cluster.end,
-                }
-
-                # Generate all cells for the heatmap
-                cells = [
-                    get_cell(query, cluster, cluster_id)
-                    for query in session.queries
-                ]
-
-                # Flag cells which contain hits present in other cells
-                flag_duplicate_cells(cells)
-                matrix.append(cells)
-                cluster_id += 1
-
-    # Generate input for linkage
-    linkage_matrix = generate_linkage_matrix(matrix)
+    # Save the cluster name and scaffold
+    for cluster_id, (organism, scaffold, cluster) in enumerate(index.clusters):
+        labels[cluster_id] = {
+            "id": cluster_id,
+            "name": organism.full_name,
+            "scaffold": scaffold.accession,
+            "start": cluster.start,
+            "end": cluster.end,
+            "score": cluster.score,
+        }
+
+    # Cluster on the highest identity of each query in each cluster, as in heatmap cells
+    values = binary_matrix(session, key=max, attr="identity", index=index)
+    linkage_matrix = generate_linkage_matrix(values.toarray(), order=order)
     hierarchy = transform_linkage_matrix(linkage_matrix)
 
     return {
-        "queries": session.queries,
+        "queries": index.queries,
         "labels": labels,
-        "counts": counts,
-        "matrix": matrix,
+        "counts": totals if counts is None else counts,
+        "matrix": HeatmapCells(index),
         "hierarchy": hierarchy,
     }
 
 
+class HeatmapCells(Sequence):
+    """Heatmap cells of each cluster in a session, indexed by cluster ID.
+
+    Cells of a cluster are built each time they are requested, so only the clusters
+    of requested chunks are held in memory (see paginate()).
+    """
+
+    def __init__(self, index):
+        self._index = index
+
+    def __len__(self):
+        return len(self._index.clusters)
+
+    def __getitem__(self, cluster_id):
+        _, _, cluster = self._index.clusters[cluster_id]
+        groups = group_hits(cluster.subjects)
+        cells = [
+            get_cell(query, cluster, cluster_id, hits=groups.get(query, []))
+            for query in self._index.queries
+        ]
+
+        # Flag cells which contain hits present in other cells
+        flag_duplicate_cells(cells)
+        return cells
+
+
+def paginate(data, size=CHUNK_SIZE):
+    """Splits heatmap plot data into an overview and pages of clusters.
+
+    The overview holds the queries, counts and cluster hierarchy, as well as the total
+    number of clusters and chunks. Clusters are split into pages of `size` cluster
+    IDs, in descending order of cluster score; the labels and heatmap cells of a page
+    are only built by get_chunk().
+
+    Args:
+        data (dict): Plot data (see get_data()).
+        size (int): Clusters per chunk.
+    Returns:
+        Overview dictionary and list of pages of cluster IDs.
+    """
+    labels = data["labels"]
+    order = sorted(
+        labels,
+        key=lambda cluster_id: (-labels[cluster_id]["score"], cluster_id),
+    )
+    pages = [order[start:start + size] for start in range(0, len(order), size)]
+    overview = {
+        key: value
+        for key, value in data.items()
+        if key not in ("labels", "matrix")
+    }
+    overview["clusters"] = len(order)
+    overview["chunks"] = len(pages)
+    return overview, pages
+
+
+def get_chunk(data, page):
+    """Builds the labels and heatmap cells of a page of clusters (see paginate())."""
+    return {
+        "labels": {cluster_id: data["labels"][cluster_id] for cluster_id in page},
+        "matrix": [data["matrix"][cluster_id] for cluster_id in page],
+    }
+
+
+def encode(data):
+    """Serialises plot data to compact JSON bytes."""
+    return json.dumps(data, separators=(",", ":")).encode()
+
+
+class DataCache:
+    """Serialised and gzip compressed plot data, keyed on request path.
+
+    Heatmap data is served as an overview at /data.json and chunks of clusters at
+    /chunks/<index>.json (see paginate()). Other charts are served whole at /data.json.
+    Each response is only built, serialised and compressed on its first request.
+    """
+
+    def __init__(self, data, chart="heatmap", size=CHUNK_SIZE):
+        if chart == "heatmap":
+            overview, pages = paginate(data, size=size)
+        else:
+            overview, pages = data, []
+        self._data = {"/data.json": lambda: overview}
+        for index, page in enumerate(pages):
+            self._data[f"/chunks/{index}.json"] = partial(get_chunk, data, page)
+        self._cache = {}
+
+    def get(self, path):
+        """Gets JSON and gzip compressed JSON of the data at a path.
+
+        Returns:
+            Tuple of bytes, or None if there is no data at `path`.
+        """
+        if path in self._cache:
+            return self._cache[path]
+        if path not in self._data:
+            return None
+        body = encode(self._data[path]())
+        return self._cache.setdefault(path, (body, gzip.compress(body)))
+
+
 class CustomHandler(http.server.BaseHTTPRequestHandler):
     """Handler for serving cblaster plots."""
 
@@ -177,15 +460,28 @@ class CustomHandler(http.server.BaseHTTPRequestHandler):
         self.send_header("Content-Type", mime)
         self.end_headers()
 
+    def send_data(self, body, compressed):
+        """Sends cached JSON data, gzip compressed if the client accepts it."""
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Cache-Control", "max-age=86400")
+        self.send_header("Vary", "Accept-Encoding")
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            self.send_header("Content-Encoding", "gzip")
+            body = compressed
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
     def log_message(self, format, *args):
         """Suppresses logging messages on every request."""
         return
 
     def do_GET(self):
         """Serves each component of the cblaster plot."""
-        if self.path == "/data.json":
-            self.send_headers("text/json")
-            self.wfile.write(json.dumps(self._data).encode())
+        data = self._data.get(self.path)
+        if data:
+            self.send_data(*data)
             return
         path, mime = None, None
         if self.path == "/":
@@ -193,6 +489,8 @@ class CustomHandler(http.server.BaseHTTPRequestHandler):
                 path, mime = self._dir / "cblaster.html", "text/html"
             elif self._chart == "gne":
                 path, mime = self._dir / "gne.html", "text/html"
+            elif self._chart == "sweep":
+                path, mime = self._dir / "sweep.html", "text/html"
         elif self.path == "/index.css":
             path, mime = self._dir / "index.css", "text/css"
         elif self.path == "/d3.min.js":
@@ -201,22 +499,38 @@ class CustomHandler(http.server.BaseHTTPRequestHandler):
             path, mime = self._dir / "cblaster.js", "text/javascript"
         elif self.path == "/gne.js":
             path, mime = self._dir / "gne.js", "text/javascript"
+        elif self.path == "/sweep.js":
+            path, mime = self._dir / "sweep.js", "text/javascript"
         if not path:
+            self.send_error(404)
             return
         with path.open("rb") as fp:
             self.send_headers(mime)
             self.copy_file(fp)
 
 
+def compress(data):
+    """Serialises plot data to gzip compressed, base64 encoded JSON."""
+    return base64.b64encode(gzip.compress(encode(data))).decode()
+
+
 def save_html(data, output, chart="heatmap"):
-    """Generates a static HTML file with all visualisation code."""
+    """Generates a static HTML file with all visualisation code.
+
+    Heatmap data is embedded as a gzip compressed, base64 encoded overview and chunks
+    (see paginate()), which the plot decompresses as they are needed.
+    """
 
     if chart == "heatmap":
         base, script = "cblaster.html", "cblaster.js"
     elif chart == "gne":
         base, script = "gne.html", "gne.js"
+    elif chart == "sweep":
+        base, script = "sweep.html", "sweep.js"
     else:
-        raise ValueError("Invalid chart specified, expected 'heatmap' or 'gne'")
+        raise ValueError(
+            "Invalid chart specified, expected 'heatmap', 'gne' or 'sweep'"
+        )
 
     directory = get_project_root() / "plot"
 
@@ -235,6 +549,13 @@ def save_html(data, output, chart="heatmap"):
         d3 = fp.read()
         html = html.replace(d3_string, f"<script>{d3}</script>")
 
+    if chart == "heatmap":
+        overview, pages = paginate(data)
+        data = {
+            "overview": compress(overview),
+            "chunks": [compress(get_chunk(data, page)) for page in pages],
+        }
+
     with (directory / script).open() as fp:
         js = f"const data={json.dumps(data)}" + fp.read()
         html = html.replace(cb_string, f"<script>{js}</script>")
@@ -244,10 +565,10 @@ def save_html(data, output, chart="heatmap"):
 
 
 def serve_html(data, chart="heatmap"):
-    handler = partial(CustomHandler, data, chart)
+    handler = partial(CustomHandler, DataCache(data, chart=chart), chart)
 
     # Instantiate a new server, bind to any open port
-    with socketserver.TCPServer(("localhost", 0), handler) as httpd:
+    with http.server.ThreadingHTTPServer(("localhost", 0), handler) as httpd:
 
         # Automatically open web browser to bound address
         address, port = httpd.server_address
@@ -262,8 +583,8 @@ def serve_html(data, chart="heatmap"):
             httpd.shutdown()
 
 
-def plot_session(session, output=None):
-    data = get_data(session)
+def plot_session(session, output=None, counts=None):
+    data = get_data(session, counts=counts)
     if output:
         LOG.info(f"Saving cblaster plot HTML to: {output}")
         save_html(data, output)
@@ -281,7 +602,21 @@ def plot_gne(data, output=None):
         serve_html(data, chart="gne")
 
 
+def plot_sweep(data, output=None):
+    if output:
+        LOG.info(f"Saving sweep plot HTML to: {output}")
+        save_html(data, chart="sweep", output=output)
+        webbrowser.open(output)
+    else:
+        serve_html(data, chart="sweep")
+
+
 def plot_session_file(path, output=None):
-    with open(path) as fp:
-        session = Session.from_json(fp)
-    plot_session(session, output=output)
+    session = open_session(path)
+    if isinstance(session, SessionStore):
+        # Only clustered subjects are plotted, but counts are of the whole session
+        plot_session(
+            session.where(in_cluster=True), output=output, counts=session.counts()
+        )
+    else:
+        plot_session(session, output=output)
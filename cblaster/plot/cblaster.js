@@ -13,11 +13,28 @@ const constants = {
 	"xAxisOnTop": true,
 }
 
+function inflate(string) {
+	/* Parses gzip compressed, base64 encoded JSON embedded in static plots. */
+	const bytes = Uint8Array.from(atob(string), c => c.charCodeAt(0));
+	const stream = new Blob([bytes])
+		.stream()
+		.pipeThrough(new DecompressionStream("gzip"));
+	return new Response(stream).json();
+}
+
+// Plot data is split into an overview and chunks of clusters in descending order
+// of score, which are only fetched (or decompressed) as they are needed.
 if (typeof data === 'undefined') {
 	// Load from HTTP server
-	const data = d3.json("data.json").then(data => plot(data));
+	plot({
+		overview: () => d3.json("data.json"),
+		chunk: index => d3.json(`chunks/${index}.json`),
+	});
 } else {
-	plot(data);
+	plot({
+		overview: () => inflate(data.overview),
+		chunk: index => inflate(data.chunks[index]),
+	});
 }
 
 function serialise(svg) {
@@ -231,22 +248,44 @@ function pruneHierarchy(node, label) {
 	})
 }
 
+function keepHierarchy(node, labels) {
+	/* Copies a hierarchy, keeping only leaves whose name is a key in labels.
+	 * Returns null if no leaves are kept.
+	*/
+	if (!node.children)
+		return (node.name in labels) ? {...node} : null
+	const children = node.children
+		.map(child => keepHierarchy(child, labels))
+		.filter(child => child !== null)
+	return children.length > 0 ? {...node, children: children} : null
+}
+
 function getScaffoldString(data) {
 	let scaffold = data.scaffold + ":" + data.start + "-" + data.end
 	return constants.cellHeight < 24 ? `    ${scaffold}` : scaffold
 }
 
-function plot(data) {
-	data.matrix = flattenArray(data.matrix);
+function plot(source) {
+	source.overview().then(overview => plotOverview(overview, source));
+}
 
-  const originalData = JSON.parse(JSON.stringify(data))
+function plotOverview(overview, source) {
+	// Clusters loaded so far, the data currently shown and the next chunk to load
+	const loaded = {labels: {}, matrix: []}
+	let data = null
+	let nextChunk = 0
+	let loading = false
 
-	// Reset to the original data. Have to make a deep copy here, since update
+	// Reset to all loaded clusters. Have to make a deep copy here, since update
 	// will mutate data
 	d3.select("#btn-reset-filters")
 		.on("click", () => {
-			const copy = JSON.parse(JSON.stringify(originalData))
-			update(copy)
+			const copy = JSON.parse(JSON.stringify(loaded))
+			update({
+				...overview,
+				...copy,
+				hierarchy: keepHierarchy(overview.hierarchy, copy.labels),
+			})
 		});
 
 	// Base <svg> and <g> elements. All chart elements go inside <g>. Pan/zoom
@@ -262,7 +301,10 @@ function plot(data) {
 	// Set up pan/zoom behaviour, and set default pan/zoom position
 	const zoom = d3.zoom()
 		.scaleExtent([0, 8])
-		.on("zoom", () => g.attr("transform", d3.event.transform))
+		.on("zoom", () => {
+			g.attr("transform", d3.event.transform)
+			loadVisible()
+		})
 		.on("start", () => svg.attr("cursor", "grabbing"))
 		.on("end", () => svg.attr("cursor", "grab"))
 	const transform = d3.zoomIdentity
@@ -305,10 +347,58 @@ function plot(data) {
 		})
 
 	// Populate the search summary
-	const summaryHTML = getSummaryHTML(data.counts)
+	const summaryHTML = getSummaryHTML(overview.counts)
 	d3.select("#p-result-summary")
 		.html(summaryHTML)
 
+	// Fetch the next chunk of clusters, and add them to the plot. Clusters hidden
+	// by the user stay hidden, as do cells of hidden queries. These are function
+	// declarations since the zoom behaviour calls them before this point.
+	function loadChunk() {
+		if (loading || nextChunk >= overview.chunks)
+			return
+		loading = true
+		source.chunk(nextChunk++).then(chunk => {
+			const matrix = flattenArray(chunk.matrix)
+			Object.assign(loaded.labels, chunk.labels)
+			loaded.matrix = loaded.matrix.concat(matrix)
+			const queries = data ? data.queries : overview.queries
+			const labels = {...(data ? data.labels : {}), ...chunk.labels}
+			update({
+				...overview,
+				queries: queries,
+				labels: labels,
+				matrix: (data ? data.matrix : []).concat(
+					matrix.filter(cell => queries.includes(cell.query))
+				),
+				hierarchy: keepHierarchy(overview.hierarchy, labels),
+			})
+			d3.select("#p-loaded-summary")
+				.text(`Showing ${Object.keys(loaded.labels).length} of ${overview.clusters} clusters, in order of score.`)
+			d3.select("#btn-load-more")
+				.property("disabled", nextChunk >= overview.chunks)
+			loading = false
+			setTimeout(loadVisible, 500)
+		}).catch(error => {
+			// Let the chunk be requested again, e.g. by the load more button
+			nextChunk--
+			loading = false
+			d3.select("#p-loaded-summary")
+				.text(`Failed to load clusters (${error.message}). Showing ${Object.keys(loaded.labels).length} of ${overview.clusters} clusters.`)
+			d3.select("#btn-load-more")
+				.property("disabled", false)
+		})
+	}
+
+	// Load more clusters once the bottom of the heatmap is in view
+	function loadVisible() {
+		const bottom = g.node().getBoundingClientRect().bottom
+		const height = svg.node().getBoundingClientRect().bottom
+		if (bottom < height + 10 * constants.cellHeight)
+			loadChunk()
+	}
+	d3.select("#btn-load-more").on("click", loadChunk)
+
 	// Populate tooltip with current cell data, and adjust position to match the
 	// cell in the heatmap (ignoring <g> transforms).
 	const cellEnter = (d, i, n) => {
@@ -357,7 +447,8 @@ function plot(data) {
 		.on("mouseenter", tooltipEnter)
 		.on("mouseleave", tooltipLeave)
 
-	function update(data) {
+	function update(newData) {
+		data = newData
 		let t = d3.transition().duration(400)
 
 		// Update x-axis domain/range based on current query sequences.
@@ -639,5 +730,5 @@ function plot(data) {
 		}, 0)
 	}
 
-	update(data)
+	loadChunk()
 }
@@ -0,0 +1,153 @@
+/* Clustering threshold sweep plot.
+ * Draws one line per combination of unique, min_hits, min_identity and
+ * min_coverage values, over the sampled gap values.
+ * */
+
+if (typeof data === 'undefined') {
+	const data = d3.json("data.json").then(data => plot(data));
+} else {
+	plot(data);
+}
+
+function serialise(svg) {
+	/* Saves the figure to SVG in its current state.
+	 * See gne.js.
+	*/
+	node = svg.node();
+	const xmlns = "http://www.w3.org/2000/xmlns/";
+	const xlinkns = "http://www.w3.org/1999/xlink";
+	const svgns = "http://www.w3.org/2000/node";
+	const bbox = node.getBBox();
+	node = node.cloneNode(true);
+	node.setAttribute("width", bbox.width);
+	node.setAttribute("height", bbox.height);
+	node.setAttributeNS(xmlns, "xmlns", svgns);
+	node.setAttributeNS(xmlns, "xmlns:xlink", xlinkns);
+	const serializer = new window.XMLSerializer;
+	const string = serializer.serializeToString(node);
+	return new Blob([string], {type: "image/node+xml"});
+}
+
+function download(blob, filename) {
+	/* Downloads a given blob to filename. See gne.js.
+	*/
+	const link = document.createElement("a");
+	link.href = URL.createObjectURL(blob);
+	link.download = filename;
+	document.body.appendChild(link);
+	link.click();
+	document.body.removeChild(link);
+}
+
+function plot(data) {
+	const width = 900
+	const height = 600
+	const margin = {
+		left: 160,
+		right: 30,
+		bottom: 60,
+		top: 20,
+	}
+
+	const svg = d3.select("#plot")
+		.append("svg")
+		.attr("xmlns", "http://www.w3.org/2000/svg")
+		.attr("height", "100vh")
+		.attr("viewBox", [0, 0, width, height])
+
+	d3.select("#btn-save-svg")
+		.on("click", () => {
+			const blob = serialise(svg)
+			download(blob, "sweep.svg")
+		})
+
+	// Group rows into one series per threshold combination
+	const label = d => `unique ${d.unique}, min_hits ${d.min_hits},`
+		+ ` identity ${d.min_identity}, coverage ${d.min_coverage}`
+	const series = d3.nest()
+		.key(label)
+		.entries(data)
+	const colour = d3.scaleOrdinal(d3.schemeCategory10)
+		.domain(series.map(s => s.key))
+
+	const top = (height) => height * 0.5
+
+	const x = d3.scaleLinear()
+		.domain(d3.extent(data, d => d.gap))
+		.range([margin.left, width - margin.right])
+	svg.append("g")
+		.attr("transform", `translate(0, ${height - margin.bottom})`)
+		.call(d3.axisBottom(x))
+
+	// y scale for median cluster size
+	const y0 = d3.scaleLinear()
+		.domain(d3.extent(data, d => d.medians))
+		.range([top(height) - 20, margin.top])
+		.nice()
+	svg.append("g")
+		.attr("transform", `translate(${margin.left}, 0)`)
+		.call(d3.axisLeft(y0))
+
+	// y scale for no. clusters
+	const y1 = d3.scaleLinear()
+		.domain(d3.extent(data, d => d.clusters))
+		.range([height - margin.bottom - 20, top(height)])
+		.nice()
+	svg.append("g")
+		.attr("transform", `translate(${margin.left}, 0)`)
+		.call(d3.axisLeft(y1))
+
+	const tooltip = d3.select("#plot")
+		.append("div")
+		.style("background", "rgba(0, 0, 0, 0.1)")
+		.style("opacity", 0)
+		.style("padding", "5px")
+		.style("position", "absolute")
+
+	// Highlight a series and show its thresholds on hover
+	const highlight = (key) => {
+		lines.attr("opacity", d => key === null || d.key === key ? 1 : 0.15)
+		if (key === null) {
+			tooltip.style("opacity", 0)
+			return
+		}
+		tooltip
+			.html(`<b>${key}</b>`)
+			.style("opacity", 1)
+			.style("left", d3.event.pageX + 10 + "px")
+			.style("top", d3.event.pageY + 10 + "px")
+	}
+
+	const lines = svg.append("g")
+		.selectAll("g")
+		.data(series)
+		.join("g")
+		.attr("fill", "none")
+		.attr("stroke", d => colour(d.key))
+		.on("mousemove", d => highlight(d.key))
+		.on("mouseout", () => highlight(null))
+	lines.append("path")
+		.attr("d", d => d3.line().x(v => x(v.gap)).y(v => y0(v.medians))(d.values))
+	lines.append("path")
+		.attr("d", d => d3.line().x(v => x(v.gap)).y(v => y1(v.clusters))(d.values))
+
+	// Add chart axis titles
+	svg.append("text")
+		.text("Intergenic distance threshold (bp)")
+		.attr("x", (margin.left + width) / 2)
+		.attr("y", height - margin.bottom / 4)
+		.attr("text-anchor", "middle")
+		.style("font-size", "12px")
+	svg.append("text")
+		.text("Median cluster size (bp)")
+		.attr("x", margin.left - 50)
+		.attr("y", (y0.range()[0] + y0.range()[1]) / 2)
+		.attr("text-anchor", "end")
+		.style("font-size", "12px")
+	svg.append("text")
+		.text("Total clusters")
+		.attr("x", margin.left - 50)
+		.attr("y", (y1.range()[0] + y1.range()[1]) / 2)
+		.attr("text-anchor", "end")
+		.style("font-size", "12px")
+}
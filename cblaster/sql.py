@@ -7,8 +7,28 @@ CREATE TABLE gene (
     strand          INTEGER,
     translation     TEXT,
     scaffold        TEXT,
-    organism        TEXT
-);\
+    organism        TEXT,
+    ordinal         INTEGER
+);
+CREATE INDEX gene_location ON gene (organism, scaffold, start_pos);\
+"""
+
+INDEXES = "PRAGMA index_list(gene)"
+
+REGION = """\
+SELECT
+    name,
+    start_pos,
+    end_pos,
+    strand
+FROM
+    gene
+WHERE
+    organism = ?
+    AND scaffold = ?
+    AND start_pos BETWEEN ? AND ?
+ORDER BY
+    start_pos\
 """
 
 QUERY = """\
@@ -19,13 +39,62 @@ SELECT
     end_pos,
     strand,
     scaffold,
-    organism
+    organism,
+    {}
 FROM
     gene
 WHERE
     id IN ({})\
 """
 
+COLUMNS = "PRAGMA table_info(gene)"
+
+HIT_TABLE = """\
+CREATE TEMP TABLE hit (
+    gene_id         INTEGER,
+    query           TEXT
+)\
+"""
+
+HIT_INSERT = "INSERT INTO hit VALUES (?, ?)"
+
+# Only returns genes on scaffolds with enough distinct queries (1st parameter) and
+# genes (2nd) hit, as well as all required queries (given in {require}, then their
+# total as the last parameter)
+CANDIDATE_QUERY = """\
+WITH candidate AS (
+    SELECT
+        gene.organism,
+        gene.scaffold
+    FROM
+        hit
+        JOIN gene ON gene.id = hit.gene_id
+    GROUP BY
+        gene.organism,
+        gene.scaffold
+    HAVING
+        COUNT(DISTINCT hit.query) >= ?
+        AND COUNT(DISTINCT gene.id) >= ?
+        AND COUNT(DISTINCT CASE WHEN hit.query IN ({require}) THEN hit.query END) >= ?
+)
+SELECT DISTINCT
+    gene.id,
+    gene.name,
+    gene.start_pos,
+    gene.end_pos,
+    gene.strand,
+    gene.scaffold,
+    gene.organism,
+    {ordinal}
+FROM
+    hit
+    JOIN gene ON gene.id = hit.gene_id
+    JOIN candidate ON candidate.organism = gene.organism
+        AND candidate.scaffold = gene.scaffold
+ORDER BY
+    gene.id\
+"""
+
 FASTA = 'SELECT ">"||gene.id||"\n"||gene.translation||"\n" FROM gene'
 
 INSERT = """\
@@ -36,8 +105,298 @@ INSERT INTO gene (
     strand,
     translation,
     scaffold,
-    organism
+    organism,
+    ordinal
+)
+VALUES
+    (?, ?, ?, ?, ?, ?, ?, ?)\
+"""
+
+
+IPG_CACHE_SCHEMA = """\
+CREATE TABLE IF NOT EXISTS ipg_row (
+    ipg             TEXT,
+    row             TEXT
+);
+CREATE INDEX IF NOT EXISTS ipg_row_ipg ON ipg_row (ipg);
+CREATE TABLE IF NOT EXISTS ipg_lookup (
+    accession       TEXT PRIMARY KEY,
+    ipg             TEXT,
+    fetched         REAL
+);
+CREATE INDEX IF NOT EXISTS ipg_lookup_ipg ON ipg_lookup (ipg);\
+"""
+
+IPG_CACHE_LOOKUP = """\
+SELECT
+    accession,
+    ipg
+FROM
+    ipg_lookup
+WHERE
+    accession IN ({})
+    AND fetched >= ?\
+"""
+
+IPG_CACHE_ROWS = """\
+SELECT
+    row
+FROM
+    ipg_row
+WHERE
+    ipg IN ({})
+ORDER BY
+    ipg,
+    rowid\
+"""
+
+IPG_CACHE_INSERT_ROW = "INSERT INTO ipg_row (ipg, row) VALUES (?, ?)"
+
+IPG_CACHE_DELETE_ROWS = "DELETE FROM ipg_row WHERE ipg = ?"
+
+IPG_CACHE_INSERT_LOOKUP = """\
+INSERT OR REPLACE INTO ipg_lookup (
+    accession,
+    ipg,
+    fetched
+)
+VALUES
+    (?, ?, ?)\
+"""
+
+IPG_CACHE_PRUNE_LOOKUP = "DELETE FROM ipg_lookup WHERE fetched < ?"
+
+IPG_CACHE_PRUNE_ROWS = """\
+DELETE FROM
+    ipg_row
+WHERE
+    ipg NOT IN (SELECT ipg FROM ipg_lookup WHERE ipg IS NOT NULL)\
+"""
+
+SESSION_SCHEMA = """\
+CREATE TABLE meta (
+    key             TEXT PRIMARY KEY,
+    value           TEXT
+);
+CREATE TABLE organism (
+    id              INTEGER PRIMARY KEY,
+    name            TEXT,
+    strain          TEXT
+);
+CREATE TABLE scaffold (
+    id              INTEGER PRIMARY KEY,
+    organism_id     INTEGER,
+    accession       TEXT
+);
+CREATE TABLE subject (
+    id              INTEGER PRIMARY KEY,
+    scaffold_id     INTEGER,
+    position        INTEGER,
+    name            TEXT,
+    ipg             TEXT,
+    start_pos       INTEGER,
+    end_pos         INTEGER,
+    strand          TEXT,
+    ordinal         INTEGER
+);
+CREATE TABLE hit (
+    id              INTEGER PRIMARY KEY,
+    subject_id      INTEGER,
+    query           TEXT,
+    identity        REAL,
+    coverage        REAL,
+    evalue          REAL,
+    bitscore        REAL
+);
+CREATE TABLE cluster (
+    id              INTEGER PRIMARY KEY,
+    scaffold_id     INTEGER,
+    position        INTEGER,
+    score           REAL,
+    start_pos       INTEGER,
+    end_pos         INTEGER,
+    genes           TEXT
+);
+CREATE TABLE cluster_subject (
+    cluster_id      INTEGER,
+    subject_id      INTEGER,
+    position        INTEGER
+);\
+"""
+
+# Created after a session is written, since inserting into indexed tables is slower
+SESSION_INDEXES = """\
+CREATE INDEX organism_name ON organism (name);
+CREATE INDEX scaffold_organism ON scaffold (organism_id);
+CREATE INDEX subject_scaffold ON subject (scaffold_id, position);
+CREATE INDEX hit_subject ON hit (subject_id);
+CREATE INDEX hit_query ON hit (query, subject_id);
+CREATE INDEX cluster_scaffold ON cluster (scaffold_id, position);
+CREATE INDEX cluster_subject_cluster ON cluster_subject (cluster_id, position);
+CREATE INDEX cluster_subject_subject ON cluster_subject (subject_id);\
+"""
+
+SESSION_INSERT_META = "INSERT INTO meta (key, value) VALUES (?, ?)"
+
+SESSION_INSERT_ORGANISM = "INSERT INTO organism (name, strain) VALUES (?, ?)"
+
+SESSION_INSERT_SCAFFOLD = """\
+INSERT INTO scaffold (organism_id, accession) VALUES (?, ?)\
+"""
+
+SESSION_INSERT_SUBJECT = """\
+INSERT INTO subject (
+    scaffold_id,
+    position,
+    name,
+    ipg,
+    start_pos,
+    end_pos,
+    strand,
+    ordinal
+)
+VALUES
+    (?, ?, ?, ?, ?, ?, ?, ?)\
+"""
+
+SESSION_INSERT_HIT = """\
+INSERT INTO hit (
+    subject_id,
+    query,
+    identity,
+    coverage,
+    evalue,
+    bitscore
+)
+VALUES
+    (?, ?, ?, ?, ?, ?)\
+"""
+
+SESSION_INSERT_CLUSTER = """\
+INSERT INTO cluster (
+    scaffold_id,
+    position,
+    score,
+    start_pos,
+    end_pos,
+    genes
 )
 VALUES
-    (?, ?, ?, ?, ?, ?, ?)\
+    (?, ?, ?, ?, ?, ?)\
+"""
+
+SESSION_INSERT_CLUSTER_SUBJECT = "INSERT INTO cluster_subject VALUES (?, ?, ?)"
+
+SESSION_META = "SELECT key, value FROM meta"
+
+SESSION_COUNTS = """\
+SELECT
+    (SELECT COUNT(*) FROM organism),
+    (SELECT COUNT(*) FROM scaffold),
+    (SELECT COUNT(*) FROM subject),
+    (SELECT COUNT(*) FROM hit),
+    (SELECT COUNT(*) FROM cluster)\
+"""
+
+# Organisms are filtered using a matches() function registered on the connection
+SESSION_ORGANISMS = """\
+SELECT
+    id,
+    name,
+    strain
+FROM
+    organism
+{where}
+ORDER BY
+    id\
+"""
+
+SESSION_SCAFFOLDS = """\
+SELECT
+    id,
+    accession
+FROM
+    scaffold
+WHERE
+    organism_id = ?
+ORDER BY
+    id\
+"""
+
+# Subject, hit and cluster queries below are restricted to one organism, and then by
+# any additional conditions in {where}
+SESSION_SUBJECTS = """\
+SELECT
+    subject.id,
+    subject.scaffold_id,
+    subject.position,
+    subject.name,
+    subject.ipg,
+    subject.start_pos,
+    subject.end_pos,
+    subject.strand,
+    subject.ordinal
+FROM
+    subject
+    JOIN scaffold ON scaffold.id = subject.scaffold_id
+WHERE
+    scaffold.organism_id = ?{where}
+ORDER BY
+    subject.scaffold_id,
+    subject.position\
+"""
+
+SESSION_HITS = """\
+SELECT
+    hit.subject_id,
+    hit.query,
+    hit.identity,
+    hit.coverage,
+    hit.evalue,
+    hit.bitscore
+FROM
+    hit
+    JOIN subject ON subject.id = hit.subject_id
+    JOIN scaffold ON scaffold.id = subject.scaffold_id
+WHERE
+    scaffold.organism_id = ?{where}
+ORDER BY
+    hit.id\
+"""
+
+SESSION_CLUSTERS = """\
+SELECT
+    cluster.id,
+    cluster.scaffold_id,
+    cluster.score,
+    cluster.start_pos,
+    cluster.end_pos,
+    cluster.genes,
+    cluster_subject.subject_id
+FROM
+    cluster
+    JOIN scaffold ON scaffold.id = cluster.scaffold_id
+    JOIN cluster_subject ON cluster_subject.cluster_id = cluster.id
+WHERE
+    scaffold.organism_id = ?{where}
+ORDER BY
+    cluster.scaffold_id,
+    cluster.position,
+    cluster_subject.position\
+"""
+
+# Clusters containing hits to every query in ({}), the total of which is the last
+# parameter
+SESSION_REQUIRED_CLUSTERS = """\
+SELECT
+    cluster_subject.cluster_id
+FROM
+    cluster_subject
+    JOIN hit ON hit.subject_id = cluster_subject.subject_id
+WHERE
+    hit.query IN ({})
+GROUP BY
+    cluster_subject.cluster_id
+HAVING
+    COUNT(DISTINCT hit.query) = ?\
 """
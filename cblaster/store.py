@@ -0,0 +1,462 @@
+"""
+This module handles cblaster sessions stored in SQLite3 databases.
+
+Organisms, scaffolds, subjects, hits and clusters are each stored in an indexed table,
+such that questions like "which clusters in Aspergillus have hits to queries A and B"
+can be answered without loading an entire session into memory:
+
+>>> store = SessionStore("session.sqlite3")
+>>> matches = store.where(organisms=["Aspergillus.*"], require=["A", "B"])
+>>> for organism in matches.organisms:
+...     print(organism.full_name, len(organism.clusters))
+
+SessionStore objects can be used in place of a Session wherever a task only reads
+`queries`, `sequences`, `params` and iterates `organisms` once (e.g. extract, gne and
+plot).
+"""
+
+import json
+import logging
+import re
+import sqlite3
+
+from collections import defaultdict
+from contextlib import closing
+from pathlib import Path
+
+from cblaster.classes import Cluster, Hit, Organism, Scaffold, Session, Subject
+from cblaster.sql import (
+    SESSION_CLUSTERS,
+    SESSION_COUNTS,
+    SESSION_HITS,
+    SESSION_INDEXES,
+    SESSION_INSERT_CLUSTER,
+    SESSION_INSERT_CLUSTER_SUBJECT,
+    SESSION_INSERT_HIT,
+    SESSION_INSERT_META,
+    SESSION_INSERT_ORGANISM,
+    SESSION_INSERT_SCAFFOLD,
+    SESSION_INSERT_SUBJECT,
+    SESSION_META,
+    SESSION_ORGANISMS,
+    SESSION_REQUIRED_CLUSTERS,
+    SESSION_SCAFFOLDS,
+    SESSION_SCHEMA,
+    SESSION_SUBJECTS,
+)
+
+
+LOG = logging.getLogger(__name__)
+
+STORE_VERSION = 1
+
+# Session files with these suffixes are written as SQLite3 databases
+SUFFIXES = (".sqlite3", ".sqlite", ".db")
+
+
+def is_store(file):
+    """Checks if a session file is a SQLite3 database."""
+    with open(file, "rb") as fp:
+        return fp.read(16) == b"SQLite format 3\x00"
+
+
+def save(session, path):
+    """Writes a Session to a new SQLite3 database, replacing any existing file.
+
+    Organisms are written one at a time, so `session.organisms` can be any iterable.
+
+    Args:
+        session (Session): cblaster Session object.
+        path (str): Path to SQLite3 database.
+    """
+    path = Path(path)
+    if path.exists():
+        path.unlink()
+    with closing(sqlite3.connect(str(path))) as con, con:
+        cur = con.cursor()
+        cur.executescript(SESSION_SCHEMA)
+        cur.executemany(
+            SESSION_INSERT_META,
+            [
+                ("version", json.dumps(STORE_VERSION)),
+                ("queries", json.dumps(session.queries)),
+                ("sequences", json.dumps(session.sequences)),
+                ("params", json.dumps(session.params)),
+            ],
+        )
+        for organism in session.organisms:
+            cur.execute(SESSION_INSERT_ORGANISM, (organism.name, organism.strain))
+            organism_id = cur.lastrowid
+            for scaffold in organism.scaffolds.values():
+                cur.execute(SESSION_INSERT_SCAFFOLD, (organism_id, scaffold.accession))
+                scaffold_id = cur.lastrowid
+                subject_ids = []
+                for position, subject in enumerate(scaffold.subjects):
+                    cur.execute(
+                        SESSION_INSERT_SUBJECT,
+                        (
+                            scaffold_id,
+                            position,
+                            subject.name,
+                            subject.ipg,
+                            subject.start,
+                            subject.end,
+                            subject.strand,
+                            subject.ordinal,
+                        ),
+                    )
+                    subject_ids.append(cur.lastrowid)
+                    cur.executemany(
+                        SESSION_INSERT_HIT,
+                        [
+                            (
+                                cur.lastrowid,
+                                hit.query,
+                                hit.identity,
+                                hit.coverage,
+                                hit.evalue,
+                                hit.bitscore,
+                            )
+                            for hit in subject.hits
+                        ],
+                    )
+                for position, cluster in enumerate(scaffold.clusters):
+                    cur.execute(
+                        SESSION_INSERT_CLUSTER,
+                        (
+                            scaffold_id,
+                            position,
+                            cluster.score,
+                            cluster.start,
+                            cluster.end,
+                            json.dumps(cluster.genes) if cluster.genes else None,
+                        ),
+                    )
+                    cur.executemany(
+                        SESSION_INSERT_CLUSTER_SUBJECT,
+                        [
+                            (cur.lastrowid, subject_ids[index], order)
+                            for order, index in enumerate(cluster.indices)
+                        ],
+                    )
+        cur.executescript(SESSION_INDEXES)
+
+
+def marks(values):
+    return ", ".join("?" for _ in values)
+
+
+def where_clause(conditions):
+    """Joins (SQL, parameters) conditions onto a WHERE clause using AND."""
+    sql = "".join(f"\n    AND {condition}" for condition, _ in conditions)
+    params = [param for _, values in conditions for param in values]
+    return sql, params
+
+
+class SessionStore:
+    """Read-only Session facade over a session stored in a SQLite3 database.
+
+    Search queries, sequences and parameters are read once when first accessed,
+    whereas Organisms are queried from the database every time `organisms` is iterated,
+    one at a time. Filters set using where() are applied in the database, so only
+    matching rows are loaded.
+
+    Attributes:
+        path (str): Path to SQLite3 database.
+        filters (dict): Keyword arguments passed to iter_organisms() when iterating
+            `organisms`.
+    """
+
+    def __init__(self, path, **filters):
+        self.path = str(path)
+        self.filters = filters
+        self._meta = None
+
+    @property
+    def meta(self):
+        if self._meta is None:
+            with closing(sqlite3.connect(self.path)) as con:
+                self._meta = {
+                    key: json.loads(value) for key, value in con.execute(SESSION_META)
+                }
+            if self._meta.get("version", 0) > STORE_VERSION:
+                raise ValueError(
+                    f"Session database version {self._meta['version']} is not supported"
+                    f" by this version of cblaster (max. {STORE_VERSION})"
+                )
+        return self._meta
+
+    @property
+    def queries(self):
+        return self.meta.get("queries") or []
+
+    @property
+    def sequences(self):
+        return self.meta.get("sequences") or {}
+
+    @property
+    def params(self):
+        return self.meta.get("params") or {}
+
+    @property
+    def organisms(self):
+        return self.iter_organisms(**self.filters)
+
+    def where(self, **filters):
+        """Returns a new SessionStore with additional filters (see iter_organisms())."""
+        store = SessionStore(self.path, **{**self.filters, **filters})
+        store._meta = self._meta
+        return store
+
+    def counts(self):
+        """Counts every object stored in the session, ignoring any filters."""
+        with closing(sqlite3.connect(self.path)) as con:
+            organisms, scaffolds, subjects, hits, clusters = con.execute(
+                SESSION_COUNTS
+            ).fetchone()
+        return {
+            "queries": len(self.queries),
+            "hits": hits,
+            "subjects": subjects,
+            "clusters": clusters,
+            "scaffolds": scaffolds,
+            "organisms": organisms,
+        }
+
+    def keys(self):
+        """Gets the name and strain of every stored Organism (see Organism.key)."""
+        with closing(sqlite3.connect(self.path)) as con:
+            return [
+                (name, strain)
+                for _, name, strain in con.execute(SESSION_ORGANISMS.format(where=""))
+            ]
+
+    def to_session(self):
+        """Loads the (filtered) session into a Session object."""
+        return Session(
+            queries=self.queries,
+            sequences=self.sequences,
+            params=self.params,
+            organisms=list(self.organisms),
+        )
+
+    def iter_organisms(
+        self,
+        organisms=None,
+        scaffolds=None,
+        queries=None,
+        in_cluster=False,
+        require=None,
+        clusters=True,
+        min_identity=None,
+        min_coverage=None,
+        max_evalue=None,
+    ):
+        """Yields Organism objects from the database matching the given filters.
+
+        If any of `scaffolds`, `queries`, `in_cluster` or `require` are given, only
+        matching Subjects are loaded, and Scaffolds and Organisms without any are
+        skipped. Clusters are only loaded if every one of their Subjects was, and
+        their indices refer to the loaded Subjects.
+
+        Args:
+            organisms (list): Regular expressions matching organism names.
+            scaffolds (list): Scaffold accessions.
+            queries (list): Only load Subjects with hits to any of these queries.
+            in_cluster (bool): Only load Subjects in clusters.
+            require (list): Only load clusters with hits to all of these queries,
+                and Subjects in them.
+            clusters (bool): Load clusters.
+            min_identity (float): Minimum identity of loaded hits.
+            min_coverage (float): Minimum query coverage of loaded hits.
+            max_evalue (float): Maximum e-value of loaded hits.
+        Yields:
+            Organism objects.
+        """
+        subject_conditions, cluster_conditions = [], []
+        if scaffolds:
+            condition = (f"scaffold.accession IN ({marks(scaffolds)})", scaffolds)
+            subject_conditions.append(condition)
+            cluster_conditions.append(condition)
+        if queries:
+            subject_conditions.append(
+                (
+                    "subject.id IN (SELECT subject_id FROM hit"
+                    f" WHERE query IN ({marks(queries)}))",
+                    queries,
+                )
+            )
+        if require:
+            require = list(dict.fromkeys(require))
+            required = SESSION_REQUIRED_CLUSTERS.format(marks(require))
+            subject_conditions.append(
+                (
+                    "subject.id IN (SELECT subject_id FROM cluster_subject"
+                    f" WHERE cluster_id IN ({required}))",
+                    [*require, len(require)],
+                )
+            )
+            cluster_conditions.append(
+                (f"cluster.id IN ({required})", [*require, len(require)])
+            )
+        elif in_cluster:
+            subject_conditions.append(
+                ("subject.id IN (SELECT subject_id FROM cluster_subject)", [])
+            )
+        hit_conditions = list(subject_conditions)
+        for condition, value in [
+            ("hit.identity > ?", min_identity),
+            ("hit.coverage > ?", min_coverage),
+            ("hit.evalue < ?", max_evalue),
+        ]:
+            if value is not None:
+                hit_conditions.append((condition, [value]))
+        filtered = bool(subject_conditions)
+
+        subject_where, subject_params = where_clause(subject_conditions)
+        hit_where, hit_params = where_clause(hit_conditions)
+        cluster_where, cluster_params = where_clause(cluster_conditions)
+
+        with closing(sqlite3.connect(self.path)) as con:
+            if organisms:
+                patterns = [re.compile(organism) for organism in organisms]
+                con.create_function(
+                    "matches",
+                    1,
+                    lambda name: name is not None
+                    and any(pattern.match(name) for pattern in patterns),
+                )
+                organism_where = "WHERE\n    matches(name)"
+            else:
+                organism_where = ""
+            cur = con.cursor()
+            rows = cur.execute(
+                SESSION_ORGANISMS.format(where=organism_where)
+            ).fetchall()
+            for organism_id, name, strain in rows:
+                scaffold_objects = {
+                    scaffold_id: Scaffold(accession)
+                    for scaffold_id, accession in cur.execute(
+                        SESSION_SCAFFOLDS, (organism_id,)
+                    )
+                }
+
+                subjects = {}
+                for (
+                    subject_id,
+                    scaffold_id,
+                    _,
+                    subject_name,
+                    ipg,
+                    start,
+                    end,
+                    strand,
+                    ordinal,
+                ) in cur.execute(
+                    SESSION_SUBJECTS.format(where=subject_where),
+                    (organism_id, *subject_params),
+                ):
+                    subject = Subject(
+                        name=subject_name,
+                        ipg=ipg,
+                        start=start,
+                        end=end,
+                        strand=strand,
+                        ordinal=ordinal,
+                    )
+                    subjects[subject_id] = subject
+                    scaffold_objects[scaffold_id].subjects.append(subject)
+
+                # Hits in the same IPG are shared, as in Subject.from_dict()
+                records = {}
+                for subject_id, *values in cur.execute(
+                    SESSION_HITS.format(where=hit_where),
+                    (organism_id, *hit_params),
+                ):
+                    subject = subjects[subject_id]
+                    key = (subject.ipg, *values)
+                    if subject.ipg and key in records:
+                        hit = records[key]
+                    else:
+                        hit = Hit(values[0], subject.name, *values[1:])
+                        if subject.ipg:
+                            records[key] = hit
+                    subject.hits.append(hit)
+
+                if clusters:
+                    self._load_clusters(
+                        cur,
+                        SESSION_CLUSTERS.format(where=cluster_where),
+                        (organism_id, *cluster_params),
+                        scaffold_objects,
+                        subjects,
+                    )
+
+                if filtered:
+                    scaffold_objects = {
+                        key: scaffold
+                        for key, scaffold in scaffold_objects.items()
+                        if scaffold.subjects
+                    }
+                    if not scaffold_objects:
+                        continue
+                yield Organism(
+                    name,
+                    strain,
+                    scaffolds={
+                        scaffold.accession: scaffold
+                        for scaffold in scaffold_objects.values()
+                    },
+                )
+
+    @staticmethod
+    def _load_clusters(cur, query, params, scaffolds, subjects):
+        """Adds clusters to Scaffolds if all of their Subjects have been loaded."""
+        rows = defaultdict(list)
+        for cluster_id, scaffold_id, *values, subject_id in cur.execute(query, params):
+            rows[cluster_id, scaffold_id, *values].append(subject_id)
+        positions = {
+            id(subject): index
+            for scaffold in scaffolds.values()
+            for index, subject in enumerate(scaffold.subjects)
+        }
+        for (_, scaffold_id, score, start, end, genes), ids in rows.items():
+            if not all(subject_id in subjects for subject_id in ids):
+                continue
+            cluster_subjects = [subjects[subject_id] for subject_id in ids]
+            scaffolds[scaffold_id].clusters.append(
+                Cluster(
+                    indices=[positions[id(subject)] for subject in cluster_subjects],
+                    subjects=cluster_subjects,
+                    score=score,
+                    start=start,
+                    end=end,
+                    genes=json.loads(genes) if genes else None,
+                )
+            )
+
+
+def open_session(path):
+    """Opens a session file, as a SessionStore if it is a SQLite3 database."""
+    if is_store(path):
+        return SessionStore(path)
+    return Session.from_file(path)
+
+
+def load_session(path):
+    """Loads a session file of any format into a Session object."""
+    if is_store(path):
+        return SessionStore(path).to_session()
+    return Session.from_file(path)
+
+
+def save_session(session, path, indent=None):
+    """Writes a Session to file, choosing its format from the file suffix.
+
+    Files ending in any of SUFFIXES are written as SQLite3 databases, and any other
+    file using Session.to_file().
+    """
+    if str(path).endswith(SUFFIXES):
+        save(session, path)
+    else:
+        session.to_file(path, indent=indent)
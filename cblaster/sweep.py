@@ -0,0 +1,210 @@
+"""
+Sweep clustering thresholds over a cblaster session.
+
+This module evaluates every combination of gap, unique, min_hits, min_identity and
+min_coverage values on a single loaded session, without modifying it.
+
+Subjects are flattened once using context.layout_subjects(), and their hits stored in
+flat NumPy arrays, such that hits can be filtered for each identity/coverage
+combination with a handful of vectorised comparisons. Each combination is then
+handed to a worker process, which sweeps all gap values in one pass for every
+unique/min_hits combination (see context.sweep_gaps()).
+"""
+
+
+import itertools
+import logging
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from cblaster import context
+
+
+LOG = logging.getLogger(__name__)
+
+PARAMETERS = ["gap", "unique", "min_hits", "min_identity", "min_coverage"]
+
+# Shared state of worker processes; see _initialise()
+_STATE = {}
+
+
+def hit_arrays(subjects):
+    """Stores the hits of a list of Subjects in flat NumPy arrays.
+
+    Args:
+        subjects (list): Subject objects.
+    Returns:
+        List of query sequence names, and a dictionary of arrays containing the
+        position of the Subject each hit belongs to, the index of its query sequence in
+        the list, and its identity, coverage and e-value.
+    """
+    queries, indices = [], {}
+    columns = ([], [], [], [], [])
+    for position, subject in enumerate(subjects):
+        for hit in subject.all_hits:
+            if hit.query not in indices:
+                indices[hit.query] = len(queries)
+                queries.append(hit.query)
+            for column, value in zip(
+                columns,
+                (position, indices[hit.query], hit.identity, hit.coverage, hit.evalue)
+            ):
+                column.append(value)
+    arrays = {
+        key: np.array(column, dtype=dtype)
+        for key, column, dtype in zip(
+            ("position", "query", "identity", "coverage", "evalue"),
+            columns,
+            (np.int64, np.int64, np.float64, np.float64, np.float64),
+        )
+    }
+    return queries, arrays
+
+
+def query_bitmasks(arrays, total, min_identity=30, min_coverage=50, max_evalue=0.01):
+    """Encodes the query sequences hit by each Subject as an integer bitmask.
+
+    This is the vectorised equivalent of context.query_bitmasks(). Hits without an
+    identity or coverage (i.e. from HMMER) never pass the thresholds.
+
+    Args:
+        arrays (dict): Hit arrays from hit_arrays().
+        total (int): Total number of Subjects.
+        min_identity (float): Minimum hit identity.
+        min_coverage (float): Minimum hit query coverage.
+        max_evalue (float): Maximum hit e-value.
+    Returns:
+        List of bitmasks of queries with hits passing the thresholds.
+    """
+    keep = (
+        (arrays["identity"] > min_identity)
+        & (arrays["coverage"] > min_coverage)
+        & (arrays["evalue"] < max_evalue)
+    )
+    positions = arrays["position"][keep]
+    queries = arrays["query"][keep]
+    if queries.size == 0 or queries.max() < 64:
+        masks = np.zeros(total, dtype=np.uint64)
+        np.bitwise_or.at(
+            masks, positions, np.left_shift(np.uint64(1), queries.astype(np.uint64))
+        )
+        return [int(mask) for mask in masks.tolist()]
+    masks = [0] * total
+    for position, query in zip(positions.tolist(), queries.tolist()):
+        masks[position] |= 1 << query
+    return masks
+
+
+def _initialise(layout, arrays, require):
+    """Stores sweep data in the global state of a worker process."""
+    _STATE.update(layout=layout, arrays=arrays, require=require)
+
+
+def _sweep_thresholds(min_identity, min_coverage, pairs, gaps, max_evalue):
+    """Sweeps gap values for each unique/min_hits pair at one identity/coverage."""
+    layout = _STATE["layout"]
+    queries = query_bitmasks(
+        _STATE["arrays"],
+        len(layout.starts),
+        min_identity=min_identity,
+        min_coverage=min_coverage,
+        max_evalue=max_evalue,
+    )
+    results = []
+    for unique, min_hits in pairs:
+        computed = context.sweep_gaps(
+            layout,
+            queries,
+            gaps,
+            unique=unique,
+            min_hits=min_hits,
+            require=_STATE["require"],
+        )
+        for gap in gaps:
+            clusters, means, medians = computed[gap]
+            results.append({
+                "gap": gap,
+                "unique": unique,
+                "min_hits": min_hits,
+                "min_identity": min_identity,
+                "min_coverage": min_coverage,
+                "clusters": clusters,
+                "means": means,
+                "medians": medians,
+            })
+    return results
+
+
+def sweep(
+    session,
+    gaps,
+    unique=(3,),
+    min_hits=(3,),
+    min_identity=(30,),
+    min_coverage=(50,),
+    max_evalue=0.01,
+    require=None,
+    cpus=None,
+):
+    """Computes cluster statistics for every combination of clustering thresholds.
+
+    Args:
+        session (Session): cblaster Session object.
+        gaps (list): Gap values.
+        unique (list): Unique query sequence thresholds.
+        min_hits (list): Minimum number of hits thresholds.
+        min_identity (list): Minimum hit identity thresholds.
+        min_coverage (list): Minimum hit query coverage thresholds.
+        max_evalue (float): Maximum hit e-value.
+        require (list): Names of query sequences that must be represented in a cluster.
+        cpus (int): Total worker processes to use. If 1, runs in this process.
+    Returns:
+        List of dictionaries containing the thresholds of each combination, and the
+        total number, mean and median size of clusters found using them.
+    """
+    subjects, layout = context.layout_subjects(session.organisms)
+    queries, arrays = hit_arrays(subjects)
+
+    # Any required query without hits can never be satisfied, so is given a new bit
+    indices = {query: index for index, query in enumerate(queries)}
+    required = 0
+    for query in require or []:
+        required |= 1 << indices.setdefault(query, len(indices))
+
+    gaps = sorted(set(gaps))
+    pairs = list(itertools.product(sorted(set(unique)), sorted(set(min_hits))))
+    thresholds = list(
+        itertools.product(sorted(set(min_identity)), sorted(set(min_coverage)))
+    )
+    LOG.info(
+        "Sweeping %i threshold combinations over %i subjects",
+        len(gaps) * len(pairs) * len(thresholds),
+        len(subjects),
+    )
+
+    if cpus == 1:
+        _initialise(layout, arrays, required)
+        batches = [
+            _sweep_thresholds(identity, coverage, pairs, gaps, max_evalue)
+            for identity, coverage in thresholds
+        ]
+        _STATE.clear()
+    else:
+        with ProcessPoolExecutor(
+            max_workers=cpus,
+            initializer=_initialise,
+            initargs=(layout, arrays, required),
+        ) as executor:
+            futures = [
+                executor.submit(
+                    _sweep_thresholds, identity, coverage, pairs, gaps, max_evalue
+                )
+                for identity, coverage in thresholds
+            ]
+            batches = [future.result() for future in futures]
+
+    results = [result for batch in batches for result in batch]
+    results.sort(key=lambda result: [result[key] for key in PARAMETERS])
+    return results
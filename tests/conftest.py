@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+
+"""
+Shared fixtures for the cblaster test suite
+"""
+
+import random
+
+import pytest
+
+from cblaster import classes
+
+
+def subject_dict(name, start, queries, ipg=None):
+    """Builds a serialised Subject spanning 100bp from `start`.
+
+    Args:
+        queries (list): Names of queries hit by the subject, or (query, identity)
+            tuples.
+    """
+    hits = []
+    for query in queries:
+        query, identity = query if isinstance(query, tuple) else (query, 70.9)
+        hits.append(
+            {
+                "query": query,
+                "subject": name,
+                "identity": identity,
+                "coverage": 54.6,
+                "evalue": 0.0,
+                "bitscore": 500.3,
+            }
+        )
+    return {
+        "hits": hits,
+        "name": name,
+        "ipg": ipg,
+        "start": start,
+        "end": start + 100,
+        "strand": "+",
+    }
+
+
+def session_from_tuples(organisms, queries=("A", "B", "C"), **fields):
+    """Builds a Session from nested tuples.
+
+    Args:
+        organisms (list): (name, strain, scaffolds) tuples, where scaffolds are
+            (accession, subjects, clusters) tuples. Subjects are subject_dict()
+            arguments, and clusters are (indices, score, start, end) tuples.
+        queries (list): Names of query sequences.
+        fields: Other Session fields, e.g. sequences or params.
+    """
+    return classes.Session.from_dict(
+        {
+            "queries": list(queries),
+            **fields,
+            "organisms": [
+                {
+                    "name": name,
+                    "strain": strain,
+                    "scaffolds": [
+                        {
+                            "accession": accession,
+                            "subjects": [subject_dict(*s) for s in subjects],
+                            "clusters": [
+                                dict(zip(("indices", "score", "start", "end"), c))
+                                for c in clusters
+                            ],
+                        }
+                        for accession, subjects, clusters in scaffolds
+                    ],
+                }
+                for name, strain, scaffolds in organisms
+            ],
+        }
+    )
+
+
+def random_session_from_seed(seed, organisms=4, scaffolds=4, subjects=12):
+    """Builds an unclustered Session of random hits to queries q1 to q4."""
+    rng = random.Random(seed)
+    session = classes.Session(queries=["q1", "q2", "q3", "q4"])
+    for o in range(organisms):
+        organism = classes.Organism(f"organism_{o}", "strain")
+        for s in range(scaffolds):
+            subject_list = []
+            for i in range(rng.randint(0, subjects)):
+                start = rng.randint(0, 100000)
+                hits = [
+                    classes.Hit(
+                        query=rng.choice(session.queries),
+                        subject=f"subject_{i}",
+                        identity=rng.uniform(0, 100),
+                        coverage=rng.uniform(0, 100),
+                        evalue=rng.choice([0.0, 0.001, 0.1]),
+                        bitscore=100,
+                    )
+                    for _ in range(rng.randint(1, 3))
+                ]
+                # Cluster scoring needs at least one hit left after filtering
+                hits[0].identity = hits[0].coverage = 90
+                hits[0].evalue = 0
+                subject_list.append(
+                    classes.Subject(
+                        hits=hits,
+                        ipg=rng.choice([None, "1", "2"]),
+                        name=f"subject_{i}",
+                        start=start,
+                        end=start + rng.randint(100, 5000),
+                    )
+                )
+            organism.scaffolds[f"scaffold_{s}"] = classes.Scaffold(
+                f"scaffold_{s}", subjects=subject_list
+            )
+        session.organisms.append(organism)
+    return session
+
+
+@pytest.fixture(scope="session")
+def make_session():
+    """Factory of Sessions built from nested tuples (see session_from_tuples())."""
+    return session_from_tuples
+
+
+@pytest.fixture(scope="session")
+def random_session():
+    """Factory of random, unclustered Sessions (see random_session_from_seed())."""
+    return random_session_from_seed
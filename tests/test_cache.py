@@ -0,0 +1,67 @@
+"""
+Test suite for cache.py
+"""
+
+import time
+
+from pathlib import Path
+
+import pytest
+
+from cblaster import cache
+
+
+TEST_DIR = Path(__file__).resolve().parent
+
+
+@pytest.fixture()
+def ipg_table():
+    with (TEST_DIR / "ipg_results.txt").open() as fp:
+        return fp.read().split("\n")
+
+
+def test_lookup_empty(tmp_path):
+    rows, missing = cache.lookup(["s1", "s2"], tmp_path / "cache.sqlite3")
+    assert rows == []
+    assert missing == ["s1", "s2"]
+
+
+def test_store_lookup(tmp_path, ipg_table):
+    path = tmp_path / "cache.sqlite3"
+    cache.store(ipg_table, ["s1", "s4", "missing"], path)
+
+    rows, missing = cache.lookup(["s1", "s5", "missing", "new"], path)
+
+    # s5 is in the same IPG as s4, missing was not found but still cached
+    assert missing == ["new"]
+    assert sorted(row.split("\t")[6] for row in rows) == ["s1", "s4", "s5"]
+
+
+def test_lookup_stale(tmp_path, ipg_table, monkeypatch):
+    path = tmp_path / "cache.sqlite3"
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now - 10 * 86400)
+    cache.store(ipg_table, ["s1"], path)
+    monkeypatch.setattr(time, "time", lambda: now)
+
+    assert cache.lookup(["s1"], path, ttl=5)[1] == ["s1"]
+    assert cache.lookup(["s1"], path, ttl=20)[1] == []
+
+
+def test_prune_export(tmp_path, ipg_table, monkeypatch):
+    path = tmp_path / "cache.sqlite3"
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now - 10 * 86400)
+    cache.store(ipg_table[:2], ["s1"], path)
+    monkeypatch.setattr(time, "time", lambda: now)
+    cache.store(ipg_table[2:], ["s2"], path)
+
+    cache.prune(path, ttl=5)
+
+    output = tmp_path / "export.tsv"
+    with output.open("w") as handle:
+        cache.export(path, handle)
+
+    lines = output.read_text().split("\n")
+    assert lines[0] == cache.IPG_HEADER
+    assert [line.split("\t")[0] for line in lines[1:-1]] == ["2", "2", "3", "4", "4"]
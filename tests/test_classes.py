@@ -4,6 +4,9 @@
 Test suite for classes.
 """
 
+import gzip
+import json
+
 import pytest
 
 from cblaster import classes
@@ -167,3 +170,251 @@ def test_organism_summary(organism, org_with_clusters):
     assert org_with_clusters.summary() == (
         "test_organism TEST 123\n======================\n" + SCAFFOLD_SUMMARY
     )
+
+
+def test_slots_no_instance_dict():
+    hit = classes.Hit("q1", "s1", "70.90", "54.60", "0.0", "500.30")
+    subject = classes.Subject(hits=[hit], name="s1", start=1, end=10, strand="+")
+    scaffold = classes.Scaffold("scaffold", subjects=[subject])
+    scaffold.add_clusters([[subject]])
+    organism = classes.Organism("name", "strain", {"scaffold": scaffold})
+    for obj in (hit, subject, scaffold, scaffold.clusters[0], organism):
+        assert not hasattr(obj, "__dict__")
+
+
+def test_hit_copy():
+    hit = classes.Hit("q1", "s1", "70.90", "54.60", "0.0", "500.30")
+    copy = hit.copy(subject="s2")
+    assert copy.subject == "s2"
+    assert copy.to_dict() == {**hit.to_dict(), "subject": "s2"}
+
+
+def test_scaffold_add_clusters_indices():
+    hit = classes.Hit("q1", "s1", "70.90", "54.60", "0.0", "500.30")
+    subjects = [classes.Subject(hits=[hit], start=0, end=100) for _ in range(3)]
+    scaffold = classes.Scaffold("scaffold", subjects=subjects)
+    scaffold.add_clusters([subjects[1:]])
+    assert scaffold.clusters[0].indices == [1, 2]
+
+
+def test_cluster_scorer():
+    def subject(*hits):
+        return classes.Subject(
+            hits=[classes.Hit(q, "s", "90", "90", "0", b) for q, b in hits]
+        )
+
+    subjects = [
+        subject(("q1", 100), ("q3", 50)),
+        subject(("q2", 200)),
+        subject(("q3", 300)),
+        subject(("q9", 400)),
+        subject(("q4", 500)),
+    ]
+    scorer = classes.ClusterScorer(["q1", "q2", "q3", "q4"])
+
+    # q1 -> q2 -> q3 are syntenic; q9 is not a query so breaks the chain to q4
+    assert scorer.score(subjects) == pytest.approx(1500 / 10000 + 5 + 2)
+    assert scorer.score_clusters([subjects[:2], subjects[3:]]) == pytest.approx(
+        [300 / 10000 + 2 + 1, 900 / 10000 + 2]
+    )
+    assert classes.ClusterScorer().score(subjects) == pytest.approx(1500 / 10000 + 5)
+
+    # Best hits are recomputed once a Subject is filtered
+    assert scorer.best_hit(subjects[0]).query == "q1"
+    subjects[0].filter(max_evalue=-1)
+    assert scorer.best_hit(subjects[0]) is None
+
+
+def test_cluster_genes_serialised_when_present():
+    subjects = [classes.Subject(start=0, end=100), classes.Subject(start=200, end=300)]
+    cluster = classes.Cluster([0, 1], subjects, score=1)
+    assert "genes" not in cluster.to_dict()
+    cluster.genes = [["g1", 0, 100, "+"]]
+    assert cluster.to_dict()["genes"] == [["g1", 0, 100, "+"]]
+
+
+def test_subject_ordinal_serialised_when_present():
+    assert "ordinal" not in classes.Subject(name="s1").to_dict()
+    subject = classes.Subject(name="s1", ordinal=0)
+    assert subject.to_dict()["ordinal"] == 0
+    assert classes.Subject.from_dict(subject.to_dict()).ordinal == 0
+
+
+def test_subject_filter():
+    one = classes.Hit("q1", "s1", "70.90", "54.60", "0.0", "500.30")
+    two = classes.Hit("q2", "s1", "30.10", "90.00", "0.1", "100.00")
+    subject = classes.Subject(hits=[one, two], name="s1")
+
+    subject.filter(min_identity=50)
+    assert subject.hits == [one]
+    assert subject.all_hits == [one, two]
+    assert subject.to_dict()["hits"] == [one.to_dict()]
+
+    subject.filter(max_evalue=0.5)
+    assert subject.hits == [one, two]
+
+    subject.filter(min_identity=50, min_coverage=60)
+    assert subject.hits == []
+
+    subject.filter()
+    assert subject.hits == [one, two]
+
+
+def test_interned_queries():
+    one = classes.Hit("".join(["q", "1"]), "s1", "70.90", "54.60", "0.0", "500.30")
+    two = classes.Hit("".join(["q", "1"]), "s2", "70.90", "54.60", "0.0", "500.30")
+    assert one.query is two.query
+
+
+def test_organism_to_dict_roundtrip():
+    d = {
+        "name": "organism",
+        "strain": "strain",
+        "scaffolds": [
+            {
+                "accession": "scaffold",
+                "subjects": [
+                    {
+                        "hits": [
+                            {
+                                "query": "q1",
+                                "subject": "s1",
+                                "identity": 70.9,
+                                "coverage": 54.6,
+                                "evalue": 0.0,
+                                "bitscore": 500.3,
+                            }
+                        ],
+                        "name": "s1",
+                        "ipg": "1",
+                        "start": 1,
+                        "end": 10,
+                        "strand": "+",
+                    }
+                ],
+                "clusters": [{"indices": [0], "score": 1.05, "start": 1, "end": 10}],
+            }
+        ],
+    }
+    assert classes.Organism.from_dict(d).to_dict() == d
+
+
+def test_organism_from_dict_shares_ipg_hits():
+    hit = {
+        "query": "q1",
+        "subject": "s1",
+        "identity": 70.9,
+        "coverage": 54.6,
+        "evalue": 0.0,
+        "bitscore": 500.3,
+    }
+    d = {
+        "name": "organism",
+        "strain": "strain",
+        "scaffolds": [
+            {
+                "accession": accession,
+                "subjects": [
+                    {
+                        "hits": [{**hit, "subject": name}],
+                        "name": name,
+                        "ipg": "1",
+                        "start": 1,
+                        "end": 10,
+                        "strand": "+",
+                    }
+                ],
+                "clusters": [],
+            }
+            for accession, name in [("scaf_1", "s1"), ("scaf_2", "s2")]
+        ],
+    }
+    organism = classes.Organism.from_dict(d)
+    one, two = [s.subjects[0] for s in organism.scaffolds.values()]
+    assert one.hits[0] is two.hits[0]
+    assert organism.to_dict() == d
+
+
+def test_session_compact_roundtrip(tmp_path):
+    hit = {
+        "query": "q1",
+        "subject": "s1",
+        "identity": 70.9,
+        "coverage": 54.6,
+        "evalue": 0.0,
+        "bitscore": 500.3,
+    }
+    organisms = [
+        {
+            "name": name,
+            "strain": "strain",
+            "scaffolds": [
+                {
+                    "accession": "scaf_1",
+                    "subjects": [
+                        {
+                            "hits": [hit, {**hit, "query": "q2", "identity": None}],
+                            "name": "s1",
+                            "ipg": "1",
+                            "start": 1,
+                            "end": 10,
+                            "strand": "+",
+                            "ordinal": 0,
+                        },
+                        {
+                            "hits": [{**hit, "subject": "s2"}],
+                            "name": "s2",
+                            "ipg": "1",
+                            "start": 20,
+                            "end": 30,
+                            "strand": "-",
+                            "ordinal": 1,
+                        },
+                    ],
+                    "clusters": [
+                        {"indices": [0, 1], "score": 1.05, "start": 1, "end": 30}
+                    ],
+                },
+                {"accession": "scaf_2", "subjects": [], "clusters": []},
+            ],
+        }
+        for name in ["org_1", "org_2"]
+    ]
+    session = classes.Session.from_dict(
+        {
+            "queries": ["q1", "q2"],
+            "sequences": {"q1": "MA", "q2": "MB"},
+            "params": {"mode": "local"},
+            "organisms": organisms,
+        }
+    )
+
+    path = tmp_path / "session.jsonl.gz"
+    session.to_file(path)
+    assert classes.is_compact(path)
+
+    loaded = classes.Session.from_file(path)
+    assert loaded.to_dict() == session.to_dict()
+    one, two = loaded.organisms[0].scaffolds["scaf_1"].subjects
+    assert one.hits[0] is two.hits[0]
+
+    names = [o.name for o in classes.Session.iter_organisms(path)]
+    assert names == ["org_1", "org_2"]
+
+    # Converting back to JSON
+    json_path = tmp_path / "session.json"
+    loaded.to_file(json_path)
+    assert not classes.is_compact(json_path)
+    assert classes.Session.from_file(json_path).to_dict() == session.to_dict()
+
+
+def test_session_compact_newer_version(tmp_path):
+    path = tmp_path / "session.jsonl.gz"
+    classes.Session().to_file(path)
+    with gzip.open(path, "rt") as fp:
+        header = json.loads(fp.readline())
+    header["version"] = classes.COMPACT_VERSION + 1
+    with gzip.open(path, "wt") as fp:
+        json.dump(header, fp)
+    with pytest.raises(ValueError):
+        classes.Session.from_file(path)
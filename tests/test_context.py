@@ -4,6 +4,8 @@
 Test suite for context.py
 """
 
+import copy
+
 import pytest
 
 from pathlib import Path
@@ -11,7 +13,7 @@ from pathlib import Path
 import requests
 import requests_mock
 
-from cblaster import classes, context
+from cblaster import classes, context, store
 
 
 TEST_DIR = Path(__file__).resolve().parent
@@ -171,3 +173,324 @@ def test_parse_IP_groups(ipg_table):
 def test_find_IPG_hits(groups, hits, hit_dict, group, length):
     x = context.find_IPG_hits(groups[group], hit_dict)
     assert len(x) == length, "Hit group length mismatch"
+
+
+def test_parse_IPG_table_shares_hits(hits):
+    with open(TEST_DIR / "ipg_results.txt") as handle:
+        one, two = context.parse_IPG_table(handle, hits)
+
+    subA = one.scaffolds["scaffold_2"].subjects[1]
+    subB = two.scaffolds["scaffold_7"].subjects[0]
+
+    # Same Hit objects in each member of IPG 4, subject name stored on Subject
+    assert all(a is b for a, b in zip(subA.hits, subB.hits))
+    assert (subA.name, subB.name) == ("s5", "s4")
+    assert [h["subject"] for h in subA.to_dict()["hits"]] == ["s5"] * 3
+    assert [h["subject"] for h in subB.to_dict()["hits"]] == ["s4"] * 3
+
+
+def test_efetch_IPGs_deduplicates(hits):
+    with requests_mock.Mocker() as mock:
+        mock.post("https://eutils.ncbi.nlm.nih.gov/entrez/eutils/efetch.fcgi?")
+        context.efetch_IPGs([hit.subject for hit in hits], api_key="key")
+        assert mock.call_count == 1
+        request = mock.request_history[0]
+        assert request.qs["api_key"] == ["key"]
+        assert request.text == "id=s1%2Cs2%2Cs3%2Cs4%2Cs5"
+
+
+def test_efetch_IPGs_chunks():
+    ids = [f"s{i}" for i in range(25000)]
+    with requests_mock.Mocker() as mock:
+        mock.post(
+            "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/efetch.fcgi?",
+            text="row\n",
+        )
+        rows = context.efetch_IPGs(ids, max_workers=2)
+        assert mock.call_count == 3
+        assert rows == ["row", "row", "row", ""]
+
+
+def test_iter_IP_groups(ipg_table):
+    groups = list(context.iter_IP_groups(ipg_table))
+    assert [ipg for ipg, _ in groups] == ["1", "2", "3", "4"]
+    assert [len(group) for _, group in groups] == [1, 2, 1, 2]
+
+
+def test_stream_IPGs(hits, tmp_path):
+    table = (TEST_DIR / "ipg_results.txt").read_text()
+    with requests_mock.Mocker() as mock:
+        mock.post(
+            "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/efetch.fcgi?", text=table
+        )
+        output = tmp_path / "ipgs.tsv"
+        with output.open("w") as handle:
+            rows = context.stream_IPGs(
+                [hit.subject for hit in hits], output_handle=handle
+            )
+            assert mock.call_count == 0, "Nothing fetched until consumed"
+            organisms = context.parse_IPG_table(rows, hits)
+        assert output.read_text() == table
+    assert [o.full_name for o in organisms] == [
+        "Test organism STRAIN 1",
+        "Test organism STRAIN 2",
+    ]
+
+
+def test_parse_IPG_table_split_group(hits, ipg_table):
+    # Rows of IPG 4 are separated by IPG 3, e.g. if returned in separate chunks
+    rows = [*ipg_table[:4], ipg_table[5], ipg_table[4], ipg_table[6]]
+    one, two = context.parse_IPG_table(rows, hits)
+    assert len(one.scaffolds["scaffold_2"].subjects) == 2
+    s5 = one.scaffolds["scaffold_2"].subjects[1]
+    (s4,) = two.scaffolds["scaffold_7"].subjects
+
+    # Members of both occurrences of the IPG get every hit
+    assert (s4.name, s5.name) == ("s4", "s5")
+    for subject in (s4, s5):
+        assert sorted(hit.query for hit in subject.hits) == ["q4", "q5", "q6"]
+
+
+def test_deduplicate():
+    def make_scaffold(accession, *ipg_lists):
+        subjects, clusters = [], []
+        for ipgs in ipg_lists:
+            cluster = [
+                classes.Subject(ipg=ipg, start=i * 10, end=i * 10 + 5)
+                for i, ipg in enumerate(ipgs)
+            ]
+            subjects.extend(cluster)
+            clusters.append(classes.Cluster(subjects=cluster, score=1))
+        return classes.Scaffold(accession, subjects=subjects, clusters=clusters)
+
+    organism = classes.Organism("name", "strain")
+    for scaffold in [
+        make_scaffold("A", ["1", "2"], ["3", "4"], ["3", "4"]),
+        make_scaffold("B", ["1", "2"], ["5", "6"], [None, "7"]),
+        make_scaffold("C", ["5", "6"], ["3", "4", "8"], [None, "7"], ["9", "9"]),
+        make_scaffold("D", ["9", "9"]),
+    ]:
+        organism.scaffolds[scaffold.accession] = scaffold
+
+    context.deduplicate(organism)
+
+    assert {
+        accession: [[s.ipg for s in c] for c in scaffold.clusters]
+        for accession, scaffold in organism.scaffolds.items()
+    } == {
+        "A": [["1", "2"], ["3", "4"], ["3", "4"]],
+        "B": [["5", "6"], [None, "7"]],
+        "C": [["3", "4", "8"], [None, "7"], ["9", "9"]],
+        "D": [],
+    }
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("scale", ["linear", "log"])
+def test_estimate_neighbourhood(seed, scale, random_session):
+    session = random_session(seed)
+    original = copy.deepcopy(session.to_dict())
+    results = context.estimate_neighbourhood(
+        session, max_gap=30000, samples=20, scale=scale, unique=2, min_hits=2
+    )
+
+    # Session should not be modified
+    assert session.to_dict() == original
+
+    # Should match filtering the session for each gap value individually
+    for result in results:
+        expected = copy.deepcopy(session)
+        context.filter_session(expected, gap=result["gap"], unique=2, min_hits=2)
+        clusters, means, medians = context.calculate_gne(expected)
+        assert result == {
+            "gap": result["gap"],
+            "means": means,
+            "medians": medians,
+            "clusters": clusters,
+        }
+
+
+def session_clusters(session):
+    return [
+        [[subject.name for subject in cluster] for cluster in scaffold.clusters]
+        for organism in session.organisms
+        for scaffold in organism.scaffolds.values()
+    ]
+
+
+def test_filter_session_non_destructive(random_session):
+    session = random_session(3)
+    hits = [
+        list(subject.hits)
+        for organism in session.organisms
+        for scaffold in organism.scaffolds.values()
+        for subject in scaffold.subjects
+    ]
+
+    context.filter_session(session, min_identity=80, min_coverage=80, unique=1)
+    strict = session_clusters(session)
+    for organism in session.organisms:
+        for scaffold in organism.scaffolds.values():
+            for subject in scaffold.subjects:
+                assert all(hit.identity > 80 for hit in subject.hits)
+
+    # Relaxing thresholds shows the hidden hits again
+    context.filter_session(session, min_identity=0, min_coverage=0, max_evalue=1)
+    assert [
+        subject.hits
+        for organism in session.organisms
+        for scaffold in organism.scaffolds.values()
+        for subject in scaffold.subjects
+    ] == hits
+    assert session_clusters(session) != strict
+
+
+def test_filter_session_prefilter(random_session, caplog):
+    session = random_session(3)
+    session.params["prefilter"] = {"unique": 2, "min_hits": 3, "require": ["q1"]}
+    assert not context.check_prefilter(session, unique=2, min_hits=3, require=["q1"])
+    assert not context.check_prefilter(session, unique=3, min_hits=4, require=["q1", "q2"])
+    assert context.check_prefilter(session, unique=2, min_hits=3)
+    assert context.check_prefilter(session, unique=1, min_hits=3, require=["q1"])
+
+    caplog.clear()
+    context.filter_session(session, unique=2, min_hits=2, require=["q1"])
+    assert "--keep_all_hits" in caplog.text
+
+
+def test_filter_session_cpus(random_session):
+    serial, parallel = random_session(4), random_session(4)
+    context.filter_session(serial, gap=10000, unique=2, min_hits=2)
+    context.filter_session(parallel, gap=10000, unique=2, min_hits=2, cpus=2)
+    assert session_clusters(serial) == session_clusters(parallel)
+    assert any(session_clusters(serial))
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize(
+    "unique, min_hits, gap, require",
+    [(1, 1, 0, None), (2, 3, 5000, None), (3, 2, 20000, ["q1", "q2"]), (2, 2, 0, ["q9"])],
+)
+def test_find_clusters_vectorised(
+    monkeypatch, seed, unique, min_hits, gap, require, random_session
+):
+    session = random_session(seed, organisms=1, scaffolds=1, subjects=60)
+    subjects = next(iter(session.organisms[0].scaffolds.values())).subjects
+    kwargs = dict(unique=unique, min_hits=min_hits, gap=gap, require=require)
+    monkeypatch.setattr(context, "VECTORISE_THRESHOLD", 10 ** 9)
+    expected = list(context.find_clusters(subjects, **kwargs))
+    monkeypatch.setattr(context, "VECTORISE_THRESHOLD", 2)
+    assert list(context.find_clusters(subjects, **kwargs)) == expected
+    assert list(context.find_clusters_vectorised(subjects, **kwargs)) == expected
+
+
+@pytest.mark.parametrize("free_threaded", [False, True])
+def test_cluster_organisms(monkeypatch, free_threaded, random_session):
+    monkeypatch.setattr(context.helpers, "free_threaded", lambda: free_threaded)
+    serial, parallel = random_session(5), random_session(5)
+    kwargs = dict(gap=10000, unique=2, min_hits=2, query_sequence_order=serial.queries)
+    context.cluster_organisms(serial.organisms, **kwargs)
+    context.cluster_organisms(parallel.organisms, cpus=2, chunk_size=1, **kwargs)
+    assert session_clusters(serial) == session_clusters(parallel)
+    assert any(session_clusters(serial))
+
+
+def test_find_intermediate_genes(mocker):
+    subjects = [
+        classes.Subject(name="g1", start=100, end=200),
+        classes.Subject(name="g3", start=500, end=600),
+    ]
+    scaffold = classes.Scaffold("scaf1", subjects=subjects)
+    scaffold.add_clusters([subjects])
+    organism = classes.Organism("org1", "")
+    organism.scaffolds["scaf1"] = scaffold
+    query = mocker.patch(
+        "cblaster.database.query_regions",
+        return_value=[[("g1", 100, 200, 1), ("g2", 300, 400, -1), ("g3", 500, 600, 1)]],
+    )
+
+    context.find_intermediate_genes([organism], "db.sqlite3", flank=150)
+
+    query.assert_called_once_with([("org1", "scaf1", 0, 750)], "db.sqlite3")
+    cluster = scaffold.clusters[0]
+    assert cluster.genes == [
+        ["g1", 100, 200, "+"],
+        ["g2", 300, 400, "-"],
+        ["g3", 500, 600, "+"],
+    ]
+    assert classes.Cluster.from_dict(cluster.to_dict(), *subjects).genes == cluster.genes
+
+
+@pytest.mark.parametrize("suffix", [".json", ".jsonl.gz", ".sqlite3"])
+@pytest.mark.parametrize("database_exists", [False, True])
+def test_filter_session_intermediate_genes(mocker, tmp_path, database_exists, suffix):
+    subjects = [
+        classes.Subject(
+            hits=[classes.Hit(query, name, "90", "90", "0", "100")],
+            name=name,
+            start=start,
+            end=start + 100,
+        )
+        for name, start, query in [("g1", 100, "q1"), ("g3", 500, "q2")]
+    ]
+    scaffold = classes.Scaffold("scaf1", subjects=subjects)
+    scaffold.add_clusters([subjects])
+    scaffold.clusters[0].genes = [
+        ["g0", 0, 50, "+"],
+        ["g1", 100, 200, "+"],
+        ["g2", 300, 400, "-"],
+        ["g3", 500, 600, "+"],
+    ]
+    organism = classes.Organism("org1", "")
+    organism.scaffolds["scaf1"] = scaffold
+    db = tmp_path / "db.sqlite3"
+    if database_exists:
+        db.touch()
+    session = classes.Session(
+        queries=["q1", "q2"],
+        params={"sqlite_db": str(db), "intermediate_flank": 50},
+        organisms=[organism],
+    )
+
+    # Parameters are needed from saved sessions, e.g. with --recompute
+    path = tmp_path / f"session{suffix}"
+    store.save_session(session, path)
+    session = store.load_session(path)
+    assert session.params["intermediate_flank"] == 50
+    query = mocker.patch(
+        "cblaster.database.query_regions",
+        return_value=[[("g1", 100, 200, 1), ("g2", 300, 400, -1), ("g3", 500, 600, 1)]],
+    )
+
+    context.filter_session(session, unique=2, min_hits=2, gap=1000)
+
+    # Genes are queried again if possible, otherwise kept if in the new regions
+    (cluster,) = session.organisms[0].scaffolds["scaf1"].clusters
+    assert [gene[0] for gene in cluster.genes] == ["g1", "g2", "g3"]
+    if database_exists:
+        query.assert_called_once_with([("org1", "scaf1", 50, 650)], str(db))
+    else:
+        query.assert_not_called()
+
+
+@pytest.mark.parametrize("threshold", [10 ** 9, 2])
+@pytest.mark.parametrize(
+    "gene_gap, results",
+    [(0, [[0, 1]]), (1, [[0, 1, 2]]), (2, [[0, 1, 2, 3]])],
+)
+def test_find_clusters_gene_gap(monkeypatch, threshold, gene_gap, results):
+    monkeypatch.setattr(context, "VECTORISE_THRESHOLD", threshold)
+    # Coordinates are far apart, so only ordinals can cluster these
+    subjects = [
+        classes.Subject(start=i * 10 ** 6, end=i * 10 ** 6 + 100, ordinal=ordinal)
+        for i, ordinal in enumerate([0, 1, 3, 6])
+    ]
+    clusters = context.find_clusters(
+        subjects, unique=0, min_hits=2, gap=0, gene_gap=gene_gap
+    )
+    assert list(clusters) == [[subjects[i] for i in result] for result in results]
+
+
+def test_find_clusters_gene_gap_without_ordinals(subjects_clustering):
+    with pytest.raises(ValueError):
+        list(context.find_clusters(subjects_clustering, unique=0, gene_gap=1))
@@ -2,6 +2,7 @@
 Test suite for database.py
 """
 
+import sqlite3
 import subprocess
 
 from pathlib import Path
@@ -23,3 +24,119 @@ def test_diamond_makedb(mocker):
         stdout=subprocess.DEVNULL,
         stderr=subprocess.DEVNULL,
     )
+
+
+def test_blast_makedb(mocker):
+    mocker.patch("cblaster.helpers.get_program_path", return_value="test_path")
+    mocker.patch("subprocess.run")
+
+    database.blast_makedb("fasta", "name")
+    subprocess.run.assert_called_once_with(
+        ["test_path", "-in", "fasta", "-dbtype", "prot", "-out", "name"],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+def test_mmseqs_makedb(mocker):
+    mocker.patch("cblaster.helpers.get_program_path", return_value="test_path")
+    mocker.patch("subprocess.run")
+
+    database.mmseqs_makedb("fasta", "name")
+    subprocess.run.assert_called_once_with(
+        ["test_path", "createdb", "fasta", "name"],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+@pytest.mark.parametrize(
+    "engine, files",
+    [
+        ("diamond", ["db.dmnd"]),
+        ("blastp", ["db.blast.pin", "db.blast.phr", "db.blast.psq"]),
+        ("mmseqs", ["db.mmseqs", "db.mmseqs.index"]),
+    ],
+)
+def test_makedb_existing_files(tmp_path, engine, files):
+    for name in files:
+        (tmp_path / name).touch()
+    with pytest.raises(RuntimeError):
+        database.makedb([], str(tmp_path / "db"), engine=engine)
+
+
+@pytest.fixture()
+def gene_db(tmp_path):
+    path = tmp_path / "genes.sqlite3"
+    database.init_sqlite_db(path)
+    database.seqrecords_to_sqlite(
+        [
+            ("g1", 100, 200, 1, "MA", "scaf1", "org1", 0),
+            ("g2", 300, 400, -1, "MA", "scaf1", "org1", 1),
+            ("g3", 500, 600, 1, "MA", "scaf1", "org1", 2),
+            ("g4", 300, 400, 1, "MA", "scaf2", "org1", 0),
+            ("g5", 300, 400, 1, "MA", "scaf1", "org2", 0),
+        ],
+        path,
+    )
+    return path
+
+
+def test_query_regions(gene_db):
+    assert database.query_regions(
+        [("org1", "scaf1", 250, 500), ("org1", "scaf2", 0, 1000), ("org3", "x", 0, 1)],
+        gene_db,
+    ) == [
+        [("g2", 300, 400, -1), ("g3", 500, 600, 1)],
+        [("g4", 300, 400, 1)],
+        [],
+    ]
+
+
+def test_query_regions_without_index(gene_db, caplog):
+    with sqlite3.connect(gene_db) as con:
+        con.execute("DROP INDEX gene_location")
+    assert database.query_regions([("org2", "scaf1", 0, 1000)], gene_db) == [
+        [("g5", 300, 400, 1)]
+    ]
+    assert "no gene location index" in caplog.text
+
+    # The database is only read, not given the index
+    with sqlite3.connect(gene_db) as con:
+        assert con.execute("PRAGMA index_list(gene)").fetchall() == []
+
+
+def test_query_database_ordinals(gene_db, tmp_path):
+    assert database.query_database([2, 4], gene_db) == [
+        (2, "g2", 300, 400, -1, "scaf1", "org1", 1),
+        (4, "g4", 300, 400, 1, "scaf2", "org1", 0),
+    ]
+
+    # Databases built before ordinals were stored
+    old = tmp_path / "old.sqlite3"
+    with sqlite3.connect(old) as con:
+        con.execute(
+            "CREATE TABLE gene (id INTEGER PRIMARY KEY, name TEXT, start_pos INTEGER,"
+            " end_pos INTEGER, strand INTEGER, translation TEXT, scaffold TEXT,"
+            " organism TEXT)"
+        )
+        con.execute(
+            "INSERT INTO gene VALUES (1, 'g1', 100, 200, 1, 'MA', 'scaf1', 'org1')"
+        )
+    assert database.query_database([1], old) == [
+        (1, "g1", 100, 200, 1, "scaf1", "org1", None)
+    ]
+
+
+def test_query_database_candidates(gene_db):
+    pairs = [(1, "q1"), (1, "q2"), (2, "q2"), (4, "q1"), (4, "q2"), (5, "q3")]
+
+    def candidates(**kwargs):
+        rows = database.query_database_candidates(pairs, gene_db, **kwargs)
+        return [row[1] for row in rows]
+
+    assert candidates(unique=1, min_hits=1) == ["g1", "g2", "g4", "g5"]
+    assert candidates(unique=2, min_hits=1) == ["g1", "g2", "g4"]
+    assert candidates(unique=2, min_hits=2) == ["g1", "g2"]
+    assert candidates(unique=1, min_hits=1, require=["q3"]) == ["g5"]
+    assert candidates(unique=1, min_hits=1, require=["q1", "q3"]) == []
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+
+"""
+Test suite for formatters.py
+"""
+
+import io
+
+from cblaster import formatters
+
+
+ROWS = [["Query", "Subject", "Identity"], ["q1", "subject_1", "70.9"], ["q10", "s2", "1"]]
+
+
+def test_write_table():
+    calls = []
+
+    def rows():
+        calls.append(True)
+        return iter(ROWS)
+
+    fp = io.StringIO()
+    formatters.write_table(rows, fp)
+    expected = "\n".join("  ".join(row) for row in formatters.humanise(ROWS))
+    assert fp.getvalue() == expected + "\n"
+    assert len(calls) == 2
+
+    fp = io.StringIO()
+    formatters.write_table(lambda: iter(ROWS), fp, delimiter=",")
+    assert fp.getvalue() == "Query,Subject,Identity\nq1,subject_1,70.9\nq10,s2,1\n"
+
+
+def test_session_format_streams(make_session):
+    session = make_session(
+        [
+            (name, "", [("scaf", [("s1", 1, ["A"])], [([0], 1, 1, 10)])])
+            for name in ["org_1", "org_2"]
+        ],
+        queries=["A"],
+    )
+    for form, function in [
+        ("summary", formatters.summary),
+        ("binary", formatters.binary),
+    ]:
+        fp = io.StringIO()
+        session.format(form, fp=fp, delimiter=",")
+        assert fp.getvalue() == function(session, delimiter=",") + "\n"
+    assert fp.getvalue() == (
+        "Organism,Scaffold,Start,End,A\n"
+        "org_1,scaf,1,10,1\n"
+        "org_2,scaf,1,10,1\n"
+    )
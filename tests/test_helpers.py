@@ -89,3 +89,39 @@ def test_get_program_path(monkeypatch):
     monkeypatch.setattr(shutil, "which", return_path)
 
     assert helpers.get_program_path(["alias"]) == "test_path"
+
+
+def test_rate_limiter():
+    clock = [0.0]
+    sleeps = []
+
+    def sleep(delay):
+        sleeps.append(delay)
+        clock[0] += delay
+
+    limiter = helpers.RateLimiter(rate=4, clock=lambda: clock[0], sleep=sleep)
+    for _ in range(3):
+        limiter.wait()
+    assert sleeps == [0.25, 0.25]
+
+
+def test_rate_limiter_sleeps_unlocked():
+    sleeps = []
+
+    def sleep(delay):
+        assert not limiter._lock.locked()
+        sleeps.append(delay)
+
+    # Waiting threads reserve successive tokens without waiting for each other
+    limiter = helpers.RateLimiter(rate=4, clock=lambda: 0.0, sleep=sleep)
+    for _ in range(3):
+        limiter.wait()
+    assert sleeps == [0.25, 0.5]
+
+
+def test_get_ncbi_api_key(monkeypatch):
+    monkeypatch.setenv("NCBI_API_KEY", "env")
+    assert helpers.get_ncbi_api_key() == "env"
+    assert helpers.get_ncbi_api_key("key") == "key"
+    assert helpers.get_ncbi_rate("key") == 10
+    assert helpers.get_ncbi_rate(None) == 3
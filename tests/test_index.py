@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+
+"""
+Test suite for index.py
+"""
+
+import pytest
+
+from cblaster import extract, formatters
+from cblaster.index import SessionIndex
+
+
+@pytest.fixture
+def session(make_session):
+    return make_session(
+        [
+            (
+                "org_1",
+                "",
+                [
+                    (
+                        "scaf_1",
+                        [
+                            ("s1", 0, [("A", 50), ("B", 60)]),
+                            ("s2", 200, [("A", 70)]),
+                            ("s3", 90000, [("C", 80)]),
+                        ],
+                        [([0, 1], 2, 0, 300)],
+                    )
+                ],
+            ),
+            ("org_2", "", [("scaf_2", [("s1", 0, [("C", 90)])], [])]),
+        ]
+    )
+
+
+def test_session_index(session):
+    index = SessionIndex(session)
+    assert [entry.cluster.start for entry in index.clusters] == [0]
+    assert index.total_subjects == 4
+    assert index.total_hits == 5
+    assert "query_hits" not in vars(index), "Hits are mapped on first access"
+    assert [s.name for s, _ in index.query_hits["C"]] == ["s3", "s1"]
+
+    one, two = session.organisms
+    assert [e.cluster.start for e in index.organism_clusters[id(one)]] == [0]
+    assert index.organism_clusters[id(two)] == []
+    assert [e.organism.name for e in index.subjects["s1"]] == ["org_1", "org_2"]
+    assert index.subjects["s3"][0].scaffold is one.scaffolds["scaf_1"]
+
+    groups = index.cluster_hits(index.clusters[0].cluster)
+    assert index.cluster_hits(index.clusters[0].cluster) is groups
+    assert {query: [s.name for s, _ in hits] for query, hits in groups.items()} == {
+        "A": ["s1", "s2"],
+        "B": ["s1"],
+    }
+
+    s3 = session.organisms[0].scaffolds["scaf_1"].subjects[2]
+    assert id(s3) in index.subjects_hitting(["C"])
+    assert id(s3) not in index.subjects_hitting(["A", "B"])
+
+
+def test_get_cell_values(session):
+    cluster = session.organisms[0].scaffolds["scaf_1"].clusters[0]
+    assert formatters.get_cell_values(["A", "B", "C"], cluster) == [2, 1, 0]
+    assert formatters.get_cell_values(
+        ["A", "B"], cluster, key=max, attr="identity"
+    ) == [70, 60]
+
+
+def test_binary(session):
+    assert formatters.binary(session, delimiter=",") == (
+        "Organism,Scaffold,Start,End,A,B,C\n"
+        "org_1,scaf_1,0,300,2,1,0"
+    )
+
+
+def test_extract_records(session):
+    records = extract.extract_records(session, in_cluster=False, queries=["C"])
+    assert [(r["organism"], r["name"]) for r in records] == [
+        ("org_1", "s3"),
+        ("org_2", "s1"),
+    ]
+    records = extract.extract_records(session, queries=["B"])
+    assert [r["name"] for r in records] == ["s1"]
+
+
+def test_extract_records_intermediate_genes(session):
+    records = extract.extract_records(session, intermediate_genes=True)
+    assert [r["name"] for r in records] == ["s1", "s2"], "Falls back to subjects"
+
+    cluster = session.organisms[0].scaffolds["scaf_1"].clusters[0]
+    cluster.genes = [["s1", 0, 100, "+"], ["g1", 120, 180, "-"], ["s2", 200, 300, "+"]]
+    records = extract.extract_records(session, intermediate_genes=True)
+    assert [(r["name"], r["start"]) for r in records] == [
+        ("s1", 0),
+        ("g1", 120),
+        ("s2", 200),
+    ]
+
+    # Only genes with hits are filtered by query
+    records = extract.extract_records(session, intermediate_genes=True, queries=["B"])
+    assert [r["name"] for r in records] == ["s1", "g1"]
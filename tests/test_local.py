@@ -85,6 +85,79 @@ def test_diamond(monkeypatch):
     assert local.diamond("fasta", "database") == ["line1", "line2", "line3"]
 
 
+def test_blastp(monkeypatch):
+    commands = []
+
+    def mock_path(aliases):
+        return "blastp"
+
+    def mock_run(command, **kwargs):
+        commands.append(command)
+        with open(command[2]) as fp:
+            query = fp.read().split("\n")[0][1:]
+        return subprocess.CompletedProcess(
+            args=command, stdout=f"{query}\thit\n".encode(), returncode=0
+        )
+
+    monkeypatch.setattr(helpers, "get_program_path", mock_path)
+    monkeypatch.setattr(subprocess, "run", mock_run)
+
+    rows = local.blastp(TEST_DIR / "test.faa", "database", cpus=2)
+
+    assert len(commands) == 2
+    assert commands[0][3:] == [
+        "-db",
+        "database",
+        "-evalue",
+        "0.01",
+        "-outfmt",
+        "6 qseqid sseqid pident qcovhsp evalue bitscore",
+        "-num_threads",
+        "1",
+        "-qcov_hsp_perc",
+        "50",
+        "-max_hsps",
+        "1",
+    ]
+    assert len(rows) == 3 and rows[-1] == ""
+
+
+def test_mmseqs(monkeypatch):
+    def mock_path(aliases):
+        return "mmseqs"
+
+    def mock_run(command, **kwargs):
+        assert command[:3] == ["mmseqs", "easy-search", "fasta"]
+        assert command[6:] == [
+            "--format-output",
+            "query,target,pident,qcov,evalue,bits",
+            "--min-seq-id",
+            "0.3",
+            "-c",
+            "0.5",
+            "--cov-mode",
+            "2",
+            "-e",
+            "0.01",
+            "--threads",
+            "1",
+        ]
+        with open(command[4], "w") as fp:
+            fp.write("QUERY\tHIT1\t100.0\t0.95\t1e-100\t365\n")
+        return subprocess.CompletedProcess(args=command, returncode=0)
+
+    monkeypatch.setattr(helpers, "get_program_path", mock_path)
+    monkeypatch.setattr(subprocess, "run", mock_run)
+
+    rows = local.mmseqs("fasta", "database", cpus=1)
+    assert rows == ["QUERY\tHIT1\t100.0\t95.0\t1e-100\t365", ""]
+
+
+def test_search_invalid_engine():
+    with pytest.raises(ValueError):
+        local.search("database", query_file="test", engine="fake")
+
+
 def test_search_ids(monkeypatch):
     def mock_efetch(ids):
         return {"SEQ1": "ABCDEF", "SEQ2": "ABCDEF", "SEQ3": "ABCDEF"}
@@ -95,3 +95,25 @@ def test_get_arguments_local_invalid_arg():
     with pytest.raises(ValueError):
         main.get_arguments(["search", "-qf", "test", "-m", "local", "-eq", "entrez"])
         main.get_arguments(["search", "-qf", "test", "-m", "local", "--rid", "rid"])
+
+
+def test_cblaster_local_params(mocker, tmp_path):
+    mocker.patch("cblaster.helpers.get_sequences", return_value={"seq1": "MA"})
+    mocker.patch("cblaster.local.search", return_value=[])
+    mocker.patch("cblaster.context.search", return_value=[])
+    (tmp_path / "db.sqlite3").touch()
+    session_file = tmp_path / "session.json"
+
+    main.cblaster(
+        query_ids=["seq1"],
+        mode="local",
+        database=[str(tmp_path / "db.dmnd")],
+        session_file=[str(session_file)],
+        intermediate_genes=True,
+        intermediate_flank=50,
+    )
+
+    session = classes.Session.from_file(session_file)
+    assert session.params["sqlite_db"] == str(tmp_path / "db.sqlite3")
+    assert session.params["intermediate_flank"] == 50
+    assert session.params["prefilter"] == {"unique": 3, "min_hits": 3, "require": None}
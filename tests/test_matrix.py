@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+
+"""
+Test suite for matrix.py
+"""
+
+import numpy as np
+import pytest
+
+from scipy import io, sparse
+
+from cblaster import context, formatters, matrix
+from cblaster.index import SessionIndex
+
+
+@pytest.fixture(scope="module")
+def session(random_session):
+    session = random_session(3)
+    context.filter_session(session, 30, 50, 0.01, 20000, 2, 2, None)
+    return session
+
+
+@pytest.mark.parametrize("key, attr", [(len, None), (max, "identity"), (sum, "bitscore")])
+def test_binary_matrix(session, key, attr):
+    index = SessionIndex(session)
+    result = matrix.binary_matrix(session, key=key, attr=attr, index=index).toarray()
+    expected = [
+        [
+            key(values) if values else 0
+            for values in formatters.get_cell_values(
+                index.queries, entry.cluster, key=list, attr=attr
+            )
+        ]
+        for entry in index.clusters
+    ]
+    assert len(index.clusters) > 0
+    np.testing.assert_allclose(result, np.array(expected, dtype=float))
+
+
+def test_binary_matrix_invalid_key(session):
+    with pytest.raises(ValueError):
+        matrix.binary_matrix(session, key=sorted)
+
+
+@pytest.mark.parametrize("suffix", [".npz", ".mtx"])
+def test_save_matrix(session, tmp_path, suffix):
+    path = tmp_path / f"clusters{suffix}"
+    matrix.save_matrix(session, path)
+    if suffix == ".npz":
+        loaded = sparse.load_npz(str(path))
+    else:
+        loaded = io.mmread(str(path))
+    np.testing.assert_array_equal(
+        loaded.toarray(), matrix.binary_matrix(session).toarray()
+    )
+
+    rows = (tmp_path / "clusters.rows.tsv").read_text().splitlines()
+    assert rows[0] == "Organism\tScaffold\tStart\tEnd"
+    assert len(rows) == loaded.shape[0] + 1
+    columns = (tmp_path / "clusters.columns.txt").read_text().splitlines()
+    assert columns == session.queries
+
+    with pytest.raises(ValueError):
+        matrix.save_matrix(session, tmp_path / "clusters.csv")
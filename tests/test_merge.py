@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+
+"""
+Test suite for merge.py
+"""
+
+import pytest
+
+from cblaster import classes, merge, store
+
+
+@pytest.fixture
+def shard(make_session):
+    def shard(*organisms, queries=("A", "B")):
+        return make_session(organisms, queries=queries, params={"mode": "local"})
+
+    return shard
+
+
+@pytest.fixture
+def shards(shard):
+    # Every cluster spans 0-1000 with a score of 1
+    return [
+        shard(
+            ("org_1", "", [
+                ("scaf_1", [("s1", 0, ["A"]), ("s2", 200, ["B"])], [([0, 1], 1, 0, 1000)]),
+            ]),
+            ("org_2", "", [("scaf_2", [("s3", 0, ["A"])], [])]),
+        ),
+        shard(
+            ("org_1", "", [
+                ("scaf_1", [("s2", 200, ["A"]), ("s1", 0, ["A"])], [([1, 0], 1, 0, 1000)]),
+                ("scaf_3", [("s4", 0, ["B"])], []),
+            ]),
+        ),
+        shard(("org_3", "", [("scaf_4", [("s5", 0, ["B"])], [])])),
+    ]
+
+
+def check_merged(session):
+    organisms = {organism.name: organism for organism in session.organisms}
+    assert sorted(organisms) == ["org_1", "org_2", "org_3"]
+
+    scaffolds = organisms["org_1"].scaffolds
+    assert sorted(scaffolds) == ["scaf_1", "scaf_3"]
+
+    # Subjects are merged, with hits from both shards
+    one, two = scaffolds["scaf_1"].subjects
+    assert (one.name, two.name) == ("s1", "s2")
+    assert [hit.query for hit in two.hits] == ["B", "A"]
+
+    # Identical clusters are only kept once, and refer to merged subjects
+    (cluster,) = scaffolds["scaf_1"].clusters
+    assert cluster.indices == [0, 1]
+    assert list(cluster.subjects) == [one, two]
+
+
+def test_session_merge(shard, shards):
+    merged = classes.Session.merge(shards)
+    check_merged(merged)
+
+    # Inputs are not modified
+    assert len(shards[0].organisms[0].scaffolds["scaf_1"].subjects[1].hits) == 1
+    assert len(shards[0].organisms[0].scaffolds) == 1
+
+    with pytest.raises(ValueError):
+        classes.Session.merge([shards[0], shard(queries=("C",))])
+
+
+@pytest.mark.parametrize("cpus", [None, 2])
+def test_load_sessions(shards, tmp_path, cpus):
+    paths = []
+    for index, session in enumerate(shards):
+        path = tmp_path / f"shard_{index}.json"
+        session.to_file(path)
+        paths.append(path)
+    check_merged(merge.load_sessions(paths, cpus=cpus))
+
+
+@pytest.mark.parametrize("suffix", [".json", ".jsonl.gz", ".sqlite3"])
+def test_merge(shards, tmp_path, suffix):
+    paths = []
+    for index, (session, shard_suffix) in enumerate(
+        zip(shards, [".json", ".jsonl.gz", ".sqlite3"])
+    ):
+        path = tmp_path / f"shard_{index}{shard_suffix}"
+        store.save_session(session, path)
+        paths.append(path)
+    output = tmp_path / f"merged{suffix}"
+    merge.merge(paths, output)
+    check_merged(store.load_session(output))
+
+
+def test_merge_queries_mismatch(shard, tmp_path):
+    paths = [tmp_path / "one.json", tmp_path / "two.json"]
+    shard(queries=("A",)).to_file(paths[0])
+    shard(queries=("B",)).to_file(paths[1])
+    with pytest.raises(ValueError):
+        merge.merge(paths, tmp_path / "merged.json")
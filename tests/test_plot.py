@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+
+"""
+Test suite for plot.py
+"""
+
+import base64
+import gzip
+import http.server
+import json
+import re
+import threading
+import urllib.request
+
+from functools import partial
+
+import numpy as np
+import pytest
+
+from scipy.cluster.hierarchy import cophenet, is_valid_linkage, leaves_list, linkage
+
+from cblaster import context, plot
+
+
+@pytest.fixture
+def array():
+    rng = np.random.default_rng(0)
+    patterns = rng.integers(0, 4, size=(40, 5)) * 20.0
+    return patterns[rng.integers(0, 40, size=300)]
+
+
+@pytest.mark.parametrize("order", [False, True])
+def test_dedup_linkage(array, order):
+    expected = linkage(array, "ward")
+    matrix = plot.dedup_linkage(array, order=order)
+    assert is_valid_linkage(matrix)
+    np.testing.assert_allclose(cophenet(matrix), cophenet(expected))
+
+    hierarchy = plot.transform_linkage_matrix(matrix)
+    assert hierarchy["name"] == 2 * len(array) - 2
+
+
+def test_dedup_linkage_order(array):
+    def adjacent(matrix):
+        return np.linalg.norm(np.diff(array[leaves_list(matrix)], axis=0), axis=1).sum()
+
+    assert adjacent(plot.dedup_linkage(array, order=True)) < adjacent(
+        plot.dedup_linkage(array)
+    )
+
+
+def test_generate_linkage_matrix(array):
+    matrix = plot.generate_linkage_matrix(array + 0.1, threshold=100)
+    assert is_valid_linkage(matrix)
+    assert matrix[:, 2].max() == 1
+
+    # Rows are rounded to the nearest whole number above the threshold
+    assert matrix[: len(array) - 40, 2].max() == 0
+
+    assert plot.generate_linkage_matrix(array[:1]).shape == (0, 4)
+
+
+@pytest.fixture
+def data(random_session):
+    session = random_session(3)
+    context.filter_session(session, 30, 50, 0.01, 20000, 2, 2, None)
+    return plot.get_data(session)
+
+
+def test_get_data(data):
+    values = np.array([[cell["value"] for cell in row] for row in data["matrix"]])
+    expected = plot.generate_linkage_matrix(values)
+    assert data["hierarchy"] == plot.transform_linkage_matrix(expected)
+
+
+def test_paginate(data):
+    overview, pages = plot.paginate(data, size=2)
+    assert "labels" not in overview and "matrix" not in overview
+    assert overview["clusters"] == len(data["labels"])
+    assert overview["chunks"] == len(pages) == (len(data["labels"]) + 1) // 2
+
+    chunks = [plot.get_chunk(data, page) for page in pages]
+    scores = [label["score"] for chunk in chunks for label in chunk["labels"].values()]
+    assert scores == sorted(scores, reverse=True)
+    for chunk in chunks:
+        for cluster_id, cells in zip(chunk["labels"], chunk["matrix"]):
+            assert cells == data["matrix"][cluster_id]
+            assert {cell["cluster"] for cell in cells} == {cluster_id}
+
+
+def test_custom_handler(data):
+    cache = plot.DataCache(data, size=2)
+    handler = partial(plot.CustomHandler, cache, "heatmap")
+    with http.server.ThreadingHTTPServer(("localhost", 0), handler) as httpd:
+        thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+        thread.start()
+        url = "http://{}:{}".format(*httpd.server_address)
+        try:
+            request = urllib.request.Request(
+                f"{url}/chunks/0.json", headers={"Accept-Encoding": "gzip"}
+            )
+            with urllib.request.urlopen(request) as response:
+                assert response.headers["Content-Encoding"] == "gzip"
+                chunk = json.loads(gzip.decompress(response.read()))
+            with urllib.request.urlopen(f"{url}/data.json") as response:
+                overview = json.loads(response.read())
+            with pytest.raises(urllib.error.HTTPError):
+                urllib.request.urlopen(f"{url}/chunks/{overview['chunks']}.json")
+        finally:
+            httpd.shutdown()
+    page = plot.paginate(data, size=2)[1][0]
+    assert chunk == json.loads(plot.encode(plot.get_chunk(data, page)))
+    assert overview["queries"] == data["queries"]
+    assert cache.get("/data.json") is cache.get("/data.json")
+
+
+def test_save_html(data, tmp_path):
+    path = tmp_path / "plot.html"
+    plot.save_html(data, path)
+    match = re.search(r"const data=(.+?)/\* cblaster plot", path.read_text(), re.S)
+    embedded = json.loads(match.group(1))
+    overview = json.loads(gzip.decompress(base64.b64decode(embedded["overview"])))
+    assert overview["clusters"] == len(data["labels"])
+    assert len(embedded["chunks"]) == overview["chunks"]
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+
+"""
+Test suite for store.py
+"""
+
+import pytest
+
+from cblaster import classes, store
+
+
+@pytest.fixture
+def session(make_session):
+    return make_session(
+        [
+            (
+                "Aspergillus nidulans",
+                "FGSC A4",
+                [
+                    (
+                        "scaf_1",
+                        [
+                            ("s1", 0, ["A"], "1"),
+                            ("s2", 200, ["B"]),
+                            ("s3", 400, ["C"]),
+                            ("s4", 90000, ["A"], "1"),
+                        ],
+                        [([0, 1], 2, 0, 300), ([1, 2], 1, 200, 500)],
+                    ),
+                    ("scaf_2", [], []),
+                ],
+            ),
+            (
+                "Penicillium rubens",
+                "",
+                [
+                    (
+                        "scaf_3",
+                        [("s5", 0, ["A", "B"]), ("s6", 200, ["C"])],
+                        [([0, 1], 3, 0, 300)],
+                    ),
+                ],
+            ),
+        ],
+        sequences={"A": "MA", "B": "MB", "C": "MC"},
+        params={"mode": "local"},
+    )
+
+
+@pytest.fixture
+def session_store(session, tmp_path):
+    path = tmp_path / "session.sqlite3"
+    store.save_session(session, path)
+    return store.SessionStore(path)
+
+
+def names(organisms):
+    return {
+        organism.name: {
+            accession: [s.name for s in scaffold.subjects]
+            for accession, scaffold in organism.scaffolds.items()
+        }
+        for organism in organisms
+    }
+
+
+def test_store_roundtrip(session, session_store):
+    assert store.is_store(session_store.path)
+    loaded = session_store.to_session()
+    assert loaded.to_dict() == session.to_dict()
+
+    # Hits in the same IPG are shared, as when loading from JSON
+    subjects = loaded.organisms[0].scaffolds["scaf_1"].subjects
+    assert subjects[0].hits[0] is subjects[3].hits[0]
+
+    assert session_store.counts() == {
+        "queries": 3,
+        "hits": 7,
+        "subjects": 6,
+        "clusters": 3,
+        "scaffolds": 3,
+        "organisms": 2,
+    }
+
+
+def test_store_where(session_store):
+    assert names(session_store.where(organisms=["Penicillium"]).organisms) == {
+        "Penicillium rubens": {"scaf_3": ["s5", "s6"]},
+    }
+    assert names(session_store.where(in_cluster=True).organisms) == {
+        "Aspergillus nidulans": {"scaf_1": ["s1", "s2", "s3"]},
+        "Penicillium rubens": {"scaf_3": ["s5", "s6"]},
+    }
+    assert names(session_store.where(queries=["C"]).organisms) == {
+        "Aspergillus nidulans": {"scaf_1": ["s3"]},
+        "Penicillium rubens": {"scaf_3": ["s6"]},
+    }
+
+    # Clusters in Aspergillus with hits to both B and C
+    (organism,) = session_store.where(
+        organisms=["Aspergillus"], require=["B", "C"]
+    ).organisms
+    (cluster,) = organism.clusters
+    assert [s.name for s in cluster.subjects] == ["s2", "s3"]
+    assert cluster.indices == [0, 1]
+    assert cluster.score == 1
+
+    # Clusters are skipped if not all of their subjects are loaded
+    (organism,) = session_store.where(scaffolds=["scaf_1"], queries=["A"]).organisms
+    assert organism.clusters == []
+
+
+def test_store_where_hit_thresholds(session_store):
+    organisms = session_store.where(clusters=False, min_identity=80).organisms
+    for organism in organisms:
+        assert organism.clusters == []
+        for scaffold in organism.scaffolds.values():
+            assert all(not subject.hits for subject in scaffold.subjects)
+
+
+def test_open_session(session, session_store, tmp_path):
+    assert isinstance(store.open_session(session_store.path), store.SessionStore)
+
+    path = tmp_path / "session.json"
+    store.save_session(session, path)
+    assert not store.is_store(path)
+    assert isinstance(store.open_session(path), classes.Session)
+    assert store.load_session(path).to_dict() == session.to_dict()
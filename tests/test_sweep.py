@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+
+"""
+Test suite for sweep.py
+"""
+
+import itertools
+
+import pytest
+
+from cblaster import context, sweep
+
+
+@pytest.mark.parametrize("cpus", [1, 2])
+def test_sweep(cpus, random_session):
+    session = random_session(0)
+    gaps = context.gap_space(max_gap=30000, samples=10)
+    results = sweep.sweep(
+        session,
+        gaps,
+        unique=[1, 2],
+        min_hits=[2, 3],
+        min_identity=[30, 60],
+        min_coverage=[50],
+        require=["q1"],
+        cpus=cpus,
+    )
+    assert len(results) == 10 * 2 * 2 * 2
+
+    for unique, min_hits, identity in itertools.product([1, 2], [2, 3], [30, 60]):
+        expected = context.estimate_neighbourhood(
+            session,
+            max_gap=30000,
+            samples=10,
+            unique=unique,
+            min_hits=min_hits,
+            min_identity=identity,
+            require=["q1"],
+        )
+        assert [
+            {
+                "gap": result["gap"],
+                "means": result["means"],
+                "medians": result["medians"],
+                "clusters": result["clusters"],
+            }
+            for result in results
+            if result["unique"] == unique
+            and result["min_hits"] == min_hits
+            and result["min_identity"] == identity
+        ] == expected
+
+
+def test_query_bitmasks(random_session):
+    session = random_session(1)
+    subjects, layout = context.layout_subjects(session.organisms)
+    queries, arrays = sweep.hit_arrays(subjects)
+    indices = {query: index for index, query in enumerate(queries)}
+    assert sweep.query_bitmasks(arrays, len(subjects)) == context.query_bitmasks(
+        subjects, indices
+    )